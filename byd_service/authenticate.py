@@ -17,8 +17,13 @@ class SAPAuthentication:
 		Authentication class for SAP systems
 	'''
 	
-	# SAP Base URL
-	endpoint = config('SAP_BYD_URL')
+	@property
+	def endpoint(self):
+		'''
+			SAP Base URL, read when first needed so importing this module
+			does not require SAP configuration.
+		'''
+		return config('SAP_BYD_URL')
 	
 	def __init__(self, username: str = None, password: str = None):
 		'''
@@ -1,5 +1,6 @@
 import os, sys
 import logging
+import threading
 from time import sleep
 from .soap import SOAPServices
 from .util import ordinal
@@ -11,17 +12,30 @@ from decouple import config
 
 # Constants
 MAX_RETRY_POSTING = 3
-soap_endpoint = f"{config('SAP_BYD_URL')}/sap/bc/srt/scs/sap/manageaccountingentryin"
 wsdl_path = os.path.join(Path(__file__).resolve().parent, 'wsdl', 'manageaccountingentryin.wsdl')
 
-# Initialize the SOAP client and authenticate with SAP
-try:
-	ss = SOAPServices(wsdl_path=wsdl_path)
-	ss.connect()
-	# Access the services (operations) provided by the SOAP endpoint
-	soap_client = ss.client.create_service("{http://sap.com/xi/AP/FinancialAccounting/Global}binding", soap_endpoint)
-except Exception as e:
-	raise e
+# The SOAP client is built on first use (see get_soap_services) so importing
+# this module neither parses the WSDL nor needs the SAP configuration.
+_soap_lock = threading.Lock()
+_soap = None
+
+
+def get_soap_services():
+	'''
+		Return the (SOAPServices, service proxy) pair, connecting on first use.
+		A failed connection is not cached, so the next call tries again.
+	'''
+	global _soap
+	if _soap is None:
+		with _soap_lock:
+			if _soap is None:
+				ss = SOAPServices(wsdl_path=wsdl_path)
+				ss.connect()
+				soap_endpoint = f"{config('SAP_BYD_URL')}/sap/bc/srt/scs/sap/manageaccountingentryin"
+				# Access the services (operations) provided by the SOAP endpoint
+				soap_client = ss.client.create_service("{http://sap.com/xi/AP/FinancialAccounting/Global}binding", soap_endpoint)
+				_soap = (ss, soap_client)
+	return _soap
 
 
 def format_entry(debit_credit_indicator, profit_centre_id, gl_code, amount):
@@ -29,6 +43,7 @@ def format_entry(debit_credit_indicator, profit_centre_id, gl_code, amount):
 		Format a dictionary for an accounting entry.
 	'''
 	# Set the type for the amount in the request.
+	ss, _ = get_soap_services()
 	set_amount = ss.client.get_type('{http://sap.com/xi/AP/Common/GDT}Amount')
 	# Create the request dictionary for the accounting entry.
 	return {
@@ -39,16 +54,20 @@ def format_entry(debit_credit_indicator, profit_centre_id, gl_code, amount):
 	}
 
 
-def post_to_byd(date, items=[]):
+def post_to_byd(date, items=[], retries=MAX_RETRY_POSTING, external_id=None):
 	"""
 		Post accounting entries to SAP Business ByDesign (ByD) system.
 		
 		This function attempts to post accounting entries to SAP ByD. If the initial attempt fails,
-		it will retry up to a maximum number of times defined by MAX_RETRY_POSTING.
+		it will retry up to `retries` attempts in total (MAX_RETRY_POSTING by default).
 		
 		Parameters:
 			date (date) [YYYY-MM-DD]: The posting date for the accounting entries.
 			items (list): A list of accounting entry items to be posted. Default is an empty list.
+			retries (int): Total number of attempts. The outbox worker passes 1 and
+				handles retries itself with backoff.
+			external_id (str): Sent as the entry's ExternalID so it can be traced
+				back to the outbox rows (at most 35 characters).
 		
 		Returns:
 			bool: True if the posting was successful, False otherwise.
@@ -60,6 +79,7 @@ def post_to_byd(date, items=[]):
 	"""
 	def send_request(request):
 		try:
+			_, soap_client = get_soap_services()
 			response = soap_client.MaintainAsBundle(BasicMessageHeader="", AccountingEntry=request)
 
 			if response['Log'] is not None:
@@ -81,6 +101,8 @@ def post_to_byd(date, items=[]):
 		"TransactionCurrencyCode": "NGN",
 		"Item": items
 	}
+	if external_id:
+		req["ExternalID"] = external_id
 
 	logging.debug(req)
 	logging.info(items)
@@ -88,7 +110,7 @@ def post_to_byd(date, items=[]):
 	posted = send_request(req)
 	retry_counter = 1
 
-	while retry_counter < MAX_RETRY_POSTING and not posted:
+	while retry_counter < retries and not posted:
 		retry_counter += 1
 		logging.info(f"Attempting to post this entry for the {ordinal(retry_counter)} time.")
 		sleep(2)
@@ -0,0 +1,114 @@
+"""
+Journal builder for ByD GL postings.
+
+Outbox rows each carry the balanced lines of one business document. Posting
+them one by one means many tiny SOAP calls. Concatenating them means one huge
+entry full of repeated lines. The builder groups rows by posting date and
+profit centre instead, merges lines that share profit centre, GL code,
+debit/credit indicator and currency, and packs the result into bundles of at
+most BYD_JOURNAL_MAX_LINES lines.
+
+Rows are never split across bundles, and each row is balanced on its own, so
+every bundle is balanced too.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+
+
+def get_max_lines():
+	return getattr(settings, 'BYD_JOURNAL_MAX_LINES', 250)
+
+
+def _line_key(line):
+	return (
+		line["ProfitCentreID"],
+		line["DebitCreditCode"],
+		line["ChartOfAccountsItemCode"],
+		line["TransactionCurrencyAmount"]["currencyCode"],
+	)
+
+
+def _merge_into(merged, lines):
+	for line in lines:
+		merged[_line_key(line)] += Decimal(str(line["TransactionCurrencyAmount"]["_value_1"]))
+
+
+def _merged_lines(merged):
+	return [
+		{
+			"DebitCreditCode": debit_credit,
+			"ProfitCentreID": profit_centre,
+			"ChartOfAccountsItemCode": gl_code,
+			"TransactionCurrencyAmount": {
+				"_value_1": float(amount.quantize(Decimal("0.01"))),
+				"currencyCode": currency,
+			},
+		}
+		for (profit_centre, debit_credit, gl_code, currency), amount in sorted(merged.items())
+	]
+
+
+def _chunks(postings, max_lines):
+	"""
+		Split the postings of one (date, profit centre) group into chunks whose
+		merged line count fits in max_lines. Yields (postings, merged) pairs.
+	"""
+	chunk, merged = [], defaultdict(Decimal)
+	for posting in postings:
+		candidate = defaultdict(Decimal, merged)
+		_merge_into(candidate, posting.request_payload)
+		if chunk and len(candidate) > max_lines:
+			yield chunk, merged
+			chunk, candidate = [], defaultdict(Decimal)
+			_merge_into(candidate, posting.request_payload)
+		chunk.append(posting)
+		merged = candidate
+	if chunk:
+		yield chunk, merged
+
+
+def _profit_centre(posting):
+	lines = posting.request_payload or [{}]
+	return lines[0].get("ProfitCentreID", "")
+
+
+def build_bundles(postings, max_lines=None):
+	"""
+		Group outbox rows into compact journal entries.
+
+		Returns a list of dicts with the posting date, the merged accounting
+		entry items, and the outbox rows the bundle covers, so the caller can
+		mark those rows with the bundle's outcome.
+	"""
+	max_lines = max_lines or get_max_lines()
+
+	groups = {}
+	for posting in postings:
+		key = (posting.posting_date, _profit_centre(posting))
+		groups.setdefault(key, []).append(posting)
+
+	bundles = []
+	current = None
+	for (posting_date, _), group in sorted(groups.items(), key=lambda item: item[0]):
+		for chunk, merged in _chunks(group, max_lines):
+			# Start a new bundle on a date change or when the chunk does not fit
+			if (
+				current is None
+				or current["posting_date"] != posting_date
+				or len(current["merged"]) + len(merged) > max_lines
+			):
+				current = {"posting_date": posting_date, "merged": defaultdict(Decimal), "postings": []}
+				bundles.append(current)
+			for key, amount in merged.items():
+				current["merged"][key] += amount
+			current["postings"].extend(chunk)
+
+	return [
+		{
+			"posting_date": bundle["posting_date"],
+			"items": _merged_lines(bundle["merged"]),
+			"postings": bundle["postings"],
+		}
+		for bundle in bundles
+	]
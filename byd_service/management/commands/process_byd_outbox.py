@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from byd_service.outbox import process_due_postings
+
+
+class Command(BaseCommand):
+    help = (
+        "Post queued journal entries to SAP ByD. "
+        "Runs continuously by default; use --once from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the due postings once and exit.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Postings claimed per batch; they are merged into journal bundles.")
+        parser.add_argument('--interval', type=float, default=10, help="Seconds to sleep when nothing is due.")
+
+    def handle(self, *args, **options):
+        while True:
+            posted, failed = process_due_postings(options['batch_size'])
+            if posted or failed:
+                self.stdout.write(f"Posted {posted}, failed {failed}")
+                # A full batch probably means more rows are due right away
+                if posted + failed >= options['batch_size']:
+                    continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("ByD outbox drained."))
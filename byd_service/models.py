@@ -0,0 +1,50 @@
+from django.db import models
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+
+class ByDPostingStatus(models.Model):
+	"""
+		Outbox row for a journal entry that has to be posted to SAP ByD.
+
+		Rows are written in the same transaction as the business change that
+		produced them and drained by the `process_byd_outbox` command, so HTTP
+		requests never wait on ByD.
+	"""
+
+	class Status(models.TextChoices):
+		PENDING = "pending", "Pending"
+		PROCESSING = "processing", "Processing"
+		SUCCESS = "success", "Success"
+		FAILED = "failed", "Failed"
+
+	content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+	object_id = models.PositiveIntegerField()
+	related_object = GenericForeignKey('content_type', 'object_id')
+
+	status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+	posting_date = models.DateField()
+	request_payload = models.JSONField(default=list)  # accounting entry items
+	response_data = models.JSONField(null=True, blank=True)
+	error_message = models.TextField(blank=True, default='')
+	retry_count = models.PositiveIntegerField(default=0)
+	# Sent to ByD as the entry's ExternalID; submitted_at is set while a post is in flight
+	idempotency_key = models.CharField(max_length=35, blank=True, default='', db_index=True)
+	submitted_at = models.DateTimeField(null=True, blank=True)
+	next_attempt_at = models.DateTimeField(default=timezone.now)
+	posted_at = models.DateTimeField(null=True, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		verbose_name = "ByD posting"
+		verbose_name_plural = "ByD postings"
+		indexes = [
+			# The worker polls for due rows by status
+			models.Index(fields=['status', 'next_attempt_at']),
+			models.Index(fields=['content_type', 'object_id']),
+		]
+
+	def __str__(self):
+		return f"{self.content_type.model}-{self.object_id} on ByD ({self.status})"
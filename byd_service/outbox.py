@@ -0,0 +1,197 @@
+"""
+Outbox for SAP ByD postings.
+
+Business code calls enqueue_posting() inside its own transaction; the
+`process_byd_outbox` management command drains due rows with
+process_due_postings(). A failed attempt is retried with exponential
+backoff until BYD_OUTBOX_MAX_ATTEMPTS is reached, after which the row stays
+failed until it is reset from the admin.
+
+Every attempt is stamped with an idempotency key, sent to ByD as the entry's
+ExternalID. A row whose worker died while its entry was in flight may
+already be in ByD, so it is failed for review instead of posted again.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .gl_posting import post_to_byd
+from .journal import build_bundles
+from .models import ByDPostingStatus
+
+logger = logging.getLogger(__name__)
+
+
+def get_max_attempts():
+	return getattr(settings, 'BYD_OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def backoff_delay(retry_count):
+	"""Delay before the next attempt after `retry_count` failed attempts."""
+	base = getattr(settings, 'BYD_OUTBOX_BACKOFF_SECONDS', 30)
+	cap = getattr(settings, 'BYD_OUTBOX_MAX_BACKOFF_SECONDS', 3600)
+	return timedelta(seconds=min(cap, base * 2 ** max(retry_count - 1, 0)))
+
+
+def enqueue_posting(obj, items, posting_date):
+	"""
+		Queue accounting entry items for `obj` to be posted to ByD.
+
+		Call this inside the transaction that changes `obj` so the posting is
+		only queued if that change commits.
+	"""
+	return ByDPostingStatus.objects.create(
+		content_type=ContentType.objects.get_for_model(obj),
+		object_id=obj.pk,
+		posting_date=posting_date,
+		request_payload=items,
+	)
+
+
+def claim_due_postings(batch_size=200):
+	"""
+		Lock a batch of due postings and mark them as processing.
+
+		Claimed rows get a lease (BYD_OUTBOX_LEASE_SECONDS) in next_attempt_at,
+		so rows left behind by a worker that died are picked up again once it
+		expires. Taking over such a row counts as a failed attempt; if its entry
+		had already been sent it is failed for review, since ByD may hold it.
+		SKIP LOCKED lets several workers run side by side.
+	"""
+	now = timezone.now()
+	lease = timedelta(seconds=getattr(settings, 'BYD_OUTBOX_LEASE_SECONDS', 300))
+	max_attempts = get_max_attempts()
+
+	with transaction.atomic():
+		rows = list(
+			ByDPostingStatus.objects
+			.select_for_update(skip_locked=True)
+			.filter(
+				status__in=[
+					ByDPostingStatus.Status.PENDING,
+					ByDPostingStatus.Status.FAILED,
+					ByDPostingStatus.Status.PROCESSING,
+				],
+				next_attempt_at__lte=now,
+				retry_count__lt=max_attempts,
+			)
+			.order_by('next_attempt_at')
+			.values_list('id', 'status', 'submitted_at', 'idempotency_key')[:batch_size]
+		)
+		expired = [row for row in rows if row[1] == ByDPostingStatus.Status.PROCESSING]
+		in_flight = [row for row in expired if row[2] is not None]
+
+		ids = [row[0] for row in rows]
+		ByDPostingStatus.objects.filter(id__in=ids).update(
+			status=ByDPostingStatus.Status.PROCESSING,
+			next_attempt_at=now + lease,
+			updated_at=now,
+		)
+		ByDPostingStatus.objects.filter(id__in=[row[0] for row in expired]).update(
+			retry_count=F('retry_count') + 1,
+			error_message="The worker stopped before finishing this posting.",
+		)
+		for posting_id, _, _, key in in_flight:
+			ByDPostingStatus.objects.filter(id=posting_id).update(
+				status=ByDPostingStatus.Status.FAILED,
+				retry_count=max_attempts,
+				next_attempt_at=now,
+				error_message=(
+					f"The worker stopped while entry {key} was being posted. Check ByD for an "
+					"entry with this ExternalID before retrying, or it may be posted twice."
+				),
+			)
+		# A crashed attempt may have used up the last one
+		ByDPostingStatus.objects.filter(
+			id__in=ids, status=ByDPostingStatus.Status.PROCESSING, retry_count__gte=max_attempts
+		).update(status=ByDPostingStatus.Status.FAILED, next_attempt_at=now)
+
+	return list(
+		ByDPostingStatus.objects
+		.filter(id__in=ids, status=ByDPostingStatus.Status.PROCESSING)
+		.order_by('id')
+	)
+
+
+def mark_failed(posting, error):
+	posting.retry_count += 1
+	posting.status = ByDPostingStatus.Status.FAILED
+	posting.error_message = error
+	posting.next_attempt_at = timezone.now() + backoff_delay(posting.retry_count)
+	posting.submitted_at = None
+	posting.save(update_fields=['status', 'retry_count', 'error_message', 'next_attempt_at', 'submitted_at', 'updated_at'])
+
+
+def make_idempotency_key(postings):
+	"""ExternalID for one attempt at posting a bundle (35 characters at most)."""
+	return f"IMP-{min(p.id for p in postings)}-{uuid.uuid4().hex[:12]}"
+
+
+def post_bundle(bundle):
+	"""
+		Make a single attempt at posting a journal bundle (see journal.py) and
+		mark every outbox row it covers with the outcome. Returns True on success.
+	"""
+	postings = bundle["postings"]
+	key = make_idempotency_key(postings)
+	# Recorded before the request so a crash mid-post is recognised (claim_due_postings)
+	ByDPostingStatus.objects.filter(id__in=[p.id for p in postings]).update(
+		idempotency_key=key, submitted_at=timezone.now()
+	)
+	try:
+		posted = post_to_byd(bundle["posting_date"].isoformat(), items=bundle["items"], retries=1, external_id=key)
+		error = "SAP ByD did not accept the entry; see the worker logs for the issues raised."
+	except Exception as err:
+		logger.exception(f"Postings {[p.id for p in postings]} raised while posting to ByD")
+		posted, error = False, str(err)
+
+	if posted:
+		now = timezone.now()
+		ByDPostingStatus.objects.filter(id__in=[p.id for p in postings]).update(
+			status=ByDPostingStatus.Status.SUCCESS,
+			posted_at=now,
+			error_message='',
+			updated_at=now,
+		)
+	else:
+		for posting in postings:
+			mark_failed(posting, error)
+	return posted
+
+
+def process_due_postings(batch_size=200):
+	"""
+		Post one batch of due rows. Returns (posted, failed) counts of rows.
+
+		First attempts are merged into compact bundles. Rows that already
+		failed are posted on their own, so one entry ByD rejects cannot keep
+		failing the rows it was bundled with.
+	"""
+	postings = claim_due_postings(batch_size)
+	fresh = [posting for posting in postings if posting.retry_count == 0]
+	retried = [posting for posting in postings if posting.retry_count > 0]
+
+	bundles = build_bundles(fresh) + [build_bundles([posting])[0] for posting in retried]
+
+	posted = failed = 0
+	for bundle in bundles:
+		if post_bundle(bundle):
+			posted += len(bundle["postings"])
+		else:
+			failed += len(bundle["postings"])
+	return posted, failed
+
+
+def reset_postings(queryset):
+	"""Make postings due again immediately with a fresh retry budget (admin retries)."""
+	return queryset.exclude(status=ByDPostingStatus.Status.SUCCESS).update(
+		status=ByDPostingStatus.Status.PENDING,
+		retry_count=0,
+		submitted_at=None,
+		next_attempt_at=timezone.now(),
+		updated_at=timezone.now(),
+	)
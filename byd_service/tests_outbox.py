@@ -0,0 +1,142 @@
+from datetime import date, timedelta
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from stores.models import Region
+from .journal import build_bundles
+from .models import ByDPostingStatus
+from .outbox import enqueue_posting, claim_due_postings, process_due_postings, reset_postings
+
+
+def entry_lines(amount, profit_centre="4100005-4", gl_code="625003"):
+	return [
+		{"DebitCreditCode": "1", "ProfitCentreID": profit_centre, "ChartOfAccountsItemCode": gl_code,
+			"TransactionCurrencyAmount": {"_value_1": amount, "currencyCode": "NGN"}},
+		{"DebitCreditCode": "2", "ProfitCentreID": "4000000", "ChartOfAccountsItemCode": "212003",
+			"TransactionCurrencyAmount": {"_value_1": amount, "currencyCode": "NGN"}},
+	]
+
+
+@override_settings(BYD_OUTBOX_MAX_ATTEMPTS=2)
+class ByDOutboxTest(TestCase):
+
+	def setUp(self):
+		self.region = Region.objects.create(name='Lagos')
+
+	def _enqueue(self, amount=100.0, **fields):
+		posting = enqueue_posting(self.region, entry_lines(amount), date(2026, 3, 12))
+		if fields:
+			ByDPostingStatus.objects.filter(pk=posting.pk).update(**fields)
+		return posting
+
+	@mock.patch('byd_service.outbox.post_to_byd', return_value=True)
+	def test_success_sends_idempotency_key(self, post):
+		first, second = self._enqueue(), self._enqueue(50.0)
+		self.assertEqual(process_due_postings(), (2, 0))
+
+		# One bundle, sent with the key recorded on both rows
+		self.assertEqual(post.call_count, 1)
+		first.refresh_from_db()
+		second.refresh_from_db()
+		self.assertEqual(first.status, ByDPostingStatus.Status.SUCCESS)
+		self.assertEqual(post.call_args.kwargs['external_id'], first.idempotency_key)
+		self.assertEqual(second.idempotency_key, first.idempotency_key)
+		self.assertLessEqual(len(first.idempotency_key), 35)
+
+	@mock.patch('byd_service.outbox.post_to_byd', return_value=False)
+	def test_failures_back_off_until_max_attempts(self, post):
+		posting = self._enqueue()
+		self.assertEqual(process_due_postings(), (0, 1))
+		posting.refresh_from_db()
+		self.assertEqual((posting.status, posting.retry_count), (ByDPostingStatus.Status.FAILED, 1))
+		self.assertGreater(posting.next_attempt_at, timezone.now())
+		self.assertIsNone(posting.submitted_at)
+
+		ByDPostingStatus.objects.filter(pk=posting.pk).update(next_attempt_at=timezone.now())
+		self.assertEqual(process_due_postings(), (0, 1))
+		ByDPostingStatus.objects.filter(pk=posting.pk).update(next_attempt_at=timezone.now())
+		self.assertEqual(claim_due_postings(), [])
+
+		reset_postings(ByDPostingStatus.objects.filter(pk=posting.pk))
+		self.assertEqual([p.retry_count for p in claim_due_postings()], [0])
+
+	def test_expired_lease_counts_as_an_attempt(self):
+		expired = timezone.now() - timedelta(minutes=1)
+		posting = self._enqueue(status=ByDPostingStatus.Status.PROCESSING, next_attempt_at=expired)
+		self.assertEqual([(p.id, p.retry_count) for p in claim_due_postings()], [(posting.id, 1)])
+
+		ByDPostingStatus.objects.filter(pk=posting.pk).update(next_attempt_at=expired)
+		self.assertEqual(claim_due_postings(), [])
+		posting.refresh_from_db()
+		self.assertEqual((posting.status, posting.retry_count), (ByDPostingStatus.Status.FAILED, 2))
+
+	def test_expired_lease_after_submission_is_not_reposted(self):
+		posting = self._enqueue(
+			status=ByDPostingStatus.Status.PROCESSING,
+			next_attempt_at=timezone.now() - timedelta(minutes=1),
+			submitted_at=timezone.now() - timedelta(minutes=6),
+			idempotency_key='IMP-1-abc',
+		)
+		self.assertEqual(claim_due_postings(), [])
+		posting.refresh_from_db()
+		self.assertEqual(posting.status, ByDPostingStatus.Status.FAILED)
+		self.assertEqual(posting.retry_count, 2)
+		self.assertIn('IMP-1-abc', posting.error_message)
+
+
+class JournalPosting:
+	"""Stand-in for an outbox row: build_bundles only reads these attributes."""
+
+	def __init__(self, id, lines, posting_date=date(2026, 3, 12)):
+		self.id = id
+		self.request_payload = lines
+		self.posting_date = posting_date
+
+
+class JournalBundleTest(SimpleTestCase):
+
+	def _amounts(self, bundle):
+		return {
+			(line["ProfitCentreID"], line["DebitCreditCode"], line["ChartOfAccountsItemCode"]): line["TransactionCurrencyAmount"]["_value_1"]
+			for line in bundle["items"]
+		}
+
+	def test_lines_merge_by_profit_centre_and_gl(self):
+		postings = [
+			JournalPosting(1, entry_lines(100.10)),
+			JournalPosting(2, entry_lines(50.25)),
+			JournalPosting(3, entry_lines(20.00, gl_code="614005")),
+		]
+		[bundle] = build_bundles(postings)
+		self.assertEqual([p.id for p in bundle["postings"]], [1, 2, 3])
+		self.assertEqual(self._amounts(bundle), {
+			("4100005-4", "1", "625003"): 150.35,
+			("4100005-4", "1", "614005"): 20.00,
+			("4000000", "2", "212003"): 170.35,
+		})
+
+	def test_bundles_split_at_the_line_limit(self):
+		postings = [JournalPosting(i, entry_lines(10.0, gl_code=f"6{i:05d}")) for i in range(1, 6)]
+		bundles = build_bundles(postings, max_lines=4)
+
+		self.assertTrue(all(len(bundle["items"]) <= 4 for bundle in bundles))
+		self.assertGreater(len(bundles), 1)
+		# Every row lands in exactly one bundle, and every bundle balances
+		self.assertEqual(sorted(p.id for bundle in bundles for p in bundle["postings"]), [1, 2, 3, 4, 5])
+		for bundle in bundles:
+			debit = sum(v for (_, dc, _), v in self._amounts(bundle).items() if dc == "1")
+			credit = sum(v for (_, dc, _), v in self._amounts(bundle).items() if dc == "2")
+			self.assertAlmostEqual(debit, credit)
+			self.assertAlmostEqual(credit, 10.0 * len(bundle["postings"]))
+
+	def test_dates_are_never_mixed(self):
+		postings = [
+			JournalPosting(1, entry_lines(10.0)),
+			JournalPosting(2, entry_lines(10.0), posting_date=date(2026, 3, 13)),
+			JournalPosting(3, entry_lines(10.0, profit_centre="4100006-1")),
+		]
+		bundles = build_bundles(postings)
+		self.assertEqual(
+			[(bundle["posting_date"], [p.id for p in bundle["postings"]]) for bundle in bundles],
+			[(date(2026, 3, 12), [1, 3]), (date(2026, 3, 13), [2])],
+		)
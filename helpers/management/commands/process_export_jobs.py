@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from utils.export_jobs import process_export_jobs, expire_export_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate queued background exports and delete expired export files. "
+        "Runs continuously by default; use --once from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process the queued exports once and exit.")
+        parser.add_argument('--batch-size', type=int, default=5, help="Exports claimed per batch.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to sleep when nothing is queued.")
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_export_jobs()
+            if expired:
+                self.stdout.write(f"Expired {expired} export(s).")
+
+            results = process_export_jobs(options['batch_size'])
+            if results:
+                self.stdout.write(f"Processed exports: {results}")
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("Export queue drained."))
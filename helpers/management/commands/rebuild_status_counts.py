@@ -0,0 +1,16 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from helpers.models import StatusRollupMixin
+from helpers.rollups import rebuild_status_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized status counts used by the approval queues."
+
+    def handle(self, *args, **options):
+        for model in apps.get_models():
+            if issubclass(model, StatusRollupMixin):
+                buckets = rebuild_status_counts(model)
+                self.stdout.write(f"{model._meta.label}: {buckets} bucket(s)")
+
+        self.stdout.write(self.style.SUCCESS("Status counts rebuilt."))
@@ -1,3 +1,111 @@
 from django.db import models
 
 # Create your models here.
+
+
+class TrackedFieldsMixin:
+    """
+    Remembers the values of `tracked_fields` as they were loaded from the
+    database so that save() can work out what changed.
+
+    Use attnames for foreign keys (e.g. 'store_id').
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_tracked_fields()
+        return instance
+
+    def snapshot_tracked_fields(self):
+        """Record the current values of the tracked fields as the saved state."""
+        self._loaded_values = {
+            name: self.__dict__[name]
+            for name in self.tracked_fields
+            if name in self.__dict__  # skip deferred fields
+        }
+
+    def get_loaded_values(self):
+        """
+        Return the tracked values as last loaded/saved, or None for objects that
+        have not been saved yet.
+        """
+        return getattr(self, '_loaded_values', None)
+
+
+class StatusRollupMixin(TrackedFieldsMixin):
+    """
+    Keeps StatusCount rows in step with the instances of a model.
+
+    `rollup_fields` are the status fields the buckets are computed from. List
+    them, together with 'store_id', in `tracked_fields` so save() can move a
+    row between buckets. Override get_rollup_buckets() when a row only counts
+    towards some of the buckets.
+    """
+    rollup_fields = ()
+
+    @classmethod
+    def get_rollup_buckets(cls, values):
+        """Return the (field, value) buckets a row with these values counts in."""
+        return [(field, values[field]) for field in cls.rollup_fields]
+
+
+class StatusCount(models.Model):
+    """Materialized count of rows per (model, status field, store, status value)."""
+    model = models.CharField(max_length=100)
+    field = models.CharField(max_length=50)
+    store = models.ForeignKey('stores.Store', on_delete=models.CASCADE, related_name='status_counts')
+    value = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model', 'field', 'store', 'value'],
+                name='unique_status_count_bucket'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.model}.{self.field}={self.value} @ {self.store_id}: {self.count}"
+
+
+class ExportJob(models.Model):
+    """
+    An XLSX export generated in the background (utils/export_jobs.py) for
+    date ranges too large to stream within a request.
+    """
+    class Kind(models.TextChoices):
+        REIMBURSEMENTS = 'reimbursements', 'Reimbursements'
+        PURCHASE_REQUESTS = 'purchase_requests', 'Purchase requests'
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        PROCESSING = 'processing', 'Processing'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+        EXPIRED = 'expired', 'Expired'
+
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='export_jobs')
+    kind = models.CharField(max_length=30, choices=Kind.choices)
+    params = models.JSONField(default=dict)
+    # Identifies identical requests (user, role, kind, params) for reuse
+    params_hash = models.CharField(max_length=40, db_index=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    file_path = models.CharField(max_length=500, blank=True, default='')
+    filename = models.CharField(max_length=255, blank=True, default='')
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    error_message = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} export #{self.pk} ({self.status})"
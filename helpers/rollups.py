@@ -0,0 +1,134 @@
+"""
+Materialized status counts.
+
+Approval queues show how many requests sit in each status. Instead of a
+GROUP BY over the role-scoped queryset on every page load, counts per
+(model, status field, store, status value) are kept in StatusCount and
+adjusted whenever a model using StatusRollupMixin is saved or deleted.
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from .models import StatusCount
+
+
+def _row_buckets(model, values):
+    store_id = values.get('store_id')
+    if not store_id:
+        return []
+    return [(store_id, field, value) for field, value in model.get_rollup_buckets(values)]
+
+
+def _current_values(instance):
+    return {
+        name: getattr(instance, name)
+        for name in ('store_id',) + tuple(instance.rollup_fields)
+    }
+
+
+def value_rollup_deltas(model, changes):
+    """
+    Count changes for rows of a model moving between states.
+
+    changes: iterable of (previous, current) value dicts holding 'store_id'
+    and the rollup fields; either side may be None.
+    """
+    deltas = Counter()
+    for previous, current in changes:
+        if previous:
+            deltas.subtract(_row_buckets(model, previous))
+        if current:
+            deltas.update(_row_buckets(model, current))
+    return deltas
+
+
+def rollup_deltas(instances):
+    """Count changes needed to move instances from their loaded to their current state."""
+    deltas = Counter()
+    for instance in instances:
+        deltas.update(value_rollup_deltas(
+            type(instance), [(instance.get_loaded_values(), _current_values(instance))]
+        ))
+    return deltas
+
+
+def apply_rollup_deltas(model_label, deltas, create_missing=True):
+    """Apply {(store_id, field, value): delta} to the StatusCount rows of a model."""
+    with transaction.atomic():
+        for (store_id, field, value), delta in sorted(deltas.items()):
+            if not delta:
+                continue
+            bucket = StatusCount.objects.filter(
+                model=model_label, field=field, store_id=store_id, value=value
+            )
+            if bucket.update(count=F('count') + delta) or not create_missing:
+                continue
+            StatusCount.objects.get_or_create(
+                model=model_label, field=field, store_id=store_id, value=value
+            )
+            bucket.update(count=F('count') + delta)
+
+
+def record_status_changes(instances):
+    """Adjust the counts for instances (of one model) that have just been saved."""
+    instances = list(instances)
+    if not instances:
+        return
+    apply_rollup_deltas(type(instances[0])._meta.label_lower, rollup_deltas(instances))
+
+
+def record_value_changes(model, changes):
+    """Adjust the counts for rows updated in bulk; see value_rollup_deltas()."""
+    apply_rollup_deltas(model._meta.label_lower, value_rollup_deltas(model, changes))
+
+
+def record_status_removal(instance):
+    """Remove a deleted instance from the counts."""
+    values = instance.get_loaded_values() or _current_values(instance)
+    deltas = Counter()
+    deltas.subtract(_row_buckets(type(instance), values))
+    # The store may be going away in the same cascade; never recreate its rows
+    apply_rollup_deltas(type(instance)._meta.label_lower, deltas, create_missing=False)
+
+
+def get_status_counts(model, field, store_ids=None):
+    """
+    Read the status counts of a model from the rollup table.
+
+    store_ids: iterable of store ids to restrict to, or None for all stores.
+    Returns: dict of status value -> count, without empty statuses.
+    """
+    rows = StatusCount.objects.filter(
+        model=model._meta.label_lower, field=field, count__gt=0
+    )
+    if store_ids is not None:
+        rows = rows.filter(store_id__in=store_ids)
+    return dict(
+        rows.values_list('value').annotate(total=Sum('count')).order_by()
+    )
+
+
+def count_statuses(queryset, field='status'):
+    """GROUP BY fallback for querysets that cannot be answered from the rollups."""
+    return dict(
+        queryset.values_list(field).annotate(total=Count('id')).order_by()
+    )
+
+
+def rebuild_status_counts(model):
+    """Recompute every StatusCount row of a model from its table."""
+    label = model._meta.label_lower
+    fields = ('store_id',) + tuple(model.rollup_fields)
+    totals = Counter()
+    grouped = model.objects.values(*fields).annotate(rows=Count('id')).order_by()
+    for values in grouped:
+        for bucket in _row_buckets(model, values):
+            totals[bucket] += values['rows']
+
+    with transaction.atomic():
+        StatusCount.objects.filter(model=label).delete()
+        StatusCount.objects.bulk_create(
+            StatusCount(model=label, store_id=store_id, field=field, value=value, count=count)
+            for (store_id, field, value), count in totals.items()
+        )
+    return len(totals)
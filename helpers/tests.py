@@ -1,3 +1,109 @@
+from decimal import Decimal
 from django.test import TestCase
+from purchases.models import PurchaseRequest
+from reimbursements.bulk import bulk_transition
+from reimbursements.models import Reimbursement
+from roles.models import Role
+from stores.models import Region, Store
+from users.models import User
+from utils.export_jobs import request_export
+from .models import ExportJob
+from .rollups import get_status_counts, count_statuses, rebuild_status_counts
 
-# Create your tests here.
+
+class ExportJobReuseTest(TestCase):
+    def test_identical_requests_share_a_job(self):
+        user = User.objects.create(
+            username='tr@example.com', email='tr@example.com', role=Role.objects.create(name='Treasurer')
+        )
+        params = {'start_date': '2025-01-01', 'end_date': '2025-12-31', 'status': 'pending'}
+
+        job, created = request_export(user, ExportJob.Kind.REIMBURSEMENTS, params)
+        again, created_again = request_export(user, ExportJob.Kind.REIMBURSEMENTS, dict(params))
+        other, _ = request_export(user, ExportJob.Kind.REIMBURSEMENTS, {**params, 'status': 'disbursed'})
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.id, job.id)
+        self.assertNotEqual(other.id, job.id)
+
+        ExportJob.objects.filter(id=job.id).update(status=ExportJob.Status.FAILED)
+        retried, created_retry = request_export(user, ExportJob.Kind.REIMBURSEMENTS, params)
+        self.assertTrue(created_retry)
+
+
+class StatusRollupTest(TestCase):
+    """The rollup counts must always equal a GROUP BY over the table."""
+
+    def setUp(self):
+        region = Region.objects.create(name='Lagos')
+        self.ikeja = Store.objects.create(name='Ikeja', code='4100001', region=region)
+        self.lekki = Store.objects.create(name='Lekki', code='4100002', region=region)
+        self.requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+
+    def assertCountsMatch(self, model, field='status', queryset=None):
+        queryset = model.objects.all() if queryset is None else queryset
+        for store_ids in (None, [self.ikeja.id], [self.lekki.id]):
+            expected = queryset if store_ids is None else queryset.filter(store_id__in=store_ids)
+            self.assertEqual(
+                get_status_counts(model, field, store_ids),
+                count_statuses(expected, field),
+            )
+
+    def create_purchase_request(self, store, **fields):
+        return PurchaseRequest.objects.create(
+            requester=self.requester, store=store, total_amount=Decimal('5000'), **fields
+        )
+
+    def create_reimbursement(self, store, **fields):
+        return Reimbursement.objects.create(
+            requester=self.requester, store=store, total_amount=Decimal('1000'), is_draft=False, **fields
+        )
+
+    def test_purchase_request_create_transition_delete(self):
+        first = self.create_purchase_request(self.ikeja)
+        second = self.create_purchase_request(self.ikeja)
+        third = self.create_purchase_request(self.lekki, status='approved')
+        self.assertCountsMatch(PurchaseRequest)
+
+        first.status = 'approved'
+        first.save()
+        second.store = self.lekki
+        second.save()
+        self.assertCountsMatch(PurchaseRequest)
+
+        third.delete()
+        PurchaseRequest.objects.get(id=first.id).delete()
+        self.assertCountsMatch(PurchaseRequest)
+
+    def test_reimbursement_buckets(self):
+        pending = self.create_reimbursement(self.ikeja)
+        self.create_reimbursement(self.lekki, status='approved', internal_control_status='approved')
+        cleared = self.create_reimbursement(self.ikeja, status='approved', internal_control_status='approved')
+        treasury = Reimbursement.objects.filter(internal_control_status='approved')
+        self.assertCountsMatch(Reimbursement)
+        self.assertCountsMatch(Reimbursement, 'disbursement_status', treasury)
+
+        cleared.disbursement_status = 'disbursed'
+        cleared.save()
+        pending.status = 'declined'
+        pending.save()
+        self.assertCountsMatch(Reimbursement)
+        self.assertCountsMatch(Reimbursement, 'disbursement_status', treasury)
+
+        cleared.delete()
+        self.assertCountsMatch(Reimbursement)
+        self.assertCountsMatch(Reimbursement, 'disbursement_status', treasury)
+
+    def test_bulk_transition_and_rebuild(self):
+        area_manager = User.objects.create(
+            username='am@example.com', email='am@example.com', role=Role.objects.create(name='Area Manager')
+        )
+        area_manager.assigned_stores.add(self.ikeja, self.lekki)
+        ids = [self.create_reimbursement(store).id for store in (self.ikeja, self.ikeja, self.lekki)]
+
+        bulk_transition(area_manager, ids[:2], 'approve')
+        self.assertCountsMatch(Reimbursement)
+
+        rebuild_status_counts(Reimbursement)
+        self.assertCountsMatch(Reimbursement)
@@ -1,3 +1,62 @@
-from django.shortcuts import render
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from helpers.models import ExportJob
+from helpers.response import CustomResponse
+from users.auth import JWTAuthenticationFromCookie
+from utils.export_jobs import is_downloadable
+from utils.xlsx_export import XLSX_CONTENT_TYPE
 
-# Create your views here.
+
+def export_job_data(job, request):
+    """Polling payload of an export job."""
+    data = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "params": job.params,
+        "row_count": job.row_count,
+        "error": job.error_message or None,
+        "created_at": job.created_at,
+        "expires_at": job.expires_at,
+        "download_url": None,
+    }
+    if is_downloadable(job):
+        data["download_url"] = request.build_absolute_uri(reverse('export-job-download', args=[job.id]))
+    return data
+
+
+def queue_export_response(request, job, created):
+    """202 response for an export request answered with a background job."""
+    return CustomResponse(
+        True,
+        "Export queued." if created else "An identical export was already requested.",
+        202,
+        export_job_data(job, request),
+    )
+
+
+class ExportJobView(APIView):
+    """Poll a background export."""
+    authentication_classes = [JWTAuthenticationFromCookie]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+        return CustomResponse(True, "Export job retrieved", 200, export_job_data(job, request))
+
+
+class ExportJobDownloadView(APIView):
+    """Download the workbook of a finished background export."""
+    authentication_classes = [JWTAuthenticationFromCookie]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+        if not is_downloadable(job):
+            return CustomResponse(False, "The export is not ready or has expired.", 404,
+                                  {"status": job.status})
+        return FileResponse(open(job.file_path, 'rb'), as_attachment=True, filename=job.filename,
+                            content_type=XLSX_CONTENT_TYPE)
@@ -69,6 +69,7 @@ INSTALLED_APPS = [
     'reimbursements.apps.ReimbursementsConfig',
     'expenseitems.apps.ExpenseitemsConfig',
     'banks.apps.BanksConfig',
+    'byd_service.apps.BydServiceConfig',
 ]
 
 AUTH_USER_MODEL = 'users.User'
@@ -292,3 +293,66 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
     # Other optional settings here
 }
+
+# SAP ByD outbox worker (manage.py process_byd_outbox)
+BYD_OUTBOX_MAX_ATTEMPTS = config('BYD_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+BYD_OUTBOX_BACKOFF_SECONDS = config('BYD_OUTBOX_BACKOFF_SECONDS', default=30, cast=int)
+BYD_OUTBOX_MAX_BACKOFF_SECONDS = config('BYD_OUTBOX_MAX_BACKOFF_SECONDS', default=3600, cast=int)
+BYD_OUTBOX_LEASE_SECONDS = config('BYD_OUTBOX_LEASE_SECONDS', default=300, cast=int)
+
+# Maximum accounting entry lines in one ByD journal bundle
+BYD_JOURNAL_MAX_LINES = config('BYD_JOURNAL_MAX_LINES', default=250, cast=int)
+
+# Background receipt validation (manage.py process_receipts)
+RECEIPT_WORKER_CONCURRENCY = config('RECEIPT_WORKER_CONCURRENCY', default=4, cast=int)
+RECEIPT_PROCESSING_LEASE_SECONDS = config('RECEIPT_PROCESSING_LEASE_SECONDS', default=600, cast=int)
+
+# Receipt images sent to the extraction model (utils/receipt_preprocessing.py)
+RECEIPT_MAX_SIDE = config('RECEIPT_MAX_SIDE', default=1600, cast=int)
+RECEIPT_IMAGE_FORMAT = config('RECEIPT_IMAGE_FORMAT', default='JPEG')
+RECEIPT_IMAGE_QUALITY = config('RECEIPT_IMAGE_QUALITY', default=80, cast=int)
+
+# Receipt extraction backend: 'tiered' (local OCR, then Gemini when unsure), 'tesseract' or 'gemini'
+RECEIPT_EXTRACTION_BACKEND = config('RECEIPT_EXTRACTION_BACKEND', default='tiered')
+RECEIPT_LOCAL_CONFIDENCE = config('RECEIPT_LOCAL_CONFIDENCE', default=0.8, cast=float)
+
+# Batch receipt uploads (reimbursement-items/receipts/batch/)
+RECEIPT_BATCH_CONCURRENCY = config('RECEIPT_BATCH_CONCURRENCY', default=4, cast=int)
+RECEIPT_BATCH_MAX_FILES = config('RECEIPT_BATCH_MAX_FILES', default=50, cast=int)
+RECEIPT_BATCH_MAX_BYTES = config('RECEIPT_BATCH_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+
+# Near-duplicate receipts: dHash bits that may differ, and how often each process picks up other uploads
+RECEIPT_PHASH_MAX_DISTANCE = config('RECEIPT_PHASH_MAX_DISTANCE', default=6, cast=int)
+RECEIPT_PHASH_REFRESH_SECONDS = config('RECEIPT_PHASH_REFRESH_SECONDS', default=30, cast=int)
+RECEIPT_PHASH_RELOAD_SECONDS = config('RECEIPT_PHASH_RELOAD_SECONDS', default=3600, cast=int)
+
+# Direct-to-storage receipt uploads: lifetime of the signed upload parameters
+RECEIPT_UPLOAD_TTL_SECONDS = config('RECEIPT_UPLOAD_TTL_SECONDS', default=600, cast=int)
+
+# Dashboard payload cache (utils/dashboard_cache.py)
+DASHBOARD_CACHE_SECONDS = config('DASHBOARD_CACHE_SECONDS', default=300, cast=int)
+
+# Shared cache for all workers; without it each process uses its own local memory cache
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Background exports (manage.py process_export_jobs); EXPORT_ROOT must be shared with the worker
+EXPORT_ROOT = config('EXPORT_ROOT', default=os.path.join(BASE_DIR, 'exports'))
+EXPORT_TTL_SECONDS = config('EXPORT_TTL_SECONDS', default=3600, cast=int)
+EXPORT_REUSE_SECONDS = config('EXPORT_REUSE_SECONDS', default=300, cast=int)
+EXPORT_PROCESSING_LEASE_SECONDS = config('EXPORT_PROCESSING_LEASE_SECONDS', default=1800, cast=int)
+
+# Authenticated users are cached with role, stores and assigned store ids (users/auth.py)
+PRINCIPAL_CACHE_SECONDS = config('PRINCIPAL_CACHE_SECONDS', default=60, cast=int)
+
+# Purchase request limit cache (purchases/limits.py). Saves clear it only in the
+# worker that made them, so other workers see a new limit after at most this long
+PURCHASE_LIMIT_CACHE_SECONDS = config(
+    'PURCHASE_LIMIT_CACHE_SECONDS', default=24 * 60 * 60 if REDIS_URL else 60, cast=int
+)
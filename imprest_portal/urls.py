@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.urls import path
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from utils.dashboard import DashboardView
+from helpers.views import ExportJobView, ExportJobDownloadView
 
 
 urlpatterns = [
@@ -34,4 +35,7 @@ urlpatterns = [
     path('api/docs/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('api/dashboard/', DashboardView.as_view(), name='dashboard-view'),
     path('api/banks/', include('banks.urls')),
+    # Background exports (?async=1 on the export endpoints)
+    path('api/exports/<int:pk>/', ExportJobView.as_view(), name='export-job'),
+    path('api/exports/<int:pk>/download/', ExportJobDownloadView.as_view(), name='export-job-download'),
 ]
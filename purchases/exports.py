@@ -0,0 +1,44 @@
+"""
+Purchase request exports; see reimbursements/exports.py for the pattern.
+"""
+from utils.xlsx_export import ExportSheet, EXPORT_CHUNK_SIZE
+from utils.scope import scope_queryset
+from .models import PurchaseRequest
+
+
+def get_export_queryset(user, start_date, end_date, status):
+    """Purchase requests the user may export."""
+    queryset = PurchaseRequest.objects.filter(
+        created_at__date__gte=start_date.date(),
+        created_at__date__lte=end_date.date(),
+        status__iexact=status
+    )
+
+    # Restaurant Managers only see their own requests
+    if user.role.name == 'Restaurant Manager':
+        queryset = queryset.filter(requester=user)
+    # Restaurant Managers their store, Area Managers their assigned stores
+    return scope_queryset(queryset, user)
+
+
+def purchase_request_rows(queryset):
+    for pr in queryset.select_related('requester', 'store').order_by('id').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            f"PR-{pr.id:04d}",
+            f"{pr.requester.first_name} {pr.requester.last_name}",
+            pr.store.name if pr.store else "",
+            f"₦{pr.total_amount:,.2f}",
+            pr.status.capitalize(),
+            pr.created_at.strftime('%Y-%m-%d'),
+        ]
+
+
+def build_export(user, queryset, start_date, end_date):
+    return ExportSheet(
+        filename=f"purchase_requests_{start_date.date()}_{end_date.date()}.xlsx",
+        # Keep title <= 31 chars
+        title=f"PRs {start_date:%d-%m} to {end_date:%d-%m}",
+        headers=["Request ID", "Requester", "Store", "Total Amount", "Status", "Date Created"],
+        widths=[10, 25, 25, 16, 10, 12],
+        rows=purchase_request_rows(queryset),
+    )
@@ -0,0 +1,33 @@
+"""
+Cached purchase request limit.
+
+Items whose total reaches the limit need a purchase request; purchase
+requests may only contain such items. The LimitConfig row is served from
+the cache for up to PURCHASE_LIMIT_CACHE_SECONDS. Saving or deleting it
+clears the cache (see purchases/signals.py), but with the per-process local
+memory cache (no REDIS_URL) that only reaches the worker that saved it; the
+others see the new limit once their entry expires, 60 seconds by default.
+"""
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from .models import LimitConfig
+
+CACHE_KEY = 'purchase-limit'
+DEFAULT_LIMIT = Decimal('5000')
+
+
+def get_purchase_limit():
+    """The current purchase request limit (DEFAULT_LIMIT if none is configured)."""
+    limit = cache.get(CACHE_KEY)
+    if limit is None:
+        limit = (
+            LimitConfig.objects.order_by('id').values_list('limit', flat=True).first()
+            or DEFAULT_LIMIT
+        )
+        cache.set(CACHE_KEY, limit, getattr(settings, 'PURCHASE_LIMIT_CACHE_SECONDS', 60))
+    return limit
+
+
+def invalidate_purchase_limit():
+    cache.delete(CACHE_KEY)
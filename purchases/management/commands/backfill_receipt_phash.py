@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from purchases.models import PurchaseRequestItem
+from utils.receipt_phash import dhash
+from utils.receipt_pipeline import load_receipt
+
+
+class Command(BaseCommand):
+    help = "Compute perceptual hashes for stored receipts uploaded before near-duplicate detection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many receipts.")
+
+    def handle(self, *args, **options):
+        items = (
+            PurchaseRequestItem.objects
+            .filter(receipt_phash__isnull=True)
+            .exclude(receipt_url__isnull=True)
+            .exclude(receipt_url='')
+            .order_by('id')
+        )
+        if options['limit']:
+            items = items[:options['limit']]
+
+        hashed = skipped = 0
+        for item in items.iterator():
+            try:
+                phash = dhash(load_receipt(item))
+            except Exception as err:
+                self.stderr.write(f"Item {item.id}: {err}")
+                phash = None
+            if phash is None:
+                skipped += 1
+                continue
+            PurchaseRequestItem.objects.filter(id=item.id).update(receipt_phash=phash)
+            hashed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Hashed {hashed} receipts, skipped {skipped}."))
@@ -0,0 +1,71 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from utils.receipt_preprocessing import preprocess_receipt, encode_png
+from utils.receipt_validation import extract_receipt
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the previous PNG encoding of receipt images with the "
+        "preprocessing stage: bytes sent to the model and, with --extract, "
+        "end-to-end extraction latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Receipt image files.")
+        parser.add_argument('--extract', action='store_true',
+                            help="Also call the extraction model both ways (costs API calls).")
+        parser.add_argument('--format', default=None, help="JPEG or WEBP (defaults to RECEIPT_IMAGE_FORMAT).")
+
+    def _timed(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, (time.perf_counter() - start) * 1000
+
+    def handle(self, *args, **options):
+        totals = {'original': 0, 'png': 0, 'processed': 0, 'png_ms': 0.0, 'processed_ms': 0.0}
+
+        for path in options['paths']:
+            try:
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+            except OSError as err:
+                raise CommandError(f"Cannot read {path}: {err}")
+
+            (png, _), png_ms = self._timed(encode_png, data)
+            (processed, mime_type), processed_ms = self._timed(
+                preprocess_receipt, data, image_format=options['format']
+            )
+            line = (
+                f"{path}: original {len(data):,} B | png {len(png):,} B ({png_ms:.0f} ms) | "
+                f"{mime_type} {len(processed):,} B ({processed_ms:.0f} ms)"
+            )
+
+            if options['extract']:
+                _, old_ms = self._timed(extract_receipt, data, preprocess=False)
+                _, new_ms = self._timed(extract_receipt, data, preprocess=True)
+                line += f" | extract png {old_ms:.0f} ms, preprocessed {new_ms:.0f} ms"
+                totals.setdefault('extract_png_ms', 0.0)
+                totals.setdefault('extract_processed_ms', 0.0)
+                totals['extract_png_ms'] += old_ms
+                totals['extract_processed_ms'] += new_ms
+
+            totals['original'] += len(data)
+            totals['png'] += len(png)
+            totals['processed'] += len(processed)
+            totals['png_ms'] += png_ms
+            totals['processed_ms'] += processed_ms
+            self.stdout.write(line)
+
+        count = len(options['paths'])
+        summary = (
+            f"{count} receipt(s): png {totals['png']:,} B -> preprocessed {totals['processed']:,} B "
+            f"({totals['processed'] / max(totals['png'], 1):.1%} of png); "
+            f"encode avg png {totals['png_ms'] / count:.0f} ms, preprocessed {totals['processed_ms'] / count:.0f} ms"
+        )
+        if options['extract']:
+            summary += (
+                f"; extract avg png {totals['extract_png_ms'] / count:.0f} ms, "
+                f"preprocessed {totals['extract_processed_ms'] / count:.0f} ms"
+            )
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from utils.receipt_pipeline import process_queued_receipts
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate queued receipt uploads in the background. "
+        "Runs continuously by default; use --once from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process the queued receipts once and exit.")
+        parser.add_argument('--batch-size', type=int, default=20, help="Receipts claimed per batch.")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Parallel extractions (defaults to RECEIPT_WORKER_CONCURRENCY).")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds to sleep when nothing is queued.")
+
+    def handle(self, *args, **options):
+        while True:
+            results = process_queued_receipts(options['batch_size'], options['concurrency'])
+            if results:
+                self.stdout.write(f"Processed receipts: {results}")
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("Receipt queue drained."))
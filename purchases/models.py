@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from stores.models import Store
 from users.models import User
 from django.utils import timezone
+from helpers.models import StatusRollupMixin
+from helpers.rollups import record_status_changes
 
 STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -10,7 +12,9 @@ STATUS_CHOICES = [
         ('declined', 'Declined'),
     ]
 
-class PurchaseRequest(models.Model):
+class PurchaseRequest(StatusRollupMixin, models.Model):
+    tracked_fields = ('store_id', 'status')
+    rollup_fields = ('status',)
 
     requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchase_requests')
     store = models.ForeignKey(Store, on_delete=models.CASCADE) 
@@ -34,13 +38,33 @@ class PurchaseRequest(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            # Store-scoped lists and exports (utils/scope.py)
+            models.Index(fields=['store', 'created_at', 'id']),
+        ]
 
 
 
     def __str__(self):
         return f"PR-{self.id} - {self.status} by {self.requester.first_name} {self.requester.last_name}"
+
+    def save(self, *args, **kwargs):
+        # Keep the status counts used by the approval queues up to date
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_status_changes([self])
+        self.snapshot_tracked_fields()
    
 
+RECEIPT_STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('validated', 'Validated'),
+        ('failed', 'Failed'),
+    ]
+
 class PurchaseRequestItem(models.Model):
     request = models.ForeignKey(PurchaseRequest, on_delete=models.CASCADE, related_name='items')
     gl_code = models.CharField(max_length=10)  # From Appendix 2
@@ -57,12 +81,69 @@ class PurchaseRequestItem(models.Model):
     extracted_date = models.DateField(null=True, blank=True)
     extracted_vendor = models.CharField(max_length=255, null=True, blank=True)
     validation_errors = models.TextField(null=True, blank=True)
+    # Receipt extraction runs in the background (see utils/receipt_pipeline.py)
+    receipt_status = models.CharField(max_length=20, choices=RECEIPT_STATUS_CHOICES, null=True, blank=True)
+    receipt_status_updated_at = models.DateTimeField(null=True, blank=True)
+    receipt_url = models.CharField(max_length=500, null=True, blank=True)
+    receipt_path = models.CharField(max_length=500, null=True, blank=True)  # local copy, if any
+    receipt_sha256 = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Earlier item that was given the same receipt; flagged for Internal Control review
+    receipt_duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='receipt_duplicates'
+    )
+    # Perceptual hash of the receipt image (utils/receipt_phash.py) and the
+    # earlier item whose receipt looks the same, e.g. the same paper photographed twice
+    receipt_phash = models.CharField(max_length=16, null=True, blank=True)
+    receipt_near_duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='receipt_near_duplicates'
+    )
+    receipt_near_duplicate_distance = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The receipt worker polls for queued items
+            models.Index(fields=['receipt_status', 'receipt_status_updated_at']),
+            # Near-duplicate index refresh (utils/receipt_phash.py)
+            models.Index(fields=['receipt_status_updated_at']),
+        ]
    
 
     def save(self, *args, **kwargs):
         self.total_price = self.unit_price * self.quantity
         super().save(*args, **kwargs)
 
+class ReceiptExtraction(models.Model):
+    """Extraction result for a receipt image, keyed by the SHA-256 of its bytes."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    extracted_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    extracted_date = models.DateField(null=True, blank=True)
+    extracted_vendor = models.CharField(max_length=255, null=True, blank=True)
+    receipt_no = models.CharField(max_length=100, null=True, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def as_extraction(self):
+        """Same shape as utils.receipt_validation.extract_receipt()."""
+        return {
+            'extracted_amount': self.extracted_amount,
+            'extracted_date': self.extracted_date,
+            'extracted_vendor': self.extracted_vendor,
+            'receipt_number': self.receipt_no,
+            'errors': list(self.errors),
+            'complete': True,
+        }
+
+    def __str__(self):
+        return f"{self.sha256[:12]}: {self.extracted_vendor} {self.extracted_amount}"
+
 class Comment(models.Model):
     request = models.ForeignKey(PurchaseRequest, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
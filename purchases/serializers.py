@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import PurchaseRequest, PurchaseRequestItem, Comment, LimitConfig
+from .limits import get_purchase_limit
 
 
 # purchase_limit = LimitConfig.objects.first()
@@ -8,8 +9,10 @@ class PurchaseRequestItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseRequestItem
         fields = ['id', 'gl_code', 'expense_item', 'unit_price', 'quantity', 'total_price', 'status', 'transportation_from', 'transportation_to',
-                  'receipt_validated', 'extracted_amount', 'extracted_date', 'extracted_vendor', 'validation_errors', 'receipt_no']
-        read_only_fields = ['total_price', 'receipt_validated', 'extracted_amount', 'extracted_date', 'extracted_vendor', 'validation_errors', 'receipt_no']
+                  'receipt_validated', 'extracted_amount', 'extracted_date', 'extracted_vendor', 'validation_errors', 'receipt_no',
+                  'receipt_status', 'receipt_url', 'receipt_duplicate_of', 'receipt_near_duplicate_of', 'receipt_near_duplicate_distance']
+        read_only_fields = ['total_price', 'receipt_validated', 'extracted_amount', 'extracted_date', 'extracted_vendor', 'validation_errors', 'receipt_no',
+                            'receipt_status', 'receipt_url', 'receipt_duplicate_of', 'receipt_near_duplicate_of', 'receipt_near_duplicate_distance']
 
     def validate(self, attrs):
         unit_price = attrs.get('unit_price')
@@ -81,11 +84,11 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
     def validate(self, data):
         items = data.get('items', [])
         total = 0
+        purchase_limit = get_purchase_limit()
        
         for item in items:
             item_total = item['unit_price'] * item['quantity']
-            purchase_limit = LimitConfig.objects.first()
-            if item_total < purchase_limit.limit:
+            if item_total < purchase_limit:
                 raise serializers.ValidationError(
                     f"Item '{item['expense_item']}' total is below the purchase request limit and cannot be included in a purchase request."
                 )
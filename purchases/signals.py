@@ -1,6 +1,9 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from .models import PurchaseRequest
+from helpers.rollups import record_status_removal
+from .models import PurchaseRequest, LimitConfig
+from .limits import invalidate_purchase_limit
 from utils.email_utils import send_approval_notification, send_rejection_notification, send_creation_notification
 
 # @receiver(pre_save, sender=PurchaseRequest)
@@ -24,3 +27,13 @@ from utils.email_utils import send_approval_notification, send_rejection_notific
 def handle_purchase_request_creation(sender, instance, created, **kwargs):
     if created:
         send_creation_notification(instance)
+
+@receiver(post_delete, sender=PurchaseRequest)
+def handle_purchase_request_deletion(sender, instance, **kwargs):
+    record_status_removal(instance)
+
+@receiver(post_save, sender=LimitConfig)
+@receiver(post_delete, sender=LimitConfig)
+def handle_limit_change(sender, instance, **kwargs):
+    # Drop the cached limit once the new value is visible to other connections
+    transaction.on_commit(invalidate_purchase_limit)
@@ -1,3 +1,305 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+from datetime import date
+from unittest import mock
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from datetime import timedelta
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .limits import get_purchase_limit, DEFAULT_LIMIT
+from .models import LimitConfig, PurchaseRequest, PurchaseRequestItem, ReceiptExtraction
+from reimbursements.models import Reimbursement, ReimbursementItem
+from stores.models import Region, Store
+from users.models import User
+from utils.receipt_pipeline import (queue_receipt, claim_queued_receipts, process_receipt, cache_extraction,
+                                    get_cached_extraction, process_receipt_batch, PROCESSING, VALIDATED)
+from utils import receipt_phash
+from utils.receipt_backends import (parse_amount, parse_date, parse_vendor, parse_receipt_number, ExtractionBackend,
+                                    TieredBackend)
+from utils.receipt_phash import PhashIndex, hamming, find_near_duplicate, index_receipt
+from utils.receipt_storage import ReceiptStorage, LocalReceiptStorage
+from utils.receipt_direct_upload import (LocalDirectUpload, CloudinaryDirectUpload, sign_upload, finalize_upload,
+                                         DirectUploadError)
 
-# Create your tests here.
+
+class PhashIndexTest(SimpleTestCase):
+    def test_query_matches_brute_force(self):
+        rng = random.Random(7)
+        index = PhashIndex(max_distance=6)
+        hashes = {item_id: rng.getrandbits(64) for item_id in range(2000)}
+        for item_id, value in hashes.items():
+            index.add(item_id, value)
+
+        # A few bits flipped on a stored hash, like a second photo of a receipt
+        probe = hashes[42] ^ 0b1000100010001
+        expected = sorted(
+            (hamming(probe, value), item_id)
+            for item_id, value in hashes.items()
+            if hamming(probe, value) <= 6
+        )
+        self.assertEqual(index.query(probe), expected)
+        self.assertEqual(index.query(probe)[0], (4, 42))
+        self.assertEqual(index.query(probe, exclude=42), expected[1:])
+
+    def test_replacing_a_receipt_drops_the_old_hash(self):
+        index = PhashIndex(max_distance=4)
+        index.add(1, 0xFFFF)
+        index.add(1, 0xF0F0F0F0F0F0F0F0)
+        self.assertEqual(index.query(0xFFFF), [])
+        self.assertEqual(len(index), 1)
+
+
+class LocalReceiptStorageTest(SimpleTestCase):
+    def test_same_content_is_stored_once(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = LocalReceiptStorage(location=root, base_url='/media/')
+            url, path, sha256 = storage.store(SimpleUploadedFile('image.jpg', b'receipt one'))
+            again = storage.store(SimpleUploadedFile('IMAGE.JPG', b'receipt one'))
+            other = storage.store(SimpleUploadedFile('image.jpg', b'receipt two'))
+
+            self.assertEqual(url, f"/media/receipts/{sha256[:2]}/{sha256[2:4]}/{sha256}.jpg")
+            self.assertEqual(again, (url, path, sha256))
+            self.assertNotEqual(other[1], path)
+            with open(path, 'rb') as fh:
+                self.assertEqual(fh.read(), b'receipt one')
+            self.assertEqual(sum(len(files) for _, _, files in os.walk(root)), 2)
+
+    def test_incomplete_backend_cannot_be_created(self):
+        class WriteOnlyStorage(ReceiptStorage):
+            def save(self, key, receipt_file):
+                return None, None
+
+        with self.assertRaises(TypeError):
+            WriteOnlyStorage()
+
+
+class LocalDirectUploadTest(SimpleTestCase):
+    def test_sign_upload_finalize(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root, MEDIA_URL='/media/'):
+            params = sign_upload(item_id=5, user_id=9)
+            response = LocalDirectUpload().receive(params['fields']['token'], SimpleUploadedFile('r.png', b'receipt'))
+
+            url, path, sha256, phash = finalize_upload(params['token'], 5, 9, {'signature': response['signature']})
+            self.assertEqual(url, response['secure_url'])
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(sha256, response['sha256'])
+
+            with self.assertRaises(DirectUploadError):
+                finalize_upload(params['token'], 6, 9, {'signature': response['signature']})
+            with self.assertRaises(DirectUploadError):
+                finalize_upload(params['token'], 5, 9, {'signature': 'forged'})
+
+
+class CloudinaryDirectUploadTest(SimpleTestCase):
+    def setUp(self):
+        import cloudinary
+        cloudinary.config(cloud_name='imprest', api_key='key', api_secret='secret')
+        self.claims = {'item': 5, 'user': 9, 'public_id': 'receipts/direct/5/abc'}
+
+    @mock.patch('cloudinary.utils.verify_api_response_signature', return_value=True)
+    def test_client_secure_url_is_ignored(self, _):
+        url, path, sha256, phash = CloudinaryDirectUpload().verify(self.claims, {
+            'public_id': 'receipts/direct/5/abc', 'version': 1712345678, 'signature': 'sig',
+            'format': 'jpg', 'secure_url': 'http://169.254.169.254/latest/meta-data/',
+        })
+        self.assertTrue(url.startswith('https://res.cloudinary.com/imprest/image/upload/'))
+        self.assertIn('v1712345678/receipts/direct/5/abc.jpg', url)
+        self.assertNotIn('169.254', url)
+
+    @mock.patch('cloudinary.utils.verify_api_response_signature', return_value=True)
+    def test_unsigned_fields_are_checked(self, _):
+        response = {'public_id': 'receipts/direct/5/abc', 'version': 1, 'signature': 'sig'}
+        with self.assertRaises(DirectUploadError):
+            CloudinaryDirectUpload().verify(self.claims, {**response, 'resource_type': 'video'})
+        with self.assertRaises(DirectUploadError):
+            CloudinaryDirectUpload().verify(self.claims, {**response, 'format': 'jpg/../../x'})
+
+    @mock.patch('cloudinary.utils.verify_api_response_signature', return_value=False)
+    def test_bad_signature(self, _):
+        with self.assertRaises(DirectUploadError):
+            CloudinaryDirectUpload().verify(self.claims, {'public_id': 'receipts/direct/5/abc', 'version': 1})
+
+
+class PurchaseLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_limit_is_cached_until_saved(self):
+        self.assertEqual(get_purchase_limit(), DEFAULT_LIMIT)
+        with self.captureOnCommitCallbacks(execute=True):
+            config = LimitConfig.objects.create(limit=Decimal('7500'))
+        self.assertEqual(get_purchase_limit(), Decimal('7500'))
+        with self.assertNumQueries(0):
+            get_purchase_limit()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            config.limit = Decimal('10000')
+            config.save()
+        self.assertEqual(get_purchase_limit(), Decimal('10000'))
+
+    def test_unsignalled_changes_expire(self):
+        # Stands in for a save made by another worker, whose signal never
+        # reaches this process's cache
+        config = LimitConfig.objects.create(limit=Decimal('7500'))
+        with override_settings(PURCHASE_LIMIT_CACHE_SECONDS=0):
+            self.assertEqual(get_purchase_limit(), Decimal('7500'))
+            LimitConfig.objects.filter(id=config.id).update(limit=Decimal('9000'))
+            self.assertEqual(get_purchase_limit(), Decimal('9000'))
+
+
+class ReceiptFixtureMixin:
+    def create_item(self, total=Decimal('12000'), **fields):
+        if not hasattr(self, 'store'):
+            region = Region.objects.create(name='Lagos')
+            self.store = Store.objects.create(name='Ikeja', code='4100001', region=region)
+            self.requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+        request = PurchaseRequest.objects.create(requester=self.requester, store=self.store, total_amount=total)
+        return PurchaseRequestItem.objects.create(
+            request=request, gl_code='612000', expense_item='Diesel', unit_price=total, total_price=total, **fields
+        )
+
+
+class ReceiptQueueTest(ReceiptFixtureMixin, TestCase):
+    def test_claim_takes_queued_and_stale_items(self):
+        queued = self.create_item()
+        queue_receipt(queued)
+        stale = self.create_item(receipt_status=PROCESSING, receipt_status_updated_at=timezone.now() - timedelta(hours=1))
+        fresh = self.create_item(receipt_status=PROCESSING, receipt_status_updated_at=timezone.now())
+
+        self.assertEqual(sorted(claim_queued_receipts()), sorted([queued.id, stale.id]))
+        self.assertEqual(claim_queued_receipts(), [])
+        queued.refresh_from_db()
+        self.assertEqual(queued.receipt_status, PROCESSING)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.receipt_status, PROCESSING)
+
+    def test_only_complete_extractions_are_cached(self):
+        cache_extraction('a' * 64, {'errors': ['timeout'], 'complete': False})
+        cache_extraction('b' * 64, {'extracted_amount': Decimal('10'), 'complete': True, 'fallback': True})
+        cache_extraction('c' * 64, {'extracted_amount': Decimal('10'), 'extracted_vendor': 'Total', 'complete': True})
+        self.assertIsNone(get_cached_extraction('a' * 64))
+        self.assertIsNone(get_cached_extraction('b' * 64))
+        self.assertEqual(get_cached_extraction('c' * 64)['extracted_vendor'], 'Total')
+
+
+class ReceiptProcessingTest(ReceiptFixtureMixin, TransactionTestCase):
+    """process_receipt closes its connection, so this runs outside a test transaction."""
+
+    def test_processing_applies_result_to_submitted_reimbursements(self):
+        sha256 = 'd' * 64
+        item = self.create_item(receipt_url='/media/receipts/r.jpg', receipt_sha256=sha256)
+        ReceiptExtraction.objects.create(
+            sha256=sha256, extracted_amount=Decimal('12000'), extracted_date=timezone.localdate(),
+            extracted_vendor='Total Energies', receipt_no='R-1'
+        )
+        queue_receipt(item)
+
+        # Submitted while the receipt is still queued
+        reimbursement = Reimbursement.objects.create(
+            requester=self.requester, store=self.store, total_amount=Decimal('12000'), is_draft=False
+        )
+        linked = ReimbursementItem.objects.create(
+            reimbursement=reimbursement, item_name='Diesel', unit_price=Decimal('12000'), item_total=Decimal('12000'),
+            purchase_request_ref=f"PR-{item.request_id:04d}-12000.00", requires_receipt=True
+        )
+
+        self.assertEqual(claim_queued_receipts(), [item.id])
+        self.assertEqual(process_receipt(item.id), VALIDATED)
+
+        item.refresh_from_db()
+        self.assertEqual(item.receipt_no, 'R-1')
+        linked.refresh_from_db()
+        self.assertTrue(linked.receipt_validated)
+        self.assertFalse(linked.receipt_duplicate)
+
+
+class ReceiptBatchTest(SimpleTestCase):
+    def test_invalid_and_repeated_items(self):
+        receipt = SimpleUploadedFile('x.jpg', b'receipt')
+        results = process_receipt_batch([('x', receipt), ('x', receipt)], concurrency=2)
+        self.assertEqual([result['result'] for result in results], ['invalid_item', 'duplicate_in_batch'])
+
+
+class NearDuplicateLookupTest(ReceiptFixtureMixin, TestCase):
+    def setUp(self):
+        receipt_phash._index = None
+
+    def test_deleted_items_are_not_matched(self):
+        item = self.create_item(receipt_phash='f0f0f0f0f0f0f0f0')
+        index_receipt(item.id, item.receipt_phash)
+        self.assertEqual(find_near_duplicate('f0f0f0f0f0f0f0f1'), (item.id, 1))
+
+        item.delete()
+        self.assertIsNone(find_near_duplicate('f0f0f0f0f0f0f0f1'))
+        self.assertEqual(len(receipt_phash.get_phash_index()), 0)
+
+
+# Tesseract output of real receipts, line by line (OCR slips left in)
+FUEL_RECEIPT = """TOTAL ENERGIES MARKETING NIG PLC
+Ikeja Service Station
+Tel: 0803 123 4567
+Receipt No: 004512
+Date: 12/03/2026 Time: 14:22
+PMS 20.00 L x 617.00
+Sub Total 12,340.00
+VAT 0.00
+TOTAL 12,340.00
+Paid: CASH
+Thank you for your patronage""".splitlines()
+
+SUPERMARKET_RECEIPT = """SHOPRITE
+Ikeja City Mall
+INVOICE #: INV-88213/2
+Cashier: Bola
+2 x Peak Milk 400g 3,200.00
+1 x Sunlight Detergent 1,150.50
+AMOUNT DUE 4,350.50
+Mar 9, 2026 10:41""".splitlines()
+
+HANDWRITTEN_RECEIPT = """www.mamaputkitchen.ng
+MAMA PUT KITCHEN
+Rice & chicken 2500
+Water 200
+3 Mar 2026""".splitlines()
+
+
+class ReceiptTextParsingTest(SimpleTestCase):
+    def test_total_line_wins_over_subtotal(self):
+        self.assertEqual(parse_amount(FUEL_RECEIPT), (Decimal('12340.00'), True))
+        self.assertEqual(parse_amount(SUPERMARKET_RECEIPT), (Decimal('4350.50'), True))
+
+    def test_largest_amount_without_total_line(self):
+        self.assertEqual(parse_amount(HANDWRITTEN_RECEIPT), (Decimal('2500'), False))
+        self.assertEqual(parse_amount(['Thank you']), (None, False))
+
+    def test_dates_are_day_first(self):
+        self.assertEqual(parse_date('\n'.join(FUEL_RECEIPT)), date(2026, 3, 12))
+        self.assertEqual(parse_date('\n'.join(SUPERMARKET_RECEIPT)), date(2026, 3, 9))
+        self.assertEqual(parse_date('\n'.join(HANDWRITTEN_RECEIPT)), date(2026, 3, 3))
+        self.assertEqual(parse_date('Date: 05.01.26'), date(2026, 1, 5))
+        self.assertIsNone(parse_date('Date: 31/02/2026'))
+
+    def test_vendor_and_receipt_number(self):
+        self.assertEqual(parse_vendor(FUEL_RECEIPT), 'TOTAL ENERGIES MARKETING NIG PLC')
+        self.assertEqual(parse_vendor(HANDWRITTEN_RECEIPT), 'MAMA PUT KITCHEN')
+        self.assertEqual(parse_receipt_number('\n'.join(FUEL_RECEIPT)), '004512')
+        self.assertEqual(parse_receipt_number('\n'.join(SUPERMARKET_RECEIPT)), 'INV-88213/2')
+
+    def test_tiered_backend_escalates_weak_local_results(self):
+        local, remote = mock.Mock(), mock.Mock()
+        strong = {'complete': True, 'confidence': 0.9, 'extracted_amount': Decimal('1'),
+                  'extracted_date': date(2026, 3, 1), 'extracted_vendor': 'Shoprite', 'errors': []}
+        local.extract.return_value = strong
+        self.assertIs(TieredBackend(local, remote).extract(b'img'), strong)
+        remote.extract.assert_not_called()
+
+        local.extract.return_value = {**strong, 'extracted_vendor': None}
+        remote.extract.return_value = {**strong, 'backend': 'gemini'}
+        self.assertEqual(TieredBackend(local, remote).extract(b'img')['backend'], 'gemini')
+
+    def test_backends_must_implement_extract(self):
+        with self.assertRaises(TypeError):
+            type('NoExtractBackend', (ExtractionBackend,), {'name': 'none'})()
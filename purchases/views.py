@@ -11,16 +11,17 @@ from rest_framework.permissions import IsAuthenticated
 from helpers.response import CustomResponse
 from datetime import datetime
 from django.db.models import Count
-from utils.pagination import DynamicPageSizePagination
-from collections import Counter
-import openpyxl
-from openpyxl.utils import get_column_letter
-from django.http import HttpResponse
-from collections import Counter
-from datetime import datetime
+from utils.pagination import DynamicPageSizePagination, get_paginator
 from django.db.models import Q
 from utils.email_utils import send_rejection_notification, send_approval_notification, send_creation_notification
 from django.db import transaction
+from helpers.rollups import get_status_counts, count_statuses
+from utils.xlsx_export import xlsx_response
+from utils.export_jobs import request_export
+from helpers.models import ExportJob
+from helpers.views import queue_export_response
+from .exports import get_export_queryset, build_export
+from utils.scope import get_store_scope, scope_queryset
 
 class PurchaseRequestView(APIView):
     """
@@ -46,31 +47,21 @@ class PurchaseRequestView(APIView):
         print(user)
         queryset = PurchaseRequest.objects.all().order_by('-created_at')
 
-        # Restaurant Managers only see requests from their own stores
-        if user.role.name == 'Restaurant Manager':
-            queryset = queryset.filter(store_id = user.store_id)
-            
-        # Area Managers see requests from their stores
-        elif user.role.name == 'Area Manager':
-            queryset = queryset.filter(store__in=user.assigned_stores.all())
-            
-        # Paginate the queryset
-        paginator = DynamicPageSizePagination()
-        paginated_queryset = paginator.paginate_queryset(queryset, request)
-        
-        # Calculate status counts
-        status_list = [obj.status for obj in (queryset or [])]
+        # Restaurant Managers see their own store, Area Managers their assigned stores
+        count_store_ids = get_store_scope(user)
+        queryset = scope_queryset(queryset, user)
+
+        # Calculate status counts (before the status filter) from the rollups
+        status_count_dict = get_status_counts(PurchaseRequest, 'status', count_store_ids)
             
         status = request.query_params.get("status")
         
         if status:
             queryset = queryset.filter(status__iexact=status)
-            paginated_queryset = paginator.paginate_queryset(queryset, request)
-            
-    
-        
-        # print(status_list)
-        status_count_dict = dict(Counter(status_list))
+
+        # Paginate the queryset
+        paginator = get_paginator(request)
+        paginated_queryset = paginator.paginate_queryset(queryset, request)
         
         # #return empty status count if queryset is empty after filters
         # if not queryset.exists():
@@ -81,13 +72,8 @@ class PurchaseRequestView(APIView):
         serializer = PurchaseRequestSerializer(paginated_queryset, many=True)
 
         # Build custom response data
-        response_data = {
-            "count": paginator.page.paginator.count,  # total count (all pages)
-            "next": paginator.get_next_link(),
-            "previous": paginator.get_previous_link(),
-            "results": serializer.data,
-            "status_counts": status_count_dict,       
-        }
+        response_data = paginator.get_payload(serializer.data)
+        response_data["status_counts"] = status_count_dict
 
         return CustomResponse(True, "Filtered purchase requests retrieved", 200, response_data)
 
@@ -426,9 +412,8 @@ class SearchPurchaseRequestView(APIView):
             return CustomResponse(False, "Only PR-XXXX search is supported", 400)
 
 
-        # Status counts for paginated results only
-        status_list = [obj.status for obj in (queryset or [])]
-        status_count_dict = dict(Counter(status_list))
+        # Status counts for the matching requests
+        status_count_dict = count_statuses(queryset)
 
         # Serialize paginated data
         serializer = PurchaseRequestSerializer(paginated_queryset, many=True)
@@ -445,9 +430,6 @@ class SearchPurchaseRequestView(APIView):
         return CustomResponse(True, "Filtered purchase requests retrieved", 200, response_data)
 
 
-from collections import Counter
-from datetime import datetime
-
 class DateRangeFilterView(APIView):
     authentication_classes = [JWTAuthenticationFromCookie]
     permission_classes = [IsAuthenticated, ViewPurchaseRequest]
@@ -481,9 +463,8 @@ class DateRangeFilterView(APIView):
         paginator = DynamicPageSizePagination()
         paginated_queryset = paginator.paginate_queryset(queryset, request)
 
-        # Status counts for paginated results only
-        status_list = [obj.status for obj in (queryset or [])]
-        status_count_dict = dict(Counter(status_list))
+        # Status counts for the matching requests
+        status_count_dict = count_statuses(queryset)
 
         # Serialize paginated data
         serializer = PurchaseRequestSerializer(paginated_queryset, many=True)
@@ -521,60 +502,14 @@ class ExportPurchaseRequest(APIView):
         if start_date > end_date:
             return CustomResponse(False, "start_date cannot be after end_date", 400)
 
-        # Filter queryset
-        queryset = PurchaseRequest.objects.filter(
-            created_at__date__gte=start_date.date(),
-            created_at__date__lte=end_date.date(),
-            status__iexact=status
-            
-        )
-        
-        
-        # Restaurant Managers only see their own requests
-        if user.role.name == 'Restaurant Manager':
-            queryset = queryset.filter(requester=user)
-        # Area Managers see requests from their stores
-        elif user.role.name == 'Area Manager':
-            queryset = queryset.filter(store__region=user.region)
-
-        # Create workbook
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-
-        # Keep title <= 31 chars
-        sheet.title = f"PRs {start_date:%d-%m} to {end_date:%d-%m}"
-
-        # Define headers
-        headers = ["Request ID", "Requester", "Store", "Total Amount", "Status", "Date Created"]
-        sheet.append(headers)
-
-        # Add rows
-        for pr in queryset:
-            row = [
-                f"PR-{pr.id:04d}",
-                f"{pr.requester.first_name} {pr.requester.last_name}",
-                pr.store.name if pr.store else "",
-                f"₦{pr.total_amount:,.2f}",
-                pr.status.capitalize(),
-                pr.created_at.strftime('%Y-%m-%d'),
-            ]
-            sheet.append(row)
-
-        # Adjust column widths
-        for col in sheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            sheet.column_dimensions[column].width = max_length + 2
-
-        # Prepare response
-        file_name = f"purchase_requests_{start_date.date()}_{end_date.date()}.xlsx"
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+        if request.query_params.get('async') in ('1', 'true'):
+            # Large ranges are generated in the background (manage.py process_export_jobs)
+            job, created = request_export(user, ExportJob.Kind.PURCHASE_REQUESTS, {
+                'start_date': f"{start_date:%Y-%m-%d}", 'end_date': f"{end_date:%Y-%m-%d}", 'status': status,
+            })
+            return queue_export_response(request, job, created)
+
+        queryset = get_export_queryset(user, start_date, end_date, status)
 
-        workbook.save(response)  # Write workbook to response
-        return response
+        # Streamed write-only workbook; see purchases/exports.py
+        return xlsx_response(build_export(user, queryset, start_date, end_date))
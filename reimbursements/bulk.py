@@ -0,0 +1,179 @@
+"""
+Set-based bulk approve/decline.
+
+Instead of loading every reimbursement and its items and saving them back
+one by one, the selected rows are locked and read in a single query,
+classified in Python, and moved with one conditional UPDATE for the
+reimbursements and one for their items. Store balances, weekly spend
+counters and status counts are adjusted from the same before/after values,
+since update() bypasses Reimbursement.save().
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from helpers.rollups import record_value_changes
+from .facts import mark_dirty, partition_day
+from roles.models import Role
+from stores.ledger import post_ledger_entries, reimbursement_ledger_deltas
+from stores.weekly_spend import post_spend_deltas, weekly_spend_deltas
+from .models import Reimbursement, ReimbursementItem
+
+UPDATED = 'updated'
+SKIPPED_NOT_PENDING = 'skipped_not_pending'
+FORBIDDEN = 'forbidden'
+NOT_FOUND = 'not_found'
+
+# Columns read for every selected reimbursement
+STATE_FIELDS = (
+    'id',
+    'store_id',
+    'status',
+    'internal_control_id',
+    'internal_control_status',
+    'disbursement_status',
+    'total_amount',
+    'created_at',
+)
+
+
+def _area_manager_transition(user, action, now):
+    approve = action == 'approve'
+    return {
+        'pending': Q(status='pending'),
+        'changes': {
+            'status': 'approved' if approve else 'declined',
+            'area_manager': user,
+            'area_manager_approved_at': now if approve else None,
+            'area_manager_declined_at': None if approve else now,
+            'updated_by': user,
+        },
+        'item_changes': {'status': 'approved' if approve else 'declined'},
+    }
+
+
+def _internal_control_transition(user, action, now):
+    approve = action == 'approve'
+    changes = {
+        'internal_control': user,
+        'internal_control_status': 'approved' if approve else 'declined',
+        'internal_control_approved_at': now if approve else None,
+        'internal_control_declined_at': None if approve else now,
+        'updated_by': user,
+    }
+    if not approve:
+        # A decline sends the request back to the area manager's queue
+        changes['status'] = 'pending'
+    return {
+        'pending': Q(internal_control_status='pending'),
+        'changes': changes,
+        'item_changes': {'internal_control_status': 'approved' if approve else 'declined'},
+    }
+
+
+TRANSITIONS = {
+    Role.Type.AREA_MANAGER: _area_manager_transition,
+    Role.Type.INTERNAL_CONTROL: _internal_control_transition,
+}
+
+
+def _in_scope(user, role, row, store_ids):
+    if role == Role.Type.AREA_MANAGER:
+        return row['store_id'] in store_ids
+    # Internal Control may act on requests nobody else has picked up
+    return row['internal_control_id'] in (None, user.pk)
+
+
+def _is_pending(role, row):
+    if role == Role.Type.AREA_MANAGER:
+        return row['status'] == 'pending'
+    return row['internal_control_status'] == 'pending'
+
+
+def _normalize_ids(reimbursement_ids):
+    ids = []
+    for value in reimbursement_ids:
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            continue
+        if value not in ids:
+            ids.append(value)
+    return ids
+
+
+def bulk_transition(user, reimbursement_ids, action):
+    """
+    Approve or decline many reimbursements for an area manager or internal
+    control user.
+
+    Returns: list of {"id": ..., "result": ...} in the order the ids were
+    given, where result is one of UPDATED, SKIPPED_NOT_PENDING, FORBIDDEN
+    or NOT_FOUND. Raises KeyError for roles without a bulk transition.
+    """
+    role = user.role.name
+    now = timezone.now()
+    transition = TRANSITIONS[role](user, action, now)
+    ids = _normalize_ids(reimbursement_ids)
+
+    store_ids = set()
+    if role == Role.Type.AREA_MANAGER:
+        store_ids = user.assigned_store_ids
+
+    with transaction.atomic():
+        rows = {
+            row['id']: row
+            for row in Reimbursement.objects
+            .select_for_update()
+            .filter(id__in=ids)
+            .order_by('id')
+            .values(*STATE_FIELDS)
+        }
+
+        results = {}
+        to_update = []
+        for reimbursement_id in ids:
+            row = rows.get(reimbursement_id)
+            if row is None:
+                results[reimbursement_id] = NOT_FOUND
+            elif not _in_scope(user, role, row, store_ids):
+                results[reimbursement_id] = FORBIDDEN
+            elif not _is_pending(role, row):
+                results[reimbursement_id] = SKIPPED_NOT_PENDING
+            else:
+                results[reimbursement_id] = UPDATED
+                to_update.append(reimbursement_id)
+
+        if to_update:
+            # The pending condition is repeated so the UPDATE never touches a
+            # row that moved on, even if it was not locked by this transaction.
+            Reimbursement.objects.filter(transition['pending'], id__in=to_update).update(
+                updated_at=now, **transition['changes']
+            )
+            ReimbursementItem.objects.filter(reimbursement_id__in=to_update).update(
+                **transition['item_changes']
+            )
+
+            state_changes = {
+                field: value for field, value in transition['changes'].items()
+                if field in STATE_FIELDS
+            }
+            changes = []
+            entries = []
+            spend_deltas = []
+            for reimbursement_id in to_update:
+                previous = rows[reimbursement_id]
+                current = {**previous, **state_changes}
+                changes.append((previous, current))
+                entries.extend(
+                    (store_id, amount, reimbursement_id)
+                    for store_id, amount in reimbursement_ledger_deltas(previous, current)
+                )
+                spend_deltas.extend(weekly_spend_deltas(previous, current))
+            post_ledger_entries(entries)
+            post_spend_deltas(spend_deltas)
+            record_value_changes(Reimbursement, changes)
+            for reimbursement_id in to_update:
+                row = rows[reimbursement_id]
+                mark_dirty(row['store_id'], partition_day(row['created_at']))
+
+    return [{"id": reimbursement_id, "result": results[reimbursement_id]} for reimbursement_id in ids]
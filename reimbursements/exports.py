@@ -0,0 +1,151 @@
+"""
+Reimbursement exports.
+
+get_export_queryset() applies the role-scoped filters and build_export()
+turns the result into an ExportSheet (utils/xlsx_export.py) for the role's
+template. Rows are generated from a chunked iterator over a queryset with
+its related rows joined or prefetched, so an export costs a handful of
+queries however many reimbursements it covers.
+"""
+from django.db.models import Prefetch
+from utils.scope import scope_queryset
+from utils.xlsx_export import ExportSheet, EXPORT_CHUNK_SIZE
+from .models import Reimbursement, ReimbursementItem
+
+
+def get_export_queryset(user, start_date, end_date, status):
+    """Reimbursements the user may export, or None if the role cannot export."""
+    qs = scope_queryset(Reimbursement.objects.all(), user)
+    role = user.role.name
+
+    if role == "Area Manager":
+        return qs.filter(
+            created_at__date__range=(start_date, end_date),
+            status__iexact=status,
+        )
+
+    if role == "Internal Control":
+        return qs.filter(
+            status="approved",
+            created_at__date__range=(start_date, end_date),
+            internal_control_status__iexact=status,
+        )
+
+    if role == "Treasurer":
+        return qs.filter(
+            internal_control_status="approved",
+            created_at__date__range=(start_date, end_date),
+            disbursement_status__iexact=status,
+        )
+
+    if role == "Restaurant Manager":
+        return qs.filter(
+            requester=user,
+            created_at__date__range=(start_date, end_date),
+            status__iexact=status,
+        )
+
+    return None
+
+
+def _iterate(queryset):
+    return (
+        queryset
+        .select_related('requester', 'store__region', 'store__area_manager', 'bank')
+        .prefetch_related(Prefetch('items', queryset=ReimbursementItem.objects.only('id', 'reimbursement_id', 'item_name')))
+        .order_by('id')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def _item_names(rr):
+    return ",".join(item.item_name for item in rr.items.all())
+
+
+def _area_manager_name(store):
+    return store.area_manager.get_full_name() if store.area_manager else "Unknown"
+
+
+def internal_control_rows(queryset):
+    for rr in _iterate(queryset):
+        store = rr.store
+        yield [
+            f"RR-{rr.id:04d}",
+            rr.requester.get_full_name(),
+            store.name,
+            store.code,
+            _area_manager_name(store),
+            _item_names(rr),
+            float(rr.total_amount),
+            rr.internal_control_status,
+            rr.created_at.strftime("%d-%m-%Y"),
+        ]
+
+
+def treasury_rows(queryset):
+    for rr in _iterate(queryset):
+        store = rr.store
+        yield [
+            f"RR-{rr.id:04d}",
+            rr.requester.get_full_name(),
+            store.region.name if store.region else "",
+            store.name,
+            store.code,
+            _item_names(rr),
+            _area_manager_name(store),
+            float(rr.total_amount),
+            rr.status,
+            rr.created_at.strftime("%d-%m-%Y"),
+            rr.bank.bank_name if rr.bank else "Unknown",
+            rr.bank.gl_code if rr.bank else "Unknown",
+        ]
+
+
+def default_rows(queryset):
+    for rr in _iterate(queryset):
+        yield [
+            f"RR-{rr.id:04d}",
+            f"{rr.requester.first_name} {rr.requester.last_name}",
+            rr.store.name if rr.store else "",
+            rr.total_amount,
+            rr.status.capitalize(),
+            rr.created_at.strftime("%Y-%m-%d"),
+        ]
+
+
+def build_export(user, queryset, start_date, end_date):
+    """ExportSheet for the user's role template."""
+    period = f"{start_date.date()}_{end_date.date()}"
+    role = user.role.name
+
+    if role == "Internal Control":
+        return ExportSheet(
+            filename=f"IC_reimbursements_{period}.xlsx",
+            title="Internal Control",
+            headers=[
+                "Request ID", "Requester", "Store", "Store Code", "Store Manager",
+                "Expense Item", "Amount", "Status", "Date Created",
+            ],
+            widths=[12, 25, 25, 12, 25, 40, 14, 12, 14],
+            rows=internal_control_rows(queryset),
+        )
+
+    if role == "Treasurer":
+        return ExportSheet(
+            filename=f"Treasury_reimbursements_{period}.xlsx",
+            title="Treasury",
+            headers=[
+                "Request ID", "Requester", "Region", "Store", "Store Code", "Expense Item",
+                "Area Manager", "Amount", "Status", "Date Created", "Bank Account", "Bank GL Code",
+            ],
+            widths=[12, 25, 15, 25, 12, 40, 25, 14, 12, 14, 25, 14],
+            rows=treasury_rows(queryset),
+        )
+
+    return ExportSheet(
+        filename=f"reimbursements_{period}.xlsx",
+        title="Sheet",
+        headers=["Request ID", "Requester", "Store", "Total", "Status", "Date"],
+        widths=[12, 25, 25, 14, 12, 12],
+        rows=default_rows(queryset),
+    )
@@ -0,0 +1,141 @@
+"""
+Daily spend facts for the dashboard.
+
+DailySpendFact holds reimbursed item totals per (store, day, status, GL
+code, item), so every dashboard widget is a range scan over a small table
+instead of an aggregate over all reimbursements and items.
+
+Facts are maintained per partition, a (store, day) pair: saving a
+reimbursement or one of its items marks its partition dirty, and once the
+transaction commits the dirty partitions are recomputed from the raw
+tables, and the cached dashboards of those stores are invalidated.
+Recomputing (rather than applying deltas) keeps the facts correct however
+the items were edited. `manage.py rebuild_spend_facts` rebuilds
+everything.
+"""
+import threading
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from utils.dashboard_cache import bump_store_versions
+
+_pending = threading.local()
+
+
+def _pending_partitions():
+    if not hasattr(_pending, 'partitions'):
+        _pending.partitions = set()
+    return _pending.partitions
+
+
+def mark_dirty(store_id, day):
+    """Recompute the (store, day) partition once the current transaction commits."""
+    if not store_id or not day:
+        return
+    _pending_partitions().add((store_id, day))
+    # Every mark registers a flush; the first one to run takes the whole set
+    transaction.on_commit(flush_dirty_partitions)
+
+
+def partition_day(created_at):
+    return timezone.localdate(created_at) if created_at else None
+
+
+def mark_reimbursement_dirty(reimbursement):
+    """Mark the partitions a reimbursement left and entered, if its spend may have changed."""
+    day = partition_day(reimbursement.created_at)
+    previous = reimbursement.get_loaded_values()
+    if previous and all(
+        previous.get(field) == getattr(reimbursement, field)
+        for field in ('store_id', 'status', 'total_amount')
+    ):
+        return
+    if previous:
+        mark_dirty(previous.get('store_id'), day)
+    mark_dirty(reimbursement.store_id, day)
+
+
+def flush_dirty_partitions():
+    partitions = _pending_partitions()
+    if not partitions:
+        return
+    pending = set(partitions)
+    partitions.clear()
+    refresh_partitions(pending)
+
+
+def refresh_partitions(partitions):
+    """Recompute the facts of the given (store_id, day) partitions from the raw tables."""
+    from stores.models import Store
+    from .models import DailySpendFact
+
+    days_by_store = {}
+    for store_id, day in partitions:
+        days_by_store.setdefault(store_id, set()).add(day)
+
+    for store_id in sorted(days_by_store):
+        days = sorted(days_by_store[store_id])
+        with transaction.atomic():
+            # One refresh per store at a time; concurrent refreshes would
+            # otherwise both delete and then collide on insert
+            if not Store.objects.select_for_update().filter(pk=store_id).exists():
+                continue
+            DailySpendFact.objects.filter(store_id=store_id, day__in=days).delete()
+            DailySpendFact.objects.bulk_create(_compute_facts(store_id, days))
+    bump_store_versions(days_by_store)
+
+
+def _compute_facts(store_id, days=None):
+    """Fact rows of a store computed from its reimbursement items, optionally for some days only."""
+    from .models import DailySpendFact, ReimbursementItem
+
+    rows = (
+        ReimbursementItem.objects
+        .filter(reimbursement__store_id=store_id)
+        .annotate(
+            day=TruncDate('reimbursement__created_at'),
+            gl=Coalesce('gl_code', Value('')),
+        )
+    )
+    if days is not None:
+        # The created_at range lets the (store, created_at) index narrow the scan first
+        start = timezone.make_aware(datetime.combine(min(days), time.min))
+        end = timezone.make_aware(datetime.combine(max(days) + timedelta(days=1), time.min))
+        rows = rows.filter(
+            reimbursement__created_at__gte=start,
+            reimbursement__created_at__lt=end,
+            day__in=days,
+        )
+    rows = (
+        rows
+        .values('day', 'reimbursement__status', 'gl', 'item_name')
+        .annotate(amount=Sum('item_total'), item_count=Count('id'))
+        .order_by()
+    )
+    return [
+        DailySpendFact(
+            store_id=store_id,
+            day=row['day'],
+            status=row['reimbursement__status'],
+            gl_code=row['gl'],
+            item_name=row['item_name'],
+            amount=row['amount'] or 0,
+            item_count=row['item_count'],
+        )
+        for row in rows
+    ]
+
+
+def rebuild_store_facts(store_id):
+    """Recompute every fact of a store. Returns the number of fact rows."""
+    from stores.models import Store
+    from .models import DailySpendFact
+
+    with transaction.atomic():
+        Store.objects.select_for_update().filter(pk=store_id).exists()
+        DailySpendFact.objects.filter(store_id=store_id).delete()
+        created = len(DailySpendFact.objects.bulk_create(_compute_facts(store_id)))
+    bump_store_versions([store_id])
+    return created
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from stores.models import Store
+from reimbursements.facts import rebuild_store_facts
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily spend facts behind the dashboard from the reimbursements."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help="Only rebuild this store (repeatable).")
+
+    def handle(self, *args, **options):
+        store_ids = options['stores'] or Store.objects.order_by('id').values_list('id', flat=True)
+        total = 0
+        for store_id in store_ids:
+            total += rebuild_store_facts(store_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Spend facts rebuilt: {total} row(s)."))
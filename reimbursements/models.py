@@ -1,4 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from helpers.models import StatusRollupMixin
+from helpers.rollups import record_status_changes
+from stores.ledger import record_reimbursement_change
+from stores.weekly_spend import record_weekly_spend_change
+from .facts import mark_reimbursement_dirty
 from users.models import User
 from stores.models import Store
 from purchases.models import PurchaseRequest
@@ -14,7 +19,10 @@ STATUS_CHOICES = [
     ]
 
 
-class Reimbursement(models.Model):
+class Reimbursement(StatusRollupMixin, models.Model):
+    tracked_fields = ('store_id', 'status', 'internal_control_status', 'disbursement_status', 'total_amount')
+    rollup_fields = ('status', 'internal_control_status', 'disbursement_status')
+
     requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reimbursements')
     store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='reimbursements')
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
@@ -41,12 +49,37 @@ class Reimbursement(models.Model):
     account = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, blank=True)
     # link to PRs (for items >= 5000)
     purchase_requests = models.ManyToManyField(PurchaseRequest, blank=True, related_name='reimbursements')
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            # Store-scoped lists and exports (utils/scope.py)
+            models.Index(fields=['store', 'created_at', 'id']),
+        ]
+
     def save(self, *args, user=None, **kwargs):
         if user:
             self.updated_by = user
             if not self.pk:  # new object being created
                 self.requester = user
-        super().save(*args, **kwargs)
+        # Keep the store balance ledger, weekly spend and status counts in step with approvals
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_reimbursement_change(self)
+            record_weekly_spend_change(self)
+            record_status_changes([self])
+            mark_reimbursement_dirty(self)
+        self.snapshot_tracked_fields()
+
+    @classmethod
+    def get_rollup_buckets(cls, values):
+        # Treasury only ever sees requests approved by Internal Control, so
+        # disbursement counts are only kept for those.
+        buckets = [('status', values['status'])]
+        if values['internal_control_status'] == 'approved':
+            buckets.append(('disbursement_status', values['disbursement_status']))
+        return buckets
     
 class ReimbursementItem(models.Model):
     reimbursement = models.ForeignKey(Reimbursement, on_delete=models.CASCADE, related_name='items')
@@ -55,6 +88,8 @@ class ReimbursementItem(models.Model):
     item_name = models.CharField(max_length=255)
     transportation_from = models.CharField(max_length=255, default='Not Applicable')
     receipt_validated = models.BooleanField(default=False)
+    # The receipt was also used on another item; shown to Internal Control
+    receipt_duplicate = models.BooleanField(default=False)
     transportation_to = models.CharField(max_length=255, default='Not Applicable')
     unit_price = models.DecimalField(max_digits=12, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
@@ -65,6 +100,33 @@ class ReimbursementItem(models.Model):
     requires_receipt = models.BooleanField(default=False)
     
     
+class DailySpendFact(models.Model):
+    """
+    Reimbursed spend per (store, day, reimbursement status, GL code, item),
+    the day being the reimbursement's creation date. Kept up to date by
+    reimbursements/facts.py and read by the dashboard.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='daily_spend')
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    gl_code = models.CharField(max_length=50, blank=True, default='')
+    item_name = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for the dashboard's (store, status, day range) scans
+            models.UniqueConstraint(
+                fields=['store', 'status', 'day', 'gl_code', 'item_name'],
+                name='unique_daily_spend_fact'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.store_id} {self.day} {self.status} {self.item_name}: {self.amount}"
+
+
 class ReimbursementComment(models.Model):
     reimbursement = models.ForeignKey(Reimbursement, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -1,8 +1,9 @@
 from decimal import Decimal
 from django.utils import timezone
-from byd_service.gl_posting import post_to_byd
+from byd_service.outbox import enqueue_posting
 
 CURRENCY_CODE = "NGN"
+CENT = Decimal("0.01")
 
 # This should ideally come from settings or Account model later
 DEFAULT_BANK_GL_CODE = "212003"   # example: imprest / bank clearing GL
@@ -44,6 +45,7 @@ def _build_sap_payload(reimbursement):
     # -------------------------------
     # DEBIT LINES (Expenses)
     # -------------------------------
+    debit_total = Decimal("0")
     for item in reimbursement.items.all():
         if not item.gl_code:
             raise ValueError(f"Item '{item.item_name}' is missing GL code")
@@ -59,37 +61,36 @@ def _build_sap_payload(reimbursement):
         }
 
         payload.append(debit_line)
+        debit_total += item.item_total
 
     # -------------------------------
     # Final safety check (balance)
     # -------------------------------
-    debit_total = sum(
-        Decimal(line["TransactionCurrencyAmount"]["_value_1"])
-        for line in payload
-        if line["DebitCreditCode"] == "1"
-    )
-
-    if debit_total != reimbursement.total_amount:
+    # Balanced on the Decimal amounts; the floats in the payload (kept for
+    # the JSON outbox) cannot hold amounts like 1500.10 exactly
+    credit_total = Decimal(reimbursement.total_amount).quantize(CENT)
+    debit_total = debit_total.quantize(CENT)
+    if debit_total != credit_total:
         raise ValueError(
             f"SAP payload not balanced. "
-            f"Debit={debit_total}, Credit={reimbursement.total_amount}"
+            f"Debit={debit_total}, Credit={credit_total}"
         )
 
     return payload
 
 
-def update_sap_record(reimbursements:list=[]):
-    """Update the SAP with the current transactions. """
-    items = []
-    try:
-        if reimbursements:
-            for reimbursement in reimbursements:
-                payload = _build_sap_payload(reimbursement)
-                items.extend(payload)
-            current_date = timezone.now().strftime("%d-%M-%Y")
-            post = post_to_byd(current_date=current_date, items=items)
-            return post
-        return False
-    except Exception as err:
-        return False
-    
+def queue_sap_records(reimbursements:list=[]):
+    """
+    Queue the GL postings of disbursed reimbursements in the ByD outbox.
+
+    Call inside the transaction that disburses them; the outbox worker
+    (manage.py process_byd_outbox) posts them to SAP. Payload problems are
+    raised here so the disbursement is rolled back instead of queuing an
+    entry ByD can never accept.
+    """
+    postings = []
+    for reimbursement in reimbursements:
+        payload = _build_sap_payload(reimbursement)
+        posting_date = timezone.localdate(reimbursement.disbursed_at or timezone.now())
+        postings.append(enqueue_posting(reimbursement, payload, posting_date))
+    return postings
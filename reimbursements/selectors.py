@@ -0,0 +1,38 @@
+from django.db.models import Prefetch
+from .models import ReimbursementComment
+
+# Maximum number of queries a single page of the reimbursement list may issue,
+# authentication and permission checks included. The count must not depend on
+# the page size; reimbursements/tests.py enforces both properties.
+LIST_QUERY_BUDGET = 12
+
+# Relations rendered by ReimbursementSerializer for every row. All roles render
+# the same serializer, so they share one plan; role-specific scoping happens in
+# the view before the plan is applied.
+LIST_SELECT_RELATED = (
+    'store',
+    'requester__role',
+    'area_manager',
+    'internal_control',
+    'bank',
+    'account',
+)
+
+
+def with_list_plan(queryset):
+    """
+    Apply the list query plan to a reimbursement queryset so serializing a page
+    costs a fixed number of queries regardless of its size.
+    """
+    return (
+        queryset
+        .select_related(*LIST_SELECT_RELATED)
+        .prefetch_related(
+            'items',
+            Prefetch(
+                'comments',
+                queryset=ReimbursementComment.objects.select_related('author__role'),
+            ),
+        )
+    )
+
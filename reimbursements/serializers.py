@@ -4,19 +4,14 @@ from .models import (
     ReimbursementItem,
     ReimbursementComment
 )
-from purchases.models import LimitConfig
+from purchases.limits import get_purchase_limit
 from decimal import Decimal
 from utils.receipt_validation import validate_receipt
-from django.utils import timezone
-from django.db.models import Sum
+from django.db import transaction
+from stores.weekly_spend import reserve_weekly_spend
 from rest_framework.exceptions import ValidationError
 
 
-purchase_limit = LimitConfig.objects.first()
-
-if purchase_limit is None:
-    purchase_limit = LimitConfig(limit=5000)  # Default limit if not set
-
 class ReimbursementCommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReimbursementComment
@@ -37,9 +32,10 @@ class ReimbursementItemSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'item_name', 'gl_code', 'transportation_from', 'transportation_to',
             'unit_price', 'quantity', 'item_total', 'purchase_request_ref',
-            'status', 'internal_control_status', 'receipt', 'requires_receipt', 'receipt_validated'
+            'status', 'internal_control_status', 'receipt', 'requires_receipt', 'receipt_validated',
+            'receipt_duplicate'
         ]
-        read_only_fields = ['item_total', 'requires_receipt',]
+        read_only_fields = ['item_total', 'requires_receipt', 'receipt_duplicate']
 
     def validate(self, attrs):
         unit_price = attrs.get('unit_price')
@@ -66,7 +62,7 @@ class ReimbursementItemSerializer(serializers.ModelSerializer):
         # ₦5,000 rule
         if unit_price is not None and quantity is not None:
             item_total = Decimal(unit_price) * quantity
-            if item_total >= purchase_limit.limit:
+            if item_total >= get_purchase_limit():
                 attrs['requires_receipt'] = True
                 if not purchase_request_ref:
                     raise serializers.ValidationError(
@@ -108,69 +104,13 @@ class ReimbursementSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['requester', 'disbursement_status', 'balance']
         
-    def validate(self, attrs):
-
-        print("validating data <==> ", attrs)
-        request = self.context['request']
-        user = request.user
-        store = user.store
-
-        items = attrs.get('items', [])
-        if not store or not store.budget:
-            return attrs  # No budget configured → allow
-
-        #  Calculate incoming reimbursement total
-        incoming_total = sum(
-            Decimal(item['unit_price']) * item['quantity']
-            for item in items
-        )
-
-        #  Calculate current week boundaries (safe, timezone-aware)
-        now = timezone.now()
-        start_week = now - timezone.timedelta(days=now.weekday())
-        start_week = start_week.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_week = start_week + timezone.timedelta(days=7)
-
-        weekly_expenses = (
-            Reimbursement.objects.filter(
-                store=store,
-                created_at__gte=start_week,
-                created_at__lt=end_week,
-            )
-            .aggregate(total=Sum('total_amount'))['total']
-            or Decimal('0.00')
-        )
-
-        projected_total = weekly_expenses + incoming_total
-        print("projected total <==> ", projected_total)
-
-        if projected_total > store.budget:
-            raise ValidationError({
-                "budget": (
-                    f"Weekly budget exceeded. "
-                    f"Spent: ₦{weekly_expenses:,.2f}, "
-                    f"Request: ₦{incoming_total:,.2f}, "
-                    f"Budget: ₦{store.budget:,.2f}"
-                )
-            })
-
-        return attrs
-    
     #get balance for the store this reimbursement belongs to
     def get_balance(self, instance):
         store = instance.store
         if not store:
             return None
 
-        approved_total = (
-            store.reimbursements
-            .filter(internal_control_status='approved')
-            .aggregate(total=Sum('total_amount'))
-            ['total']
-            or Decimal('0')
-        )
-        
-        return str(store.budget - approved_total)
+        return str(store.budget - store.approved_total)
 
 
     def to_representation(self, instance):
@@ -223,27 +163,44 @@ class ReimbursementSerializer(serializers.ModelSerializer):
                 Decimal(i['unit_price']) * i['quantity'] for i in items_data
             )
             print("total amount...")
-            reimbursement = Reimbursement.objects.create(
-                requester=user,
-                total_amount=total_amount,
-                is_draft=False,
-                **validated_data
-            )
-
-            # Create items
-            for item in items_data:
-                item['item_total'] = Decimal(item['unit_price']) * item['quantity']
-                ReimbursementItem.objects.create(
-                    reimbursement=reimbursement, **item
+            store = validated_data.get('store') or user.store
+
+            with transaction.atomic():
+                # Reserve the amount against the store's weekly budget; the
+                # conditional UPDATE keeps concurrent submissions within it
+                if store and store.budget:
+                    reserved, spent = reserve_weekly_spend(store, total_amount)
+                    if not reserved:
+                        raise ValidationError({
+                            "budget": (
+                                f"Weekly budget exceeded. "
+                                f"Spent: ₦{spent:,.2f}, "
+                                f"Request: ₦{total_amount:,.2f}, "
+                                f"Budget: ₦{store.budget:,.2f}"
+                            )
+                        })
+
+                reimbursement = Reimbursement.objects.create(
+                    requester=user,
+                    total_amount=total_amount,
+                    is_draft=False,
+                    **validated_data
                 )
 
-            # Create comments
-            for comment in comments_data:
-                ReimbursementComment.objects.create(
-                    reimbursement=reimbursement,
-                    author=user,
-                    **comment
-                )
+                # Create items
+                for item in items_data:
+                    item['item_total'] = Decimal(item['unit_price']) * item['quantity']
+                    ReimbursementItem.objects.create(
+                        reimbursement=reimbursement, **item
+                    )
+
+                # Create comments
+                for comment in comments_data:
+                    ReimbursementComment.objects.create(
+                        reimbursement=reimbursement,
+                        author=user,
+                        **comment
+                    )
 
             return reimbursement
 
@@ -1,6 +1,11 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Reimbursement
+from helpers.rollups import record_status_removal
+from .models import Reimbursement, ReimbursementItem
+from stores.ledger import post_ledger_entries, reimbursement_ledger_deltas
+from stores.models import Store
+from stores.weekly_spend import post_spend_deltas, weekly_spend_deltas
+from .facts import mark_dirty, partition_day
 # from utils.current_user import get_current_user
 from utils.email_utils import  send_reimbursement_creation_notification
 
@@ -9,6 +14,35 @@ def handle_reimbursement_request_creation(sender, instance, created, **kwargs):
     if created:
         send_reimbursement_creation_notification(instance)
 
+@receiver(post_delete, sender=Reimbursement)
+def handle_reimbursement_deletion(sender, instance, origin=None, **kwargs):
+    record_status_removal(instance)
+    mark_dirty(instance.store_id, partition_day(instance.created_at))
+
+    # Reverse its approved total and weekly reservation, unless the store
+    # itself is being deleted in the same cascade
+    if getattr(origin, 'model', type(origin)) is Store:
+        return
+    previous = {
+        'store_id': instance.store_id,
+        'status': instance.status,
+        'internal_control_status': instance.internal_control_status,
+        'total_amount': instance.total_amount,
+        **(instance.get_loaded_values() or {}),
+        'created_at': instance.created_at,
+    }
+    post_ledger_entries(reimbursement_ledger_deltas(previous, None))
+    post_spend_deltas(weekly_spend_deltas(previous, None))
+
+@receiver(post_save, sender=ReimbursementItem)
+@receiver(post_delete, sender=ReimbursementItem)
+def handle_reimbursement_item_change(sender, instance, **kwargs):
+    # Items are added and edited without saving their reimbursement; keep the
+    # dashboard facts of its day in step
+    reimbursement = Reimbursement.objects.filter(id=instance.reimbursement_id).values('store_id', 'created_at').first()
+    if reimbursement:
+        mark_dirty(reimbursement['store_id'], partition_day(reimbursement['created_at']))
+
 # @receiver(pre_save, sender=Reimbursement)
 # def handle_reimbursement_request_status_change(sender, instance, **kwargs):
 #     if not instance.pk:
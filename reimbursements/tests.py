@@ -1,3 +1,374 @@
-from django.test import TestCase
+import io
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIRequestFactory
+from banks.models import Bank
+from roles.models import Role, Permission
+from roles.permission_cache import clear_local_codenames
+from stores.models import Region, Store, StoreWeeklySpend
+from stores.weekly_spend import reserve_weekly_spend, spend_week
+from users.models import User
+from .models import Reimbursement, ReimbursementItem, ReimbursementComment, DailySpendFact
+from .facts import rebuild_store_facts
+from .exports import build_export
+from .post_to_byd import _build_sap_payload
+from .bulk import bulk_transition, UPDATED, SKIPPED_NOT_PENDING, FORBIDDEN, NOT_FOUND
+from .selectors import LIST_QUERY_BUDGET
+from utils.receipt_pipeline import read_receipt_archive, ReceiptBatchError
+from utils.pagination import KeysetPagination, get_page_size
 
-# Create your tests here.
+
+class ReimbursementListQueryBudgetTest(APITestCase):
+    """The reimbursement list must cost a fixed number of queries per page."""
+
+    def setUp(self):
+        # Role codenames and principals are cached per process and in the
+        # cache; start every test cold
+        cache.clear()
+        clear_local_codenames()
+        view_permission = Permission.objects.create(
+            codename='view_reimbursement_request',
+            name='View reimbursement request',
+        )
+        region = Region.objects.create(name='Lagos')
+        self.store = Store.objects.create(
+            name='Ikeja', code='4100001', region=region, budget=Decimal('500000')
+        )
+        self.bank = Bank.objects.create(bank_name='Test Bank', gl_code='212003')
+
+        self.requester = self._create_user('rm@example.com', 'Restaurant Manager', view_permission)
+        self.requester.store = self.store
+        self.requester.save()
+        self.internal_control = self._create_user('ic@example.com', 'Internal Control', view_permission)
+        self.treasurer = self._create_user('treasury@example.com', 'Treasurer', view_permission)
+
+    def _create_user(self, email, role_name, permission):
+        role = Role.objects.create(name=role_name)
+        role.permissions.add(permission)
+        return User.objects.create(
+            username=email, email=email, first_name=role_name, last_name='User', role=role
+        )
+
+    def _create_reimbursements(self, count, **fields):
+        for _ in range(count):
+            reimbursement = Reimbursement.objects.create(
+                requester=self.requester,
+                store=self.store,
+                total_amount=Decimal('3000'),
+                is_draft=False,
+                **fields,
+            )
+            for name in ('Diesel', 'Transportation'):
+                ReimbursementItem.objects.create(
+                    reimbursement=reimbursement,
+                    item_name=name,
+                    gl_code='614005',
+                    unit_price=Decimal('1500'),
+                    item_total=Decimal('1500'),
+                )
+            ReimbursementComment.objects.create(
+                reimbursement=reimbursement, author=self.internal_control, text='Checked'
+            )
+
+    def _count_list_queries(self, user, page_size):
+        self.client.force_authenticate(user=user)
+        # Warm the role and principal caches so only the list itself is measured
+        self.client.get(reverse('reimbursement-list-create'), {'page_size': 1})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse('reimbursement-list-create'), {'page_size': page_size}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']['results']), page_size)
+        return len(ctx.captured_queries)
+
+    def test_internal_control_list_is_constant(self):
+        self._create_reimbursements(40, status='approved')
+
+        small_page = self._count_list_queries(self.internal_control, 5)
+        large_page = self._count_list_queries(self.internal_control, 40)
+
+        self.assertEqual(small_page, large_page)
+        self.assertLessEqual(large_page, LIST_QUERY_BUDGET)
+
+    def test_treasurer_list_is_constant(self):
+        self._create_reimbursements(
+            40,
+            status='approved',
+            internal_control=self.internal_control,
+            internal_control_status='approved',
+            disbursement_status='disbursed',
+            bank=self.bank,
+        )
+
+        small_page = self._count_list_queries(self.treasurer, 5)
+        large_page = self._count_list_queries(self.treasurer, 40)
+
+        self.assertEqual(small_page, large_page)
+        self.assertLessEqual(large_page, LIST_QUERY_BUDGET)
+
+
+class BulkTransitionTest(APITestCase):
+    """Bulk approve/decline reports an outcome for every selected id."""
+
+    def setUp(self):
+        region = Region.objects.create(name='Lagos')
+        self.store = Store.objects.create(name='Ikeja', code='4100001', region=region)
+        other_store = Store.objects.create(name='Lekki', code='4100002', region=region)
+
+        self.area_manager = User.objects.create(
+            username='am@example.com', email='am@example.com',
+            role=Role.objects.create(name='Area Manager'),
+        )
+        self.area_manager.assigned_stores.add(self.store)
+        requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+
+        def create(store, **fields):
+            return Reimbursement.objects.create(
+                requester=requester, store=store, total_amount=Decimal('1000'), is_draft=False, **fields
+            )
+
+        self.pending = create(self.store)
+        self.approved = create(self.store, status='approved')
+        self.other = create(other_store)
+
+    def test_outcomes(self):
+        results = bulk_transition(
+            self.area_manager,
+            [self.pending.id, self.approved.id, self.other.id, 999999],
+            'decline',
+        )
+
+        self.assertEqual(
+            [result['result'] for result in results],
+            [UPDATED, SKIPPED_NOT_PENDING, FORBIDDEN, NOT_FOUND],
+        )
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.status, 'declined')
+        self.assertEqual(self.pending.area_manager, self.area_manager)
+
+
+class DailySpendFactTest(APITestCase):
+    """The dashboard facts follow item edits and status transitions."""
+
+    def setUp(self):
+        region = Region.objects.create(name='Lagos')
+        self.store = Store.objects.create(name='Ikeja', code='4100001', region=region)
+        self.requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+
+    def _facts(self):
+        return sorted(
+            DailySpendFact.objects.filter(store=self.store).values_list('status', 'item_name', 'amount', 'item_count')
+        )
+
+    def test_facts_follow_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            reimbursement = Reimbursement.objects.create(
+                requester=self.requester, store=self.store, total_amount=Decimal('700'), is_draft=False
+            )
+            for name, total in (('Diesel', '500'), ('Diesel', '100'), ('Water', '100')):
+                ReimbursementItem.objects.create(
+                    reimbursement=reimbursement, item_name=name, unit_price=Decimal(total), item_total=Decimal(total)
+                )
+        self.assertEqual(self._facts(), [
+            ('pending', 'Diesel', Decimal('600.00'), 2),
+            ('pending', 'Water', Decimal('100.00'), 1),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reimbursement.status = 'approved'
+            reimbursement.save()
+        self.assertEqual([fact[0] for fact in self._facts()], ['approved', 'approved'])
+
+        facts = self._facts()
+        DailySpendFact.objects.all().delete()
+        rebuild_store_facts(self.store.id)
+        self.assertEqual(self._facts(), facts)
+
+
+class WeeklySpendTest(APITestCase):
+    """Submissions reserve against the weekly budget; final declines release it."""
+
+    def setUp(self):
+        region = Region.objects.create(name='Lagos')
+        self.store = Store.objects.create(name='Ikeja', code='4100001', region=region, budget=Decimal('1000'))
+        self.requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+
+    def _submit(self, amount):
+        reserved, _ = reserve_weekly_spend(self.store, Decimal(amount))
+        if reserved:
+            return Reimbursement.objects.create(
+                requester=self.requester, store=self.store, total_amount=Decimal(amount), is_draft=False
+            )
+
+    def _spent(self):
+        iso_year, iso_week = spend_week(timezone.now())
+        return StoreWeeklySpend.objects.get(store=self.store, iso_year=iso_year, iso_week=iso_week).spent
+
+    def test_reserve_and_release(self):
+        first = self._submit('600')
+        self.assertIsNotNone(first)
+        self.assertIsNone(self._submit('500'))
+        self.assertEqual(reserve_weekly_spend(self.store, Decimal('500')), (False, Decimal('600.00')))
+
+        first.status = 'declined'
+        first.save()
+        self.assertEqual(self._spent(), Decimal('0.00'))
+        self.assertIsNotNone(self._submit('1000'))
+        self.assertEqual(self._spent(), Decimal('1000.00'))
+
+    def test_deletion_releases(self):
+        reimbursement = self._submit('700')
+        reimbursement.delete()
+        self.assertEqual(self._spent(), Decimal('0.00'))
+
+    def test_row_is_seeded_from_the_week(self):
+        Reimbursement.objects.create(
+            requester=self.requester, store=self.store, total_amount=Decimal('400'), is_draft=False
+        )
+        self.assertIsNotNone(self._submit('600'))
+        self.assertEqual(self._spent(), Decimal('1000.00'))
+
+
+class ReimbursementExportTest(APITestCase):
+    def test_internal_control_export_rows(self):
+        region = Region.objects.create(name='Lagos')
+        store = Store.objects.create(name='Ikeja', code='4100001', region=region)
+        requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+        user = User.objects.create(
+            username='ic@example.com', email='ic@example.com',
+            role=Role.objects.create(name='Internal Control'),
+        )
+        for _ in range(3):
+            reimbursement = Reimbursement.objects.create(
+                requester=requester, store=store, total_amount=Decimal('100'), is_draft=False
+            )
+            ReimbursementItem.objects.create(
+                reimbursement=reimbursement, item_name='Diesel', unit_price=Decimal('100'), item_total=Decimal('100')
+            )
+
+        sheet = build_export(user, Reimbursement.objects.all(), datetime(2025, 1, 1), datetime(2025, 12, 31))
+        self.assertEqual(len(sheet.headers), 9)
+        # One query for the reimbursements and their joins, one for the items
+        with self.assertNumQueries(2):
+            rows = list(sheet.rows)
+        self.assertEqual([len(row) for row in rows], [9, 9, 9])
+        self.assertEqual(rows[0][5], 'Diesel')
+
+
+class ReceiptArchiveTest(SimpleTestCase):
+    def _archive(self, names):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zf:
+            for name in names:
+                zf.writestr(name, b'receipt')
+        buffer.seek(0)
+        return buffer
+
+    def test_entries_are_named_after_items(self):
+        pairs = read_receipt_archive(self._archive(['12.jpg', 'week/13_fuel.png', '__MACOSX/.14.jpg', 'notes.txt']))
+        self.assertEqual([item_id for item_id, _ in pairs], ['12', '13'])
+        self.assertEqual(pairs[1][1].read(), b'receipt')
+
+    @override_settings(RECEIPT_BATCH_MAX_FILES=1)
+    def test_too_many_entries(self):
+        with self.assertRaises(ReceiptBatchError):
+            read_receipt_archive(self._archive(['1.jpg', '2.jpg']))
+
+    def test_not_a_zip(self):
+        with self.assertRaises(ReceiptBatchError):
+            read_receipt_archive(io.BytesIO(b'not a zip'))
+
+
+class KeysetPaginationTest(APITestCase):
+    """Cursor pages must neither repeat nor skip rows, even on created_at ties."""
+
+    def setUp(self):
+        region = Region.objects.create(name='Lagos')
+        store = Store.objects.create(name='Ikeja', code='4100001', region=region)
+        requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+        for _ in range(7):
+            Reimbursement.objects.create(requester=requester, store=store, total_amount=Decimal('100'), is_draft=False)
+        # Rows saved in the same instant share a created_at; only the id breaks the tie
+        tied = timezone.now()
+        Reimbursement.objects.update(created_at=tied)
+        Reimbursement.objects.filter(id=Reimbursement.objects.order_by('id').first().id).update(
+            created_at=tied - timedelta(seconds=1)
+        )
+        self.expected = list(Reimbursement.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def page(self, url):
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get(url))
+        rows = paginator.paginate_queryset(Reimbursement.objects.all(), request)
+        return [row.id for row in rows], paginator.get_next_link(), paginator.get_previous_link()
+
+    def test_pages_cover_every_row_once(self):
+        pages, url = [], '/reimbursements/?pagination=cursor&page_size=3'
+        while url:
+            ids, url, previous = self.page(url)
+            pages.append((ids, previous))
+        self.assertEqual([len(ids) for ids, _ in pages], [3, 3, 1])
+        self.assertEqual([row for ids, _ in pages for row in ids], self.expected)
+
+        # Walking back from any page returns the page before it
+        self.assertIsNone(pages[0][1])
+        for (before, _), (_, previous) in zip(pages, pages[1:]):
+            self.assertEqual(self.page(previous)[0], before)
+
+    def test_page_size_must_be_positive(self):
+        for value in ('0', '-5', 'abc'):
+            request = Request(APIRequestFactory().get('/reimbursements/', {'page_size': value}))
+            self.assertEqual(get_page_size(request), 10)
+        ids, _, _ = self.page('/reimbursements/?pagination=cursor&page_size=-1')
+        self.assertEqual(ids, self.expected)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            self.page('/reimbursements/?cursor=not-a-cursor')
+
+
+class SapPayloadTest(APITestCase):
+    """Amounts a float cannot hold exactly must still balance."""
+
+    def test_non_representable_amounts_balance(self):
+        region = Region.objects.create(name='Lagos')
+        store = Store.objects.create(name='Ikeja', code='4100001', region=region)
+        requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+        for amounts in (['1500.10'], ['1000.05', '500.05'], ['1234.56'], ['333.33', '333.33', '333.33']):
+            total = sum(Decimal(amount) for amount in amounts)
+            reimbursement = Reimbursement.objects.create(
+                requester=requester, store=store, total_amount=total, is_draft=False
+            )
+            for amount in amounts:
+                ReimbursementItem.objects.create(
+                    reimbursement=reimbursement, item_name='Diesel', gl_code='GL-612000',
+                    unit_price=Decimal(amount), item_total=Decimal(amount),
+                )
+
+            payload = _build_sap_payload(reimbursement)
+            self.assertEqual(payload[0]['TransactionCurrencyAmount']['_value_1'], float(total))
+            self.assertEqual(len(payload), len(amounts) + 1)
+
+    def test_unbalanced_payload_is_rejected(self):
+        region = Region.objects.create(name='Lagos')
+        store = Store.objects.create(name='Ikeja', code='4100001', region=region)
+        requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+        reimbursement = Reimbursement.objects.create(
+            requester=requester, store=store, total_amount=Decimal('1500.10'), is_draft=False
+        )
+        ReimbursementItem.objects.create(
+            reimbursement=reimbursement, item_name='Diesel', gl_code='612000',
+            unit_price=Decimal('1500.00'), item_total=Decimal('1500.00'),
+        )
+        with self.assertRaisesMessage(ValueError, 'Debit=1500.00, Credit=1500.10'):
+            _build_sap_payload(reimbursement)
@@ -2,6 +2,11 @@ from django.urls import path
 from .views import (
     ReimbursementRequestView,
     UploadReceiptView,
+    BatchReceiptUploadView,
+    ReceiptUploadURLView,
+    ReceiptDirectUploadView,
+    FinalizeReceiptUploadView,
+    ReceiptStatusView,
     ApproveReimbursementView,
     ApproveReimbursementItemView,
     DeclineReimbursementView,
@@ -22,6 +27,14 @@ urlpatterns = [
     path('reimbursements/<int:pk>/', ReimbursementRequestView.as_view(), name='reimbursement-update'),
     # Upload receipt for a specific reimbursement item
     path('reimbursement-items/receipt/', UploadReceiptView.as_view(), name='upload-receipt'),
+    # Upload and validate several receipts at once (files + item_ids, or a zip)
+    path('reimbursement-items/receipts/batch/', BatchReceiptUploadView.as_view(), name='upload-receipt-batch'),
+    # Upload a receipt straight to storage: get signed parameters, upload, then finalize
+    path('reimbursement-items/receipt/upload-url/', ReceiptUploadURLView.as_view(), name='receipt-upload-url'),
+    path('reimbursement-items/receipt/direct-upload/', ReceiptDirectUploadView.as_view(), name='receipt-direct-upload'),
+    path('reimbursement-items/receipt/finalize/', FinalizeReceiptUploadView.as_view(), name='receipt-finalize'),
+    # Poll the background validation of an uploaded receipt
+    path('reimbursement-items/receipt/<int:item_id>/status/', ReceiptStatusView.as_view(), name='receipt-status'),
     # Approve entire reimbursement request
     path('reimbursements/<int:pk>/approve/', ApproveReimbursementView.as_view(), name='approve-reimbursement'),
     # Approve individual reimbursement item
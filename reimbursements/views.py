@@ -1,13 +1,15 @@
 import logging
 from collections import Counter
 from rest_framework.generics import get_object_or_404
-from utils.pagination import DynamicPageSizePagination
+from utils.pagination import get_paginator
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from .models import *
 from .serializers import *
-from purchases.models import PurchaseRequest, LimitConfig, PurchaseRequestItem
+from purchases.models import PurchaseRequest, PurchaseRequestItem
+from utils.scope import get_store_scope, scope_queryset
+from rest_framework.exceptions import ValidationError
 from utils.permissions import (ViewReimbursementRequest,
                                SubmitReimbursementRequest,
                                ApproveReimbursementRequest,
@@ -17,31 +19,33 @@ from utils.permissions import (ViewReimbursementRequest,
 from helpers.response import CustomResponse
 from users.auth import JWTAuthenticationFromCookie
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.core.files.storage import FileSystemStorage
-import os
 from django.conf import settings
 from django.utils import timezone
 from decimal import InvalidOperation, Decimal
 
-from django.core.files.storage import FileSystemStorage
-from rest_framework.parsers import MultiPartParser, FormParser
-
 from django.db.models import Q, Count, Sum
 from collections import Counter
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from datetime import datetime
-from django.http import HttpResponse
-import openpyxl
-from openpyxl.utils import get_column_letter
 
-import cloudinary
-import cloudinary.uploader
 import re
-from utils.receipt_validation import validate_receipt
+from utils.receipt_pipeline import (store_receipt, queue_receipt, hash_receipt, phash_receipt, attach_receipt,
+                                    get_cached_extraction, apply_validation, check_item_receipt,
+                                    receipt_locked, read_receipt_archive, process_receipt_batch,
+                                    get_batch_limits, ReceiptBatchError, purchase_request_id, receipt_flags)
+from utils.receipt_direct_upload import (sign_upload, finalize_upload, LocalDirectUpload,
+                                         DirectUploadError)
 from django.db import transaction
 from utils.email_utils import send_reimbursement_rejection_notification, send_reimbursement_approval_notification
-from .post_to_byd import update_sap_record
-from roles.models import Role
+from .post_to_byd import queue_sap_records
+from .exports import get_export_queryset, build_export
+from utils.xlsx_export import xlsx_response
+from utils.export_jobs import request_export
+from helpers.models import ExportJob
+from helpers.views import queue_export_response
+from .selectors import with_list_plan
+from helpers.rollups import get_status_counts
+from .bulk import bulk_transition, TRANSITIONS as BULK_TRANSITIONS, UPDATED as BULK_UPDATED, NOT_FOUND as BULK_NOT_FOUND
 
 logger = logging.getLogger(__name__)
 
@@ -75,11 +79,8 @@ class ReimbursementRequestView(APIView):
         disbursement_status = request.query_params.get("disbursement_status")
 
         # Role-based access
-        if user.role.name == 'Restaurant Manager':
-            queryset = queryset.filter(store_id=user.store_id)
-        elif user.role.name == 'Area Manager':
-            queryset = queryset.filter(store__in=user.assigned_stores.all())
-        elif user.role.name == 'Internal Control':
+        queryset = scope_queryset(queryset, user)
+        if user.role.name == 'Internal Control':
             queryset = queryset.filter(
                 Q(status__in=['approved', 'pending']) & 
                 Q( Q(internal_control=user) | Q(internal_control__isnull=True)))
@@ -167,35 +168,67 @@ class ReimbursementRequestView(APIView):
         #     status_count_dict = {}
         
         # STATUS COUNT
-        status_counts_all = (
-            base_queryset_for_status_count
-            .values(status_field)
-            .annotate(count=Count(status_field))
-            .order_by()
+        # Served from the materialized rollups whenever the count scope is a set
+        # of stores; otherwise fall back to grouping the scoped queryset.
+        use_rollups, count_store_ids = self._status_count_scope(
+            user, store_ids, area_manager_ids, disbursement_status
         )
-
-        print("Status count all ==> ", status_counts_all)
-        status_count_dict = {item[status_field]: item["count"] for item in status_counts_all}
+        if use_rollups:
+            status_count_dict = get_status_counts(Reimbursement, status_field, count_store_ids)
+        else:
+            status_counts_all = (
+                base_queryset_for_status_count
+                .values(status_field)
+                .annotate(count=Count(status_field))
+                .order_by()
+            )
+            status_count_dict = {item[status_field]: item["count"] for item in status_counts_all}
         
         # --- Pagination and serialization ---
-        paginator = DynamicPageSizePagination()
+        queryset = with_list_plan(queryset)
+        paginator = get_paginator(request)
         paginated_queryset = paginator.paginate_queryset(queryset, request)
         serializer = ReimbursementSerializer(paginated_queryset, many=True)
 
+        response_data = paginator.get_payload(serializer.data)
+        response_data["status_counts"] = status_count_dict
+
         return CustomResponse(
             True,
             "Filtered reimbursement requests retrieved",
             200,
-            {
-                "count": paginator.page.paginator.count,
-                "next": paginator.get_next_link(),
-                "previous": paginator.get_previous_link(),
-                "results": serializer.data,
-                "status_counts": status_count_dict, 
-            },
+            response_data,
         )
         
 
+    def _status_count_scope(self, user, store_ids, area_manager_ids, disbursement_status):
+        """
+        Work out whether the status counts can be read from the rollups.
+
+        Returns (use_rollups, store_ids) where store_ids is None when every
+        store is in scope.
+        """
+        role = user.role.name
+
+        # Internal Control's queue also depends on who picked each request up
+        if role == 'Internal Control':
+            return False, None
+
+        # The store filter also narrows the counts by these filters
+        if store_ids and (area_manager_ids or disbursement_status):
+            return False, None
+
+        scope = get_store_scope(user)
+
+        if store_ids:
+            try:
+                requested = {int(store_id) for store_id in store_ids}
+            except ValueError:
+                return False, None
+            scope = requested if scope is None else scope & requested
+
+        return True, scope
+
     def post(self, request):
         # Step 1: Create reimbursement (draft by default)
         print("Request Data ==> ", request.data)
@@ -242,15 +275,12 @@ class ReimbursementRequestView(APIView):
                 purchase_requests.update(reimbursement=reimbursement)
             
         # Sync receipt_validated from purchase request items to reimbursement items
+            # (receipts still being validated are synced by the worker, see apply_validation)
             for item in reimbursement.items.all():
-                pr_item_ref = (item.purchase_request_ref or "").strip()
-                match = re.match(r'^PR-0*(\d+)', pr_item_ref)
-
-                if not match:
+                pr_id = purchase_request_id(item.purchase_request_ref)
+                if pr_id is None:
                     continue
 
-                pr_id = int(match.group(1))
-
                 pr_item = (
                     PurchaseRequestItem.objects
                     .filter(
@@ -263,8 +293,9 @@ class ReimbursementRequestView(APIView):
                 if not pr_item:
                     continue
 
-                item.receipt_validated = pr_item.receipt_validated
-                item.save(update_fields=['receipt_validated'])
+                for field, value in receipt_flags(pr_item).items():
+                    setattr(item, field, value)
+                item.save(update_fields=['receipt_validated', 'receipt_duplicate'])
 
             return CustomResponse(
                 True,
@@ -272,6 +303,14 @@ class ReimbursementRequestView(APIView):
                 201,
                 ReimbursementSerializer(reimbursement).data
             )
+
+        except ValidationError as err:
+            # Raised by create(), e.g. when the weekly budget cannot be reserved
+            detail = err.detail
+            message = detail.get('budget', detail.get('detail', detail)) if isinstance(detail, dict) else detail
+            if isinstance(message, list):
+                message = message[0]
+            return CustomResponse(False, message, 400, {"error": detail})
         
         except Exception as err:
             return CustomResponse(
@@ -312,70 +351,213 @@ class UploadReceiptView(APIView):
             return CustomResponse(False, "Item ID is required for validation.", 400)
 
         try:
-            item = PurchaseRequestItem.objects.get(id=item_id)
+            item = PurchaseRequestItem.objects.select_related('request').get(id=item_id)
         except PurchaseRequestItem.DoesNotExist:
             return CustomResponse(False, "Invalid item ID.", 400)
         
-        # Check if receipt already validated and uploaded
-        if item.receipt_validated:
+        # Check if receipt already uploaded; a failed receipt may be replaced
+        if receipt_locked(item):
             return CustomResponse(
                 False, 
-                "Receipt has already been uploaded and validated for this item.", 
+                "Receipt has already been uploaded for this item.", 
                 400,
                 {
+                    "receipt_status": item.receipt_status,
                     "receipt_no": item.receipt_no,
                     "extracted_vendor": item.extracted_vendor
                 }
             )
 
-        # Read the file content for validation
-        receipt_data = receipt_file.read()
-        
-        # Validate the receipt BEFORE uploading
-        validation_result = validate_receipt(
-            receipt_data, 
-            item.total_price, 
-            item.request.created_at.date() if item.request.created_at else None
+        sha256 = hash_receipt(receipt_file)
+        phash = phash_receipt(receipt_file)
+        # Content-addressed; a file that is already stored is not written again
+        receipt_url, receipt_path = store_receipt(receipt_file, sha256)
+        attach_receipt(item, receipt_url, receipt_path, sha256, phash)
+
+        # A file we have seen before is answered from the extraction cache
+        extraction = get_cached_extraction(sha256)
+        if extraction is not None:
+            apply_validation(item, check_item_receipt(item, extraction))
+            return CustomResponse(
+                True, 
+                "Receipt uploaded and validated.", 
+                200, 
+                {
+                    "item_id": item.id,
+                    "receipt_url": receipt_url,
+                    "receipt_status": item.receipt_status,
+                    "receipt_no": item.receipt_no,
+                    "duplicate_of": item.receipt_duplicate_of_id,
+                    "near_duplicate_of": item.receipt_near_duplicate_of_id,
+                    "validation_errors": item.validation_errors,
+                }
+            )
+
+        # Otherwise extraction and validation run in the background
+        # (manage.py process_receipts)
+        queue_receipt(item)
+
+        return CustomResponse(
+            True, 
+            "Receipt uploaded and queued for validation.", 
+            202, 
+            {
+                "item_id": item.id,
+                "receipt_url": receipt_url,
+                "receipt_status": item.receipt_status,
+                "duplicate_of": item.receipt_duplicate_of_id,
+                "near_duplicate_of": item.receipt_near_duplicate_of_id,
+            }
         )
 
-        # # Check validation result BEFORE uploading
-        # if not validation_result['validated']:
-        #     return CustomResponse(
-        #         False, 
-        #         "Receipt validation failed.", 
-        #         400, 
-        #         {"validation_errors": validation_result['errors']}
-        #     )
-
-        # Only upload if validation passed
-        # Need to reset file pointer since we already read it
-        receipt_file.seek(0)
-        
-        if getattr(settings, "ENVIRONMENT", "development") == "production":
-            # Upload to Cloudinary
-            result = cloudinary.uploader.upload(receipt_file, folder="receipts/")
-            receipt_url = result.get("secure_url")
+
+class BatchReceiptUploadView(APIView):
+    """
+    Upload and validate several receipts in one request.
+
+    Either send `receipts` files with matching `item_ids` (same order), or a
+    zip `archive` whose entries are named after their items ("<item_id>.jpg").
+    Receipts are validated concurrently and the response holds one result
+    per item.
+    """
+    parser_classes = [MultiPartParser, FormParser]
+    authentication_classes = [JWTAuthenticationFromCookie]
+    permission_classes = [IsAuthenticated, SubmitReimbursementRequest]
+
+    def post(self, request):
+        max_files, max_bytes = get_batch_limits()
+
+        if 'archive' in request.FILES:
+            try:
+                pairs = read_receipt_archive(request.FILES['archive'])
+            except ReceiptBatchError as e:
+                return CustomResponse(False, str(e), 400)
         else:
-            # Local storage
-            fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'receipts/'))
-            filename = fs.save(f"receipts/{receipt_file.name}", receipt_file)
-            receipt_url = fs.url(filename)
-
-        # Save validation data to item (only reached if validation passed)
-        item.receipt_validated = True
-        item.receipt_no = validation_result.get('receipt_number')
-        item.extracted_amount = validation_result.get('extracted_amount')
-        item.extracted_date = validation_result.get('extracted_date')
-        item.extracted_vendor = validation_result.get('extracted_vendor')
-        item.validation_errors = None
-        item.save()
+            receipts = request.FILES.getlist('receipts')
+            item_ids = request.data.getlist('item_ids')
+            if len(receipts) != len(item_ids):
+                return CustomResponse(False, "Provide one item ID per receipt file.", 400)
+            if len(receipts) > max_files:
+                return CustomResponse(False, f"At most {max_files} receipts can be uploaded at once.", 400)
+            if sum(receipt.size for receipt in receipts) > max_bytes:
+                return CustomResponse(False, "The receipts are too large for one upload.", 400)
+            pairs = list(zip(item_ids, receipts))
+
+        if not pairs:
+            return CustomResponse(False, "No receipt files provided.", 400)
+
+        results = process_receipt_batch(pairs)
+        summary = Counter(result["result"] for result in results)
+        return CustomResponse(True, "Receipts processed.", 200, {"summary": dict(summary), "results": results})
+
+
+class ReceiptUploadURLView(APIView):
+    """Signed parameters for uploading a receipt straight to storage."""
+    authentication_classes = [JWTAuthenticationFromCookie]
+    permission_classes = [IsAuthenticated, SubmitReimbursementRequest]
+
+    def post(self, request):
+        item_id = request.data.get('item_id')
+        if not item_id:
+            return CustomResponse(False, "Item ID is required for validation.", 400)
+
+        item = PurchaseRequestItem.objects.filter(id=item_id).first()
+        if item is None:
+            return CustomResponse(False, "Invalid item ID.", 400)
+        if receipt_locked(item):
+            return CustomResponse(False, "Receipt has already been uploaded for this item.", 400,
+                                  {"receipt_status": item.receipt_status})
+
+        return CustomResponse(True, "Upload parameters issued.", 200, sign_upload(item.id, request.user.id, request))
+
+
+class ReceiptDirectUploadView(APIView):
+    """
+    Local stand-in for the storage upload API, used outside production.
+    Authenticated by the signed upload token only, like Cloudinary.
+    """
+    parser_classes = [MultiPartParser, FormParser]
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        if getattr(settings, "ENVIRONMENT", "development") == "production":
+            return CustomResponse(False, "Not available.", 404)
+        if 'file' not in request.FILES:
+            return CustomResponse(False, "No receipt file provided.", 400)
+        try:
+            response = LocalDirectUpload().receive(request.data.get('token', ''), request.FILES['file'])
+        except DirectUploadError as e:
+            return CustomResponse(False, str(e), 400)
+        return CustomResponse(True, "Receipt stored.", 200, response)
+
+
+class FinalizeReceiptUploadView(APIView):
+    """Attach a receipt uploaded straight to storage to its item and queue it for validation."""
+    authentication_classes = [JWTAuthenticationFromCookie]
+    permission_classes = [IsAuthenticated, SubmitReimbursementRequest]
+
+    def post(self, request):
+        item_id = request.data.get('item_id')
+        token = request.data.get('token')
+        upload_response = request.data.get('response')
+        if not item_id or not token or not isinstance(upload_response, dict):
+            return CustomResponse(False, "item_id, token and the storage response are required.", 400)
+
+        with transaction.atomic():
+            item = PurchaseRequestItem.objects.select_for_update().select_related('request').filter(id=item_id).first()
+            if item is None:
+                return CustomResponse(False, "Invalid item ID.", 400)
+            if receipt_locked(item):
+                return CustomResponse(False, "Receipt has already been uploaded for this item.", 400,
+                                      {"receipt_status": item.receipt_status})
+            try:
+                receipt_url, receipt_path, sha256, phash = finalize_upload(
+                    token, item.id, request.user.id, upload_response
+                )
+            except DirectUploadError as e:
+                return CustomResponse(False, str(e), 400)
+
+            attach_receipt(item, receipt_url, receipt_path, sha256, phash)
+            extraction = get_cached_extraction(sha256) if sha256 else None
+            if extraction is not None:
+                apply_validation(item, check_item_receipt(item, extraction))
+            else:
+                queue_receipt(item)
 
         return CustomResponse(
-            True, 
-            "Receipt uploaded and validated successfully.", 
-            200, 
-            {"receipt_url": receipt_url}
+            True,
+            "Receipt uploaded and validated." if extraction is not None else "Receipt uploaded and queued for validation.",
+            200 if extraction is not None else 202,
+            {
+                "item_id": item.id,
+                "receipt_url": receipt_url,
+                "receipt_status": item.receipt_status,
+                "duplicate_of": item.receipt_duplicate_of_id,
+                "near_duplicate_of": item.receipt_near_duplicate_of_id,
+            }
+        )
+
+
+class ReceiptStatusView(APIView):
+    """Lightweight polling endpoint for the validation state of an uploaded receipt."""
+    authentication_classes = [JWTAuthenticationFromCookie]
+    permission_classes = [IsAuthenticated, SubmitReimbursementRequest]
+
+    def get(self, request, item_id):
+        item = (
+            PurchaseRequestItem.objects
+            .filter(id=item_id)
+            .values(
+                'id', 'receipt_status', 'receipt_validated', 'receipt_url', 'receipt_no',
+                'receipt_duplicate_of', 'receipt_near_duplicate_of', 'receipt_near_duplicate_distance',
+                'extracted_amount', 'extracted_date', 'extracted_vendor', 'validation_errors',
+            )
+            .first()
         )
+        if item is None:
+            return CustomResponse(False, "Invalid item ID.", 404)
+        return CustomResponse(True, "Receipt status retrieved", 200, item)
     
 class ApproveReimbursementView(APIView):
     authentication_classes = [JWTAuthenticationFromCookie]
@@ -592,89 +774,33 @@ class BulkApproveDeclineView(APIView):
                 )
             
             user = request.user
-           
-            reimbursements = self.queryset.filter(id__in=reimbursement_ids)
-            reimbursements_array =[]
-            reimbursement_items_array = []
-
-            # check if any reimbursement exists for the specified IDs
-            if reimbursements.exists():
-                user_role = user.role.name
-                print("user role ==> ", user_role)
-                if user_role == Role.Type.AREA_MANAGER:
-                    for reimbursement in reimbursements:
-                        reimbursement.status = "approved" if action == "approve" else "declined"
-                        reimbursement.area_manager=user
-                        reimbursement.area_manager_approved_at=timezone.now() if action == "approve" else None
-                        reimbursement.area_manager_declined_at=timezone.now() if action == "decline" else None
-                        reimbursements_array.append(reimbursement)
-
-                        for reimbursement_item in reimbursement.items.all():
-                            reimbursement_item.status = "approved" if action == "approve" else "declined"
-                            reimbursement_items_array.append(reimbursement_item)
-
-                elif user_role == Role.Type.INTERNAL_CONTROL:
-                    print("internal control ", user)
-                    for reimbursement in reimbursements:
-                        reimbursement.status="pending" if action == "decline" else reimbursement.status
-                        reimbursement.internal_control=user
-                        reimbursement.internal_control_status = "approved" if action == "approve" else "decline"
-                        reimbursement.internal_control_approved_at=timezone.now() if action == "approve" else None
-                        reimbursement.internal_control_declined_at=timezone.now() if action == "decline" else None
-                        reimbursements_array.append(reimbursement)
-                        print("reimbursement =>", reimbursement)
-                        for reimbursement_item in reimbursement.items.all():
-                            reimbursement.status="pending" if action == "decline" else reimbursement.status
-                            reimbursement_item.internal_control_status= "approved" if action == "approve" else "decline"
-                            reimbursement_items_array.append(reimbursement_item)
-                            print("item ==> ", reimbursement_item)
-                else:
-                    return CustomResponse(
-                        valid=False,
-                        msg=f"You are not authorized to perform this action",
-                        status=403
-                    )
-                # define internal control fields
-                internal_control_fiels = [
-                    "status",
-                    "internal_control",
-                    "internal_control_status",
-                    "internal_control_approved_at",
-                    "internal_control_declined_at"]
-                # define area manager's fields
-                area_manager_fields = [
-                    "status",
-                    "area_manager",
-                    "area_manager_approved_at",
-                    "area_manager_declined_at"]
-                
-                # Check fields to update
-                fields_to_update = area_manager_fields if user_role == Role.Type.AREA_MANAGER else internal_control_fiels
-
-                # Ensure the database is in a consistent state in event of 
-                # any update failure.
-                with transaction.atomic():
-                    print("bulk updating... ", reimbursements_array)
-                    Reimbursement.objects.bulk_update(reimbursements_array, 
-                                                      fields=fields_to_update,
-                                                      batch_size=200)
-                    print("bulk updating items...", reimbursement_items_array)
-                    ReimbursementItem.objects.bulk_update(reimbursement_items_array, 
-                                                          fields=["status","internal_control_status"],
-                                                          batch_size=200)
-                    print("done bulk updating... ")
-                    return CustomResponse(
-                        valid=True,
-                        msg=f"""{len(reimbursements_array)} reimbursements successfully {"approved" if action == "approve" else "declined"}""",
-                        status=200
-                    )
+            user_role = user.role.name
+            if user_role not in BULK_TRANSITIONS:
+                return CustomResponse(
+                    valid=False,
+                    msg=f"You are not authorized to perform this action",
+                    status=403
+                )
 
-            else:
+            results = bulk_transition(user, reimbursement_ids, action)
+            summary = dict(Counter(result["result"] for result in results))
+
+            if summary.get(BULK_NOT_FOUND) == len(results):
                 return CustomResponse(
                     valid=False,
                     msg="Reimbursements do not exist",
                     status=400
                 )
+
+            return CustomResponse(
+                valid=True,
+                msg=f"""{summary.get(BULK_UPDATED, 0)} reimbursements successfully {"approved" if action == "approve" else "declined"}""",
+                status=200,
+                data={
+                    "summary": summary,
+                    "results": results,
+                }
+            )
                 
         except Exception as err:
             return CustomResponse(
@@ -773,175 +899,6 @@ class DeclineReimbursementItemView(APIView):
 class ExportReimbursement(APIView):
     authentication_classes = [JWTAuthenticationFromCookie]
     permission_classes = [IsAuthenticated, ViewReimbursementRequest]
-    
-    # -------------------------------
-    # Helpers
-    # -------------------------------
-    #Helper methods called by the export view
-    def get_queryset(self, user, start_date, end_date, status):
-        qs = Reimbursement.objects.all()
-        
-        if user.role.name == "Area Manager":
-            return qs.filter(
-                store__in=user.assigned_stores.all(),
-                created_at__date__range=(start_date, end_date),
-                status__iexact=status,
-            )
-
-        if user.role.name == "Internal Control":
-            return qs.filter(
-                status="approved",
-                created_at__date__range=(start_date, end_date),
-                internal_control_status__iexact=status,
-            )
-
-        if user.role.name == "Treasurer":
-            return qs.filter(
-                internal_control_status="approved",
-                created_at__date__range=(start_date, end_date),
-                disbursement_status__iexact=status,
-            )
-
-        if user.role.name == "Restaurant Manager":
-            return qs.filter(
-                requester=user,
-                created_at__date__range=(start_date, end_date),
-                status__iexact=status,
-            )
-
-        return None
-
-    def export_internal_control(self, queryset, start_date, end_date):
-    
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Internal Control"
-
-        internal_control_headers=[
-            "Request ID",
-            "Requester",
-            "Store",
-            "Store Code",
-            "Store Manager",
-            "Expense Item",
-            "Amount"
-            "Status"
-            "Date Created"
-        ]
-
-        # expense_types = sorted({
-        #     item.item_name
-        #     for rr in queryset
-        #     for item in rr.items.all()
-        # })
-
-        # headers = ["Staff Name"] + expense_types + ["Total"]
-        sheet.append(internal_control_headers)
-        book=[]
-
-        for rr in queryset:
-            store = rr.store
-            store_name = store.name
-            
-            row = [
-                f"RR-{rr.id:04d}",
-                rr.requester.get_full_name(),
-                store_name,
-                store.code,
-                store.area_manager.get_full_name() if store.area_manager else "Unknown",
-                ",".join(rr.items.values_list("item_name", flat=True)),
-                float(rr.total_amount),
-                rr.internal_control_status,
-                rr.created_at.strftime("%d-%m-%Y")
-            ]
-        
-            sheet.append(row)
-     
-        return self.build_response(
-            workbook,
-            f"IC_reimbursements_{start_date.date()}_{end_date.date()}.xlsx"
-        )
-
-    def export_treasury(self, queryset:Reimbursement, start_date, end_date):
-        from collections import defaultdict
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Treasury"
-
-        treasurer_headers = [
-            "Request ID",
-            "Requester",
-            "Region",
-            "Store",
-            "Store Code",
-            "Expense Item",
-            "Area Manager",
-            "Amount",
-            "Status",
-            "Date Created",
-            "Bank Account",
-            "Bank GL Code"
-        ]
-
-        sheet.append(treasurer_headers)
-
-        for rr in queryset:
-            store = rr.store
-            store_name = store.name
-
-            row = [
-                f"RR-{rr.id:04d}",
-                rr.requester.get_full_name(),
-                store.region.name if rr.store.region else "",
-                store_name,
-                store.code,
-                ",".join(rr.items.values_list("item_name", flat=True)),
-                store.area_manager.get_full_name() if store.area_manager else "Unknown",
-                float(rr.total_amount),
-                rr.status,
-                rr.created_at.strftime("%d-%m-%Y"),
-                rr.bank.bank_name if rr.bank else "Unknown",
-                rr.bank.gl_code if rr.bank else "Unknown"
-            ]
-          
-            sheet.append(row)
-
-        return self.build_response(
-            workbook,
-            f"Treasury_reimbursements_{start_date.date()}_{end_date.date()}.xlsx"
-        )
-
-
-    def export_default(self, queryset, user, start_date, end_date):
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-
-        headers = ["Request ID", "Requester", "Store", "Total", "Status", "Date"]
-        sheet.append(headers)
-
-        for rr in queryset:
-            sheet.append([
-                f"RR-{rr.id:04d}",
-                f"{rr.requester.first_name} {rr.requester.last_name}",
-                rr.store.name if rr.store else "",
-                rr.total_amount,
-                rr.status.capitalize(),
-                rr.created_at.strftime("%Y-%m-%d")
-            ])
-
-        return self.build_response(
-            workbook,
-            f"reimbursements_{start_date.date()}_{end_date.date()}.xlsx"
-        )
-
-
-    def build_response(self, workbook, filename):
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        workbook.save(response)
-        return response
 
     #-------------------------------
     # Main GET method for export
@@ -967,17 +924,19 @@ class ExportReimbursement(APIView):
         if start_date > end_date:
             return CustomResponse(False, "start_date cannot be after end_date", 400)
 
-        queryset = self.get_queryset(user, start_date, end_date, status)
+        queryset = get_export_queryset(user, start_date, end_date, status)
         if queryset is None:
             return CustomResponse(False, "You are not allowed to export reimbursements", 403)
 
-        if user.role.name == "Internal Control":
-            return self.export_internal_control(queryset, start_date, end_date)
+        if request.query_params.get("async") in ("1", "true"):
+            # Large ranges are generated in the background (manage.py process_export_jobs)
+            job, created = request_export(user, ExportJob.Kind.REIMBURSEMENTS, {
+                "start_date": f"{start_date:%Y-%m-%d}", "end_date": f"{end_date:%Y-%m-%d}", "status": status,
+            })
+            return queue_export_response(request, job, created)
 
-        if user.role.name == "Treasurer":
-            return self.export_treasury(queryset, start_date, end_date)
-
-        return self.export_default(queryset, user, start_date, end_date)
+        # Streamed write-only workbook; see reimbursements/exports.py
+        return xlsx_response(build_export(user, queryset, start_date, end_date))
 
 
 
@@ -995,26 +954,23 @@ class DisbursemntView(APIView):
             if not bank_id:
                 return CustomResponse(False, "Bank and account IDs are required", 400)
 
-            reimbursement = get_object_or_404(Reimbursement, pk=pk)
-            if reimbursement.disbursement_status != 'pending':
-                return CustomResponse(False, "The selected reimbursement is not a pending disbursement", 400)
-            
-            reimbursement.bank = get_object_or_404(Bank, pk=bank_id)
-            # reimbursement.account = get_object_or_404(Account, pk=account_id)
-            
-            reimbursement.disbursement_status = 'disbursed'
-            reimbursement.treasurer = request.user
-            reimbursement.disbursed_at = timezone.now()
-            reimbursement.updated_by = request.user
-            reimbursement.save(user=request.user)
+            with transaction.atomic():
+                reimbursement = get_object_or_404(Reimbursement.objects.select_for_update(), pk=pk)
+                if reimbursement.disbursement_status != 'pending':
+                    return CustomResponse(False, "The selected reimbursement is not a pending disbursement", 400)
+                
+                reimbursement.bank = get_object_or_404(Bank, pk=bank_id)
+                # reimbursement.account = get_object_or_404(Account, pk=account_id)
+                
+                reimbursement.disbursement_status = 'disbursed'
+                reimbursement.treasurer = request.user
+                reimbursement.disbursed_at = timezone.now()
+                reimbursement.updated_by = request.user
+                reimbursement.save(user=request.user)
 
-            # Payload to be posted to SAP
-            is_posted = update_sap_record(reimbursements=[reimbursement])
-            print("is posted")
-            if is_posted:
-                logger.info("Reimbursement update successfully posted to BYD")
-            else:
-                logger.warning("Failed to post reimbursement update to BYD.")
+                # Queue the SAP posting; the outbox worker posts it to ByD
+                queue_sap_records(reimbursements=[reimbursement])
+                logger.info("Reimbursement posting queued for BYD")
 
             # UPDATE STORE BALANCE
             message = f"Reimbursement disbursed by Treasurer successfully"
@@ -1034,31 +990,33 @@ class BulkDisbursementView(APIView):
         if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
             return CustomResponse(False, "Invalid 'ids' format. Must be a list of integers.", 400)
         
-        reimbursements = Reimbursement.objects.filter(id__in=ids)
+        bank_id = request.data.get('bank')
+        # account_id = request.data.get('account')
+        bank = get_object_or_404(Bank, id=bank_id)
+        # account = get_object_or_404(Account, id=account_id)
         updated_count = 0
         reimbursements_data = []
         
-        for reimbursement in reimbursements:
-            if reimbursement.disbursement_status != 'pending':
-                continue  # skip non-pending disbursements
-            reimbursement.disbursement_status = 'disbursed'
-            reimbursement.treasurer = request.user
-            bank_id = request.data.get('bank')
-            # account_id = request.data.get('account')
-            reimbursement.bank = get_object_or_404(Bank, id=bank_id)
-            # reimbursement.account = get_object_or_404(Account, id=account_id)
-            reimbursement.disbursed_at = timezone.now()
-            reimbursement.updated_by = request.user
-            reimbursement.save(user=request.user)
-            reimbursements_data.append(reimbursement)
-            updated_count += 1
-            
-        is_posted = update_sap_record(reimbursements=reimbursements_data)
-        print("is posted", is_posted, reimbursements_data)
-        if is_posted:
-                logger.info("Reimbursement update successfully posted to BYD")
-        else:
-            logger.warning("Failed to post reimbursement update to BYD.")
+        try:
+            with transaction.atomic():
+                reimbursements = Reimbursement.objects.select_for_update().filter(id__in=ids)
+                for reimbursement in reimbursements:
+                    if reimbursement.disbursement_status != 'pending':
+                        continue  # skip non-pending disbursements
+                    reimbursement.disbursement_status = 'disbursed'
+                    reimbursement.treasurer = request.user
+                    reimbursement.bank = bank
+                    reimbursement.disbursed_at = timezone.now()
+                    reimbursement.updated_by = request.user
+                    reimbursement.save(user=request.user)
+                    reimbursements_data.append(reimbursement)
+                    updated_count += 1
+                    
+                # Queue the SAP postings; the outbox worker posts them to ByD
+                queue_sap_records(reimbursements=reimbursements_data)
+                logger.info("Queued ByD postings for %d reimbursement(s)", len(reimbursements_data))
+        except ValueError as err:
+            return CustomResponse(False, "Unable to disburse expenses", 400, {"error":str(err)})
         
         return CustomResponse(True, f"{updated_count} reimbursement(s) disbursed successfully", 200)
     
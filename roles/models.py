@@ -27,6 +27,22 @@ class Role(models.Model):
         related_name='roles',
         blank=True
     )
+    # Bumped whenever the role's permissions change; keys the codename cache
+    version = models.PositiveIntegerField(default=1)
+
+    def get_codenames(self):
+        """Codenames of the role's permissions, cached per role version."""
+        from .permission_cache import get_role_codenames
+        return get_role_codenames(self)
+
+    @classmethod
+    def bump_versions(cls, role_ids):
+        """Invalidate the cached codenames of these roles."""
+        cls.objects.filter(id__in=list(role_ids)).update(version=models.F('version') + 1)
+
+        # Cached principals carry their role (and its version)
+        from users.auth import invalidate_all_principals
+        invalidate_all_principals()
     
     def str__(self):
         return self.name
@@ -0,0 +1,49 @@
+"""
+Cached role permissions.
+
+Permission checks only need the set of codenames of the user's role. That
+set is cached in-process and in the shared cache under (role id, role
+version). Role.version is bumped by the signals in roles/signals.py whenever
+the role/permission M2M or a permission's codename changes, so a check
+never sees stale codenames once the role row has been reloaded; no cache
+entry has to be deleted.
+"""
+import threading
+from django.core.cache import cache
+
+CACHE_KEY = 'role-codenames:{}:{}'
+CACHE_SECONDS = 24 * 60 * 60
+
+# role id -> (version, frozenset of codenames); only the latest version is kept
+_local = {}
+_lock = threading.Lock()
+
+
+def get_role_codenames(role):
+    entry = _local.get(role.pk)
+    if entry and entry[0] == role.version:
+        return entry[1]
+
+    key = CACHE_KEY.format(role.pk, role.version)
+    codenames = cache.get(key)
+    if codenames is None:
+        codenames = frozenset(
+            role.permissions.values_list('codename', flat=True)
+        )
+        cache.set(key, codenames, timeout=CACHE_SECONDS)
+
+    with _lock:
+        current = _local.get(role.pk)
+        if current is None or current[0] <= role.version:
+            _local[role.pk] = (role.version, codenames)
+    return codenames
+
+
+def clear_local_codenames():
+    """Forget the in-process entries; role ids are reused after test rollbacks."""
+    with _lock:
+        _local.clear()
+
+
+def role_has_codename(role, codename):
+    return role is not None and codename in role.get_codenames()
@@ -5,7 +5,7 @@ class RoleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = "__all__"
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'version']
         
 class PermissionSerializer(serializers.ModelSerializer):
     class Meta:
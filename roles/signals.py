@@ -0,0 +1,44 @@
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from users.auth import invalidate_all_principals
+from .models import Role, Permission
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def handle_role_permissions_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        # role.permissions.add/remove/clear/set
+        if action != 'pre_clear':
+            Role.bump_versions([instance.pk])
+            instance.refresh_from_db(fields=['version'])
+    elif action == 'pre_clear':
+        # permission.roles.clear(): remember the roles before the rows go
+        instance._cleared_role_ids = list(instance.roles.values_list('id', flat=True))
+    elif action == 'post_clear':
+        Role.bump_versions(getattr(instance, '_cleared_role_ids', []))
+    else:
+        # permission.roles.add/remove
+        Role.bump_versions(pk_set or [])
+
+
+@receiver(pre_save, sender=Permission)
+def handle_permission_change(sender, instance, **kwargs):
+    if not instance.pk:
+        return
+    previous = Permission.objects.filter(pk=instance.pk).values_list('codename', flat=True).first()
+    if previous is not None and previous != instance.codename:
+        Role.bump_versions(instance.roles.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Permission)
+def handle_permission_deletion(sender, instance, **kwargs):
+    Role.bump_versions(instance.roles.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Role)
+def handle_role_change(sender, instance, created, **kwargs):
+    # Cached principals carry the role row (name, version)
+    if not created:
+        invalidate_all_principals()
@@ -1,3 +1,34 @@
+from django.core.cache import cache
 from django.test import TestCase
+from .models import Role, Permission
+from .permission_cache import clear_local_codenames
 
-# Create your tests here.
+
+class RoleCodenameCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_codenames()
+        self.role = Role.objects.create(name='Area Manager')
+        self.view = Permission.objects.create(codename='view_reimbursement_request', name='View')
+        self.approve = Permission.objects.create(codename='approve_reimbursement_request', name='Approve')
+        self.role.permissions.add(self.view)
+
+    def test_codenames_are_cached_per_version(self):
+        role = Role.objects.get(pk=self.role.pk)
+        self.assertEqual(role.get_codenames(), {'view_reimbursement_request'})
+        with self.assertNumQueries(0):
+            role.get_codenames()
+
+        self.role.permissions.add(self.approve)
+        role = Role.objects.get(pk=self.role.pk)
+        self.assertIn('approve_reimbursement_request', role.get_codenames())
+
+        self.approve.roles.remove(self.role)
+        role = Role.objects.get(pk=self.role.pk)
+        self.assertNotIn('approve_reimbursement_request', role.get_codenames())
+
+    def test_renamed_permission_invalidates(self):
+        Role.objects.get(pk=self.role.pk).get_codenames()
+        self.view.codename = 'list_reimbursement_request'
+        self.view.save()
+        self.assertEqual(Role.objects.get(pk=self.role.pk).get_codenames(), {'list_reimbursement_request'})
@@ -61,4 +61,6 @@ class PermissionListView(APIView):
         # Update permission
         permission_id = request.data.get('id')
         Permission.objects.filter(id=permission_id).update(**request.data)
+        # .update() skips the signals; a new codename changes the roles' permission sets
+        Role.bump_versions(Role.objects.filter(permissions__id=permission_id).values_list('id', flat=True))
         return CustomResponse(True, "Permission updated successfully")
@@ -0,0 +1,177 @@
+"""
+Store balance ledger.
+
+Every change to the approved reimbursement total of a store is written as a
+StoreLedgerEntry and applied to Store.approved_total in the same transaction,
+so reading a balance never has to aggregate the reimbursement history.
+StoreBalanceSnapshot rows are periodic checkpoints used to answer
+"what was the balance at date X" without replaying the whole ledger.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Store, StoreLedgerEntry, StoreBalanceSnapshot
+
+APPROVED = 'approved'
+
+
+def approved_contribution(internal_control_status, total_amount):
+    """Amount a reimbursement contributes to its store's approved total."""
+    if internal_control_status == APPROVED:
+        return total_amount or Decimal('0')
+    return Decimal('0')
+
+
+def reimbursement_ledger_deltas(previous, current):
+    """
+    Work out the ledger entries needed to move a reimbursement from its
+    previous state to its current one.
+
+    previous/current: dict with store_id, internal_control_status and
+    total_amount, or None when the reimbursement did not exist.
+
+    Returns: list of (store_id, amount) tuples, without zero amounts.
+    """
+    deltas = defaultdict(Decimal)
+    if previous:
+        deltas[previous['store_id']] -= approved_contribution(
+            previous['internal_control_status'], previous['total_amount']
+        )
+    if current:
+        deltas[current['store_id']] += approved_contribution(
+            current['internal_control_status'], current['total_amount']
+        )
+    return [(store_id, amount) for store_id, amount in deltas.items() if store_id and amount]
+
+
+def post_ledger_entries(entries, reimbursement_id=None):
+    """
+    Write ledger entries and apply them to the store totals atomically.
+
+    entries: iterable of (store_id, amount) or (store_id, amount, reimbursement_id).
+
+    The store rows are locked (by the UPDATE) before the entries are stamped
+    and written, so take_snapshot() sees either both the total and the
+    entries or neither.
+    """
+    entries = [
+        (entry[0], entry[1], entry[2] if len(entry) > 2 else reimbursement_id)
+        for entry in entries
+    ]
+    totals = defaultdict(Decimal)
+    for store_id, amount, _ in entries:
+        totals[store_id] += amount
+
+    if not entries:
+        return
+
+    with transaction.atomic():
+        # Lock order by store id keeps concurrent postings deadlock-free
+        for store_id in sorted(totals):
+            Store.objects.filter(pk=store_id).update(
+                approved_total=F('approved_total') + totals[store_id]
+            )
+        now = timezone.now()
+        StoreLedgerEntry.objects.bulk_create([
+            StoreLedgerEntry(store_id=store_id, amount=amount, reimbursement_id=entry_reimbursement_id, created_at=now)
+            for store_id, amount, entry_reimbursement_id in entries
+        ])
+
+
+def record_reimbursement_changes(reimbursements):
+    """Post the ledger entries for reimbursements that have just been saved."""
+    entries = []
+    for reimbursement in reimbursements:
+        current = {
+            'store_id': reimbursement.store_id,
+            'internal_control_status': reimbursement.internal_control_status,
+            'total_amount': reimbursement.total_amount,
+        }
+        entries.extend(
+            (store_id, amount, reimbursement.pk)
+            for store_id, amount in reimbursement_ledger_deltas(
+                reimbursement.get_loaded_values(), current
+            )
+        )
+    post_ledger_entries(entries)
+
+
+def record_reimbursement_change(reimbursement):
+    """Post the ledger entries for a reimbursement that has just been saved."""
+    record_reimbursement_changes([reimbursement])
+
+
+def take_snapshot(store_id):
+    """
+    Checkpoint the approved total and budget of a store.
+
+    The store row is locked so the snapshot cannot interleave with a posting
+    that has written its entry but not yet updated the total.
+    """
+    with transaction.atomic():
+        store = Store.objects.select_for_update().get(pk=store_id)
+        return StoreBalanceSnapshot.objects.create(
+            store=store,
+            approved_total=store.approved_total,
+            budget=store.budget,
+            taken_at=timezone.now(),
+        )
+
+
+def rebuild_approved_total(store_id):
+    """
+    Recompute a store's approved total from its reimbursements and post a
+    correcting entry for any drift. Returns the correction amount.
+    """
+    with transaction.atomic():
+        store = Store.objects.select_for_update().get(pk=store_id)
+        actual = (
+            store.reimbursements
+            .filter(internal_control_status=APPROVED)
+            .aggregate(total=Sum('total_amount'))['total']
+            or Decimal('0')
+        )
+        drift = actual - store.approved_total
+        if drift:
+            post_ledger_entries([(store.pk, drift)])
+        return drift
+
+
+def get_budget_at(store, when):
+    """Budget of the store at the given moment according to its budget history."""
+    change = (
+        store.budget_history
+        .filter(changed_at__lte=when)
+        .order_by('-changed_at')
+        .first()
+    )
+    if change:
+        return change.new_budget
+    if store.budget_history.exists():
+        # The first recorded change happened later; use the budget it replaced
+        first = store.budget_history.order_by('changed_at').first()
+        return first.previous_budget
+    return store.budget
+
+
+def get_balance_at(store, when):
+    """
+    Balance of the store at a past moment: the nearest snapshot taken at or
+    before `when`, plus the ledger entries posted between the two.
+    """
+    snapshot = (
+        store.balance_snapshots
+        .filter(taken_at__lte=when)
+        .order_by('-taken_at')
+        .first()
+    )
+    entries = store.ledger_entries.filter(created_at__lte=when)
+    approved_total = Decimal('0')
+    if snapshot:
+        approved_total = snapshot.approved_total
+        entries = entries.filter(created_at__gt=snapshot.taken_at)
+
+    approved_total += entries.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    return get_budget_at(store, when) - approved_total
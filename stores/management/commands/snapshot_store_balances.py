@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from stores.ledger import rebuild_approved_total, take_snapshot
+from stores.models import Store
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint every store's approved total and budget. "
+        "Run periodically (e.g. nightly) so historical balances stay cheap to compute."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="Recompute approved totals from reimbursements before taking the snapshots.",
+        )
+
+    def handle(self, *args, **options):
+        store_ids = Store.objects.values_list('id', flat=True)
+
+        for store_id in store_ids:
+            if options['rebuild']:
+                drift = rebuild_approved_total(store_id)
+                if drift:
+                    self.stdout.write(f"Store {store_id}: corrected approved total by {drift}")
+            take_snapshot(store_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {len(store_ids)} store balance(s)."))
@@ -20,6 +20,8 @@ class Store(models.Model):
     region = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='region_stores')
     budget = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     balance = models.PositiveIntegerField(default=0)
+    # Sum of internal-control approved reimbursements, maintained by stores.ledger
+    approved_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
     created_at = models.DateTimeField(auto_now_add=True)  # track when store created
     updated_at = models.DateTimeField(auto_now=True)      # track last modified
     is_active = models.BooleanField(default=True)
@@ -42,6 +44,10 @@ class Store(models.Model):
             models.UniqueConstraint(fields=['name', 'region'], name='unique_store_in_region')
         ]
         ordering = ['name']
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.name} - ({self.code})"
@@ -50,15 +56,26 @@ class Store(models.Model):
     def save(self, *args, **kwargs):
         if not self.pk:  # only set balance on creation
             self.balance = self.budget
+        elif not self._state.adding and kwargs.get('update_fields') is None:
+            # approved_total is only moved by F() updates in stores.ledger;
+            # writing back the value read earlier would undo concurrent postings
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'approved_total'
+            ]
         super().save(*args, **kwargs)
 
     # @cached_property
     def get_balance(self):
         """Get the entire balance of the store."""
-        approved_expenses = self.reimbursements.filter(internal_control_status='approved')
-        total_approved = approved_expenses.aggregate(total=models.Sum('total_amount'))['total']
+        total_approved = self.approved_total
         remaining_balance = (self.balance - total_approved) if total_approved else self.balance
         return remaining_balance
+
+    def get_balance_at(self, when):
+        """Get the balance of the store at a past date from the ledger snapshots."""
+        from .ledger import get_balance_at
+        return get_balance_at(self, when)
     
    
     def _get_current_week_year(self):
@@ -154,3 +171,62 @@ class StoreBudgetHistory(models.Model):
 
     def __str__(self):
         return f"{self.store.name}: {self.previous_budget} → {self.new_budget} on {self.changed_at:%Y-%m-%d}"
+
+
+class StoreLedgerEntry(models.Model):
+    """Append-only record of a change to a store's approved reimbursement total."""
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="ledger_entries")
+    reimbursement = models.ForeignKey(
+        'reimbursements.Reimbursement',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_entries"
+    )
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.store_id}: {self.amount} on {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class StoreBalanceSnapshot(models.Model):
+    """Periodic checkpoint of a store's approved total and budget."""
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="balance_snapshots")
+    approved_total = models.DecimalField(max_digits=14, decimal_places=2)
+    budget = models.DecimalField(max_digits=12, decimal_places=2)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'taken_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.store_id}: {self.budget - self.approved_total} at {self.taken_at:%Y-%m-%d %H:%M}"
+
+
+class StoreWeeklySpend(models.Model):
+    """
+    Reimbursed amount requested by a store in an ISO week, excluding
+    reimbursements declined by the area manager. Maintained by
+    stores.weekly_spend and checked against Store.budget on submission.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="weekly_spend")
+    iso_year = models.PositiveSmallIntegerField()
+    iso_week = models.PositiveSmallIntegerField()
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'iso_year', 'iso_week'], name='unique_store_weekly_spend')
+        ]
+
+    def __str__(self):
+        return f"{self.store_id} {self.iso_year}-W{self.iso_week:02d}: {self.spent}"
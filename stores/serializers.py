@@ -1,8 +1,6 @@
 # stores/serializers.py
 from rest_framework import serializers
 from .models import Region, Store, StoreBudgetHistory
-from django.db.models import Sum
-from decimal import Decimal
 
 class RegionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -78,14 +76,7 @@ class StoreBudgetSerializer(serializers.ModelSerializer):
         read_only_fields = ['updated_at', 'created_at', 'balance']
 
     def get_balance(self, instance):
-        approved_total = (
-            instance.reimbursements
-            .filter(internal_control_status='approved')
-            .aggregate(total=Sum('total_amount'))
-            ['total']
-            or Decimal('0')
-        )
-        return str(instance.budget - approved_total)
+        return str(instance.budget - instance.approved_total)
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from utils.dashboard_cache import bump_store_versions
+from .models import Store
+
+
+@receiver(post_save, sender=Store)
+def handle_store_change(sender, instance, **kwargs):
+    # The dashboard shows the store budget; drop cached payloads covering it
+    bump_store_versions([instance.pk])
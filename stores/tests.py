@@ -1,3 +1,78 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from reimbursements.models import Reimbursement
+from users.models import User
+from .ledger import post_ledger_entries, take_snapshot, get_balance_at
+from .models import Region, Store, StoreLedgerEntry
+from utils.dashboard_cache import dashboard_key, bump_store_versions, get_or_compute
 
-# Create your tests here.
+
+class DashboardCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_store_change_invalidates_covering_keys(self):
+        both = dashboard_key('Admin', [1, 2], 2025, 6, '2')
+        other = dashboard_key('Admin', [3], 2025, 6, '2')
+        self.assertEqual(dashboard_key('Admin', [2, 1], 2025, 6, '2'), both)
+
+        bump_store_versions([2])
+        self.assertNotEqual(dashboard_key('Admin', [1, 2], 2025, 6, '2'), both)
+        self.assertEqual(dashboard_key('Admin', [3], 2025, 6, '2'), other)
+
+    def test_payload_is_computed_once(self):
+        calls = []
+        compute = lambda: calls.append(1) or {'weekly_expenses': 10.0}
+        self.assertEqual(get_or_compute('k', compute), {'weekly_expenses': 10.0})
+        self.assertEqual(get_or_compute('k', compute), {'weekly_expenses': 10.0})
+        self.assertEqual(len(calls), 1)
+
+
+class StoreLedgerTest(TestCase):
+    def setUp(self):
+        region = Region.objects.create(name='Lagos')
+        self.store = Store.objects.create(name='Ikeja', code='4100001', region=region, budget=Decimal('100000'))
+        self.requester = User.objects.create(username='rm@example.com', email='rm@example.com')
+
+    def _approved_total(self):
+        return Store.objects.get(pk=self.store.pk).approved_total
+
+    def _entries_total(self):
+        return StoreLedgerEntry.objects.filter(store=self.store).aggregate(total=Sum('amount'))['total']
+
+    def test_approval_and_deletion_are_posted(self):
+        reimbursement = Reimbursement.objects.create(
+            requester=self.requester, store=self.store, total_amount=Decimal('2500'), is_draft=False
+        )
+        self.assertEqual(self._approved_total(), Decimal('0'))
+
+        reimbursement.internal_control_status = 'approved'
+        reimbursement.save()
+        self.assertEqual(self._approved_total(), Decimal('2500'))
+        self.assertEqual(self._entries_total(), Decimal('2500'))
+
+        reimbursement.delete()
+        self.assertEqual(self._approved_total(), Decimal('0'))
+        self.assertEqual(self._entries_total(), Decimal('0'))
+
+    def test_store_save_keeps_concurrent_postings(self):
+        stale = Store.objects.get(pk=self.store.pk)
+        post_ledger_entries([(self.store.pk, Decimal('700'))])
+        stale.name = 'Ikeja GRA'
+        stale.save()
+        self.assertEqual(self._approved_total(), Decimal('700'))
+        self.assertEqual(Store.objects.get(pk=self.store.pk).name, 'Ikeja GRA')
+
+    def test_balance_at_replays_from_snapshot(self):
+        post_ledger_entries([(self.store.pk, Decimal('1000'))])
+        snapshot = take_snapshot(self.store.pk)
+        post_ledger_entries([(self.store.pk, Decimal('500'))])
+        store = Store.objects.get(pk=self.store.pk)
+
+        self.assertTrue(StoreLedgerEntry.objects.filter(created_at__lte=snapshot.taken_at).exists())
+        self.assertEqual(get_balance_at(store, snapshot.taken_at), Decimal('99000'))
+        self.assertEqual(get_balance_at(store, timezone.now() + timedelta(seconds=1)), Decimal('98500'))
@@ -10,7 +10,7 @@ from users.auth import JWTAuthenticationFromCookie
 from utils.permissions import ManageUsers
 from rest_framework.permissions import IsAuthenticated
 from decimal import Decimal
-from utils.pagination import DynamicPageSizePagination
+from utils.pagination import get_paginator
 from django.conf import settings
 from .sap_auth_utils import fetch_sap_token
 import requests
@@ -287,14 +287,10 @@ class StoreBudgetView(APIView):
         area_manager_id = request.query_params.get('area_manager')
         if area_manager_id:
             queryset = Store.objects.filter(area_manager__id=area_manager_id).order_by('-created_at')
-        paginator = DynamicPageSizePagination()
+        paginator = get_paginator(request)
         paginated_stores = paginator.paginate_queryset(queryset, request)
         serializer = StoreBudgetSerializer(paginated_stores, many=True)
-        return CustomResponse(True, "Store Budgets Retrieved Successfully", 200, {"count": paginator.page.paginator.count,
-                                                                                "next": paginator.get_next_link(),
-                                                                                "previous": paginator.get_previous_link(),
-                                                                                "results": serializer.data,
-                                                                                })
+        return CustomResponse(True, "Store Budgets Retrieved Successfully", 200, paginator.get_payload(serializer.data))
     def post(self, request):
         """Creates a new store"""
         serializer = StoreBudgetSerializer(data=request.data)
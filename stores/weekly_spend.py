@@ -0,0 +1,136 @@
+"""
+Per-store weekly spend counters.
+
+A StoreWeeklySpend row holds what a store has requested in an ISO week. A
+submission reserves its amount with one conditional UPDATE
+(spent + amount <= budget), so the budget check reads no reimbursement
+history and two concurrent submissions cannot both pass it. The amount is
+released when the area manager finally declines the reimbursement.
+Rows are created on first use, seeded from the reimbursements of that week.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import StoreWeeklySpend
+
+RELEASED = 'declined'
+
+
+def spend_week(created_at):
+    """(ISO year, ISO week) a reimbursement created at this moment counts towards."""
+    iso = timezone.localdate(created_at).isocalendar()
+    return iso[0], iso[1]
+
+
+def reserved_amount(status, total_amount):
+    """Amount a reimbursement holds against its store's weekly budget."""
+    if status == RELEASED:
+        return Decimal('0')
+    return total_amount or Decimal('0')
+
+
+def _week_total(store_id, iso_year, iso_week):
+    from reimbursements.models import Reimbursement
+
+    monday = date.fromisocalendar(iso_year, iso_week, 1)
+    return (
+        Reimbursement.objects
+        .filter(
+            store_id=store_id,
+            created_at__date__gte=monday,
+            created_at__date__lte=monday + timedelta(days=6),
+        )
+        .exclude(status=RELEASED)
+        .aggregate(total=Sum('total_amount'))['total']
+        or Decimal('0')
+    )
+
+
+def get_week_row(store_id, iso_year, iso_week):
+    row, _ = StoreWeeklySpend.objects.get_or_create(
+        store_id=store_id,
+        iso_year=iso_year,
+        iso_week=iso_week,
+        defaults={'spent': _week_total(store_id, iso_year, iso_week)},
+    )
+    return row
+
+
+def reserve_weekly_spend(store, amount, when=None):
+    """
+    Reserve amount against the store's budget for the week of `when` (now by
+    default). Must run in the transaction that creates the reimbursement.
+
+    Returns: (reserved, spent) where spent is the week's total before this
+    reservation.
+    """
+    iso_year, iso_week = spend_week(when or timezone.now())
+    row = get_week_row(store.pk, iso_year, iso_week)
+    reserved = StoreWeeklySpend.objects.filter(
+        pk=row.pk, spent__lte=store.budget - amount
+    ).update(spent=F('spent') + amount, updated_at=timezone.now())
+    if reserved:
+        return True, None
+    row.refresh_from_db(fields=['spent'])
+    return False, row.spent
+
+
+def weekly_spend_deltas(previous, current):
+    """
+    Work out the counter changes needed to move an existing reimbursement from
+    its previous state to its current one.
+
+    previous/current: dict with store_id, status, total_amount and created_at;
+    current is None when the reimbursement was deleted. Creation is not
+    covered: reserve_weekly_spend is called before the insert.
+
+    Returns: list of (store_id, (iso year, iso week), amount), without zero amounts.
+    """
+    deltas = defaultdict(Decimal)
+    deltas[(previous['store_id'], spend_week(previous['created_at']))] -= reserved_amount(
+        previous['status'], previous['total_amount']
+    )
+    if current:
+        deltas[(current['store_id'], spend_week(current['created_at']))] += reserved_amount(
+            current['status'], current['total_amount']
+        )
+    return [
+        (store_id, week, amount)
+        for (store_id, week), amount in deltas.items()
+        if store_id and amount
+    ]
+
+
+def post_spend_deltas(deltas):
+    """
+    Apply counter changes. Weeks without a row are skipped; the row is seeded
+    from the current reimbursements when it is first used.
+    """
+    totals = defaultdict(Decimal)
+    for store_id, week, amount in deltas:
+        totals[(store_id, week)] += amount
+
+    with transaction.atomic():
+        # Same lock order as reservations and the ledger: by store
+        for (store_id, (iso_year, iso_week)), amount in sorted(totals.items()):
+            if amount:
+                StoreWeeklySpend.objects.filter(
+                    store_id=store_id, iso_year=iso_year, iso_week=iso_week
+                ).update(spent=F('spent') + amount, updated_at=timezone.now())
+
+
+def record_weekly_spend_change(reimbursement):
+    """Release or adjust the reservation of a reimbursement that has just been saved."""
+    previous = reimbursement.get_loaded_values()
+    if not previous or not reimbursement.created_at:
+        return
+    current = {
+        'store_id': reimbursement.store_id,
+        'status': reimbursement.status,
+        'total_amount': reimbursement.total_amount,
+        'created_at': reimbursement.created_at,
+    }
+    post_spend_deltas(weekly_spend_deltas({**previous, 'created_at': reimbursement.created_at}, current))
@@ -1,10 +1,102 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
 from helpers.exceptions import CustomValidationException
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.request import Request
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework.exceptions import AuthenticationFailed
 
+# Cached principals: principal:<user id>:<data_updated_at>:<roles epoch>.
+# The user's data version is the current data_updated_at; User.save and
+# assigned store changes (users/signals.py) move it and drop the version key.
+# The roles epoch moves whenever a role or its permissions change.
+PRINCIPAL_KEY = 'principal:{}:{}:{}'
+PRINCIPAL_VERSION_KEY = 'principal-version:{}'
+ROLES_EPOCH_KEY = 'principal-roles-epoch'
+
+
+def get_principal_seconds():
+    return getattr(settings, 'PRINCIPAL_CACHE_SECONDS', 60)
+
+
+def _fetch_principal(user_id):
+    """
+    The user with role, store and region joined and the assigned store ids,
+    in one query (one row per assigned store).
+    """
+    from .models import User
+
+    rows = list(
+        User.objects
+        .select_related('role', 'store', 'region')
+        .filter(id=user_id)
+        .annotate(assigned_store=F('assigned_stores__id'))
+    )
+    if not rows:
+        return None
+    user = rows[0]
+    user.assigned_store_ids = frozenset(row.assigned_store for row in rows if row.assigned_store is not None)
+    return user
+
+
+def _version(user):
+    return user.data_updated_at.isoformat() if user.data_updated_at else 'none'
+
+
+def load_principal(user_id):
+    """
+    The authenticated user, hydrated as in _fetch_principal and cached for
+    PRINCIPAL_CACHE_SECONDS. Returns None if the user does not exist.
+    """
+    version_key = PRINCIPAL_VERSION_KEY.format(user_id)
+    versions = cache.get_many([version_key, ROLES_EPOCH_KEY])
+    epoch = versions.get(ROLES_EPOCH_KEY, 0)
+
+    if version_key in versions:
+        user = cache.get(PRINCIPAL_KEY.format(user_id, versions[version_key], epoch))
+        if user is not None:
+            return user
+
+    user = _fetch_principal(user_id)
+    if user is None:
+        return None
+    timeout = get_principal_seconds()
+    cache.set_many({
+        version_key: _version(user),
+        PRINCIPAL_KEY.format(user_id, _version(user), epoch): user,
+    }, timeout=timeout)
+    return user
+
+
+def invalidate_principal(user_id):
+    cache.delete(PRINCIPAL_VERSION_KEY.format(user_id))
+
+
+def invalidate_all_principals():
+    """Role permissions changed; cached roles of every user are stale."""
+    try:
+        cache.incr(ROLES_EPOCH_KEY)
+    except ValueError:
+        cache.set(ROLES_EPOCH_KEY, 1, timeout=None)
+
+
 class JWTAuthenticationFromCookie(JWTAuthentication):
+    def get_user(self, validated_token):
+        """Load the principal (see load_principal) instead of a bare user row."""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed('Token contained no recognizable user identification')
+
+        user = load_principal(user_id)
+        if user is None:
+            raise AuthenticationFailed('User not found')
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive')
+        return user
+
     def authenticate(self, request: Request):
         raw_token = request.COOKIES.get('access_token')
        
@@ -21,6 +113,6 @@ class JWTAuthenticationFromCookie(JWTAuthentication):
             user = self.get_user(validated_token)
             if not  user.is_active:
                 raise CustomValidationException("Your account is not active. Please contact your administrator.")
-            return self.get_user(validated_token), validated_token
+            return user, validated_token
         except TokenError as e:
-            raise AuthenticationFailed(f'Invalid token: {str(e)}')
\ No newline at end of file
+            raise AuthenticationFailed(f'Invalid token: {str(e)}')
@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from django.utils.functional import cached_property
 from datetime import timedelta
 from roles.models import Role
 from stores.models import Store, Region
@@ -91,10 +92,22 @@ class User(AbstractUser):
 
         super().save(*args, **kwargs)
 
+        from .auth import invalidate_principal
+        invalidate_principal(self.pk)
+
+    @cached_property
+    def assigned_store_ids(self):
+        """Ids of the stores assigned to an area manager (preloaded by users.auth.load_principal)."""
+        return frozenset(self.assigned_stores.values_list('id', flat=True))
+
 
     class Meta:
         verbose_name = _("User")
         verbose_name_plural = _("Users")
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+        ]
 
 
 
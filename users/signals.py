@@ -0,0 +1,34 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from .auth import invalidate_principal
+from .models import User
+
+
+def touch_users(user_ids):
+    """Move data_updated_at of these users and drop their cached principals."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    User.objects.filter(id__in=user_ids).update(data_updated_at=timezone.now())
+    for user_id in user_ids:
+        invalidate_principal(user_id)
+
+
+@receiver(m2m_changed, sender=User.assigned_stores.through)
+def handle_assigned_stores_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        # user.assigned_stores.add/remove/clear/set
+        if action != 'pre_clear':
+            instance.__dict__.pop('assigned_store_ids', None)
+            touch_users([instance.pk])
+    elif action == 'pre_clear':
+        # store.assigned_users.clear(): remember the users before the rows go
+        instance._cleared_user_ids = list(instance.assigned_users.values_list('id', flat=True))
+    elif action == 'post_clear':
+        touch_users(getattr(instance, '_cleared_user_ids', []))
+    else:
+        # store.assigned_users.add/remove
+        touch_users(pk_set or [])
@@ -1,3 +1,34 @@
+from decimal import Decimal
+from django.core.cache import cache
 from django.test import TestCase
+from roles.models import Role
+from stores.models import Region, Store
+from .auth import load_principal
+from .models import User
 
-# Create your tests here.
+
+class PrincipalCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(name='Lagos')
+        self.ikeja = Store.objects.create(name='Ikeja', code='4100001', region=region, budget=Decimal('500000'))
+        self.lekki = Store.objects.create(name='Lekki', code='4100002', region=region, budget=Decimal('500000'))
+        self.user = User.objects.create(
+            username='am@example.com', email='am@example.com',
+            role=Role.objects.create(name='Area Manager'), region=region
+        )
+        self.user.assigned_stores.add(self.ikeja)
+
+    def test_principal_is_hydrated_and_cached(self):
+        principal = load_principal(self.user.pk)
+        self.assertEqual(principal.assigned_store_ids, frozenset([self.ikeja.pk]))
+        with self.assertNumQueries(0):
+            principal = load_principal(self.user.pk)
+            self.assertEqual(principal.role.name, 'Area Manager')
+            self.assertEqual(principal.region.name, 'Lagos')
+
+    def test_assigned_store_change_invalidates(self):
+        load_principal(self.user.pk)
+        self.lekki.assigned_users.add(self.user)
+        principal = load_principal(self.user.pk)
+        self.assertEqual(principal.assigned_store_ids, frozenset([self.ikeja.pk, self.lekki.pk]))
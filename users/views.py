@@ -32,7 +32,7 @@ from utils.permissions import *
 from rest_framework.permissions import IsAuthenticated
 from .auth import JWTAuthenticationFromCookie
 from django.http import HttpResponseRedirect
-from utils.pagination import DynamicPageSizePagination
+from utils.pagination import DynamicPageSizePagination, get_paginator
 from collections import Counter
 from django.shortcuts import get_object_or_404
 
@@ -236,27 +236,20 @@ class UserView(APIView):
     def get(self, request):
         users = User.objects.all().order_by('-created_at')
 
-        paginator = DynamicPageSizePagination()
+        paginator = get_paginator(request)
         paginated_users = paginator.paginate_queryset(users, request)
 
-        # Count active/inactive for paginated results only
-        if paginated_users is not None:
-            active_count = sum(1 for u in users if u.is_active)
-            inactive_count = sum(1 for u in users if not u.is_active)
-        else:
-            active_count = 0
-            inactive_count = 0
+        # Count active/inactive in the database instead of loading every user
+        activity = users.aggregate(
+            active=Count('id', filter=Q(is_active=True)),
+            inactive=Count('id', filter=Q(is_active=False)),
+        )
 
         serializer = UserSerializer(paginated_users, many=True)
 
-        response_data = {
-            "count": paginator.page.paginator.count,  # total in DB
-            "next": paginator.get_next_link(),
-            "previous": paginator.get_previous_link(),
-            "results": serializer.data,
-            "active": active_count,
-            "inactive": inactive_count
-        }
+        response_data = paginator.get_payload(serializer.data)
+        response_data["active"] = activity["active"]
+        response_data["inactive"] = activity["inactive"]
 
         return CustomResponse(True, "Users retrieved successfully", data=response_data)
 
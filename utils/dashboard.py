@@ -3,7 +3,7 @@ from datetime import date
 from helpers.response import CustomResponse
 from rest_framework.views import APIView
 from purchases.models import PurchaseRequest
-from reimbursements.models import Reimbursement, ReimbursementItem
+from reimbursements.models import Reimbursement, DailySpendFact
 from stores.models import Store
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Sum, F, Q
@@ -11,8 +11,9 @@ from django.db.models.functions import ExtractMonth
 from django.utils import timezone
 from datetime import timedelta, datetime
 from users.auth import JWTAuthenticationFromCookie
+from .dashboard_cache import dashboard_key, get_or_compute
+from .scope import scope_queryset
 from decimal import Decimal
-from purchases.models import LimitConfig
 import calendar
 
 class DashboardView(APIView):
@@ -22,22 +23,18 @@ class DashboardView(APIView):
     def _get_user_stores(self, user, store_IDs=None):
         """Get stores based on user role and optional store filter"""
         role_name = getattr(getattr(user, "role", None), "name", "").strip()
+        stores = scope_queryset(Store.objects.all(), user, field='id')
 
         if role_name == "Restaurant Manager":
-            return Store.objects.filter(id=user.store_id)
+            return stores
         
         if store_IDs:
             try:
-                if role_name == "Area Manager":
-                    return user.assigned_stores.filter(id__in=store_IDs)
-                else:
-                    return Store.objects.filter(id__in=store_IDs)
-            except Exception:
+                return stores.filter(id__in=[int(store_id) for store_id in store_IDs])
+            except (TypeError, ValueError):
                 return Store.objects.none()
             
-        if role_name == "Area Manager":
-            return user.assigned_stores.all()
-        return Store.objects.all()
+        return stores
 
     def _get_week_range(self, year, month, week_number):
         """
@@ -171,9 +168,21 @@ class DashboardView(APIView):
         # Get Store filter
         store_ids = request.query_params.getlist("store", [])
         stores = self._get_user_stores(user, store_IDs=store_ids)
+        scope_store_ids = list(stores.values_list("id", flat=True))
 
-        # print("stores", stores)
-        print("Stores", stores.values_list("id"))
+        # Cached per scope and period; see utils/dashboard_cache.py
+        role = user.role.name if user.role else None
+        key = dashboard_key(
+            role, scope_store_ids, year, month,
+            week_number or f"current-{self.current_month_week_number()}",
+        )
+        payload = get_or_compute(
+            key,
+            lambda: self._build_payload(role, stores, len(scope_store_ids), year, month, week_number),
+        )
+        return CustomResponse(True, "Dashboard data fetched successfully", 200, payload)
+
+    def _build_payload(self, role, stores, stores_count, year, month, week_number):
 
         # --- Calculate Weekly Period ---
         print("Current Week Number ==> ", self.current_month_week_number())
@@ -207,12 +216,12 @@ class DashboardView(APIView):
 
         # --- Calculate Weekly Expenses ---
         # Only count APPROVED reimbursements in the current accounting period
+        # Read from the daily spend facts (reimbursements/facts.py)
+        approved_spend = DailySpendFact.objects.filter(store__in=stores, status='approved')
         weekly_expenses = (
-            Reimbursement.objects.filter(
-                store__in=stores,
-                status='approved',  # Only approved expenses
-                created_at__range=[week_start, week_end]
-            ).aggregate(total=Sum("total_amount"))["total"] or Decimal(0)
+            approved_spend.filter(
+                day__range=[timezone.localdate(week_start), timezone.localdate(week_end)]
+            ).aggregate(total=Sum("amount"))["total"] or Decimal(0)
         )
 
         # --- Calculate Weekly Balance ---
@@ -241,25 +250,19 @@ class DashboardView(APIView):
 
         # --- Top 5 Purchases This Month ---
         top_monthly_purchases = list(
-            ReimbursementItem.objects.filter(
-                reimbursement__store__in=stores,
-                reimbursement__status='approved',  # Only approved
-                reimbursement__created_at__range=[start_month, end_month]
+            approved_spend.filter(
+                day__range=[timezone.localdate(start_month), timezone.localdate(end_month)]
             ).values("item_name")
-             .annotate(total_spent=Sum("item_total"))
+             .annotate(total_spent=Sum("amount"))
              .order_by("-total_spent")[:5]
         )
 
         # --- Line Chart Data (Monthly Totals for Selected Year) ---
         line_qs = (
-            Reimbursement.objects.filter(
-                store__in=stores,
-                status='approved',  # Only approved
-                created_at__year=year
-            )
-            .annotate(month=ExtractMonth("created_at"))
+            approved_spend.filter(day__range=[date(year, 1, 1), date(year, 12, 31)])
+            .annotate(month=ExtractMonth("day"))
             .values('month')
-            .annotate(total=Sum('total_amount'))
+            .annotate(total=Sum('amount'))
             .order_by('month')
         )
 
@@ -309,27 +312,22 @@ class DashboardView(APIView):
             }
         """
         # --- Final Response ---
-        return CustomResponse(
-            True,
-            "Dashboard data fetched successfully",
-            200,
-            {
-                "role": user.role.name if user.role else None,
-                "stores_count": stores.count(),
-                # "selected_store": int(store_param) if store_param else None,
-                "selected_year": year,
-                "selected_month": month,
-                "selected_week": int(week_number) if week_number else self.current_month_week_number(),
-                # "available_weeks": available_weeks,
-                "week_period": {
-                    "start": week_start.strftime("%Y-%m-%d"),
-                    "end": week_end.strftime("%Y-%m-%d")
-                },
-                "imprest_amount": float(total_imprest),
-                "weekly_expenses": float(weekly_expenses),
-                "weekly_balance": float(weekly_balance),
-                # "budget_warnings": store_budget_warnings,  # Stores exceeding budget
-                "top_monthly_purchases": top_monthly_purchases,
-                "line_chart_data": line_chart_data,
-            }
-        )
\ No newline at end of file
+        return {
+            "role": role,
+            "stores_count": stores_count,
+            # "selected_store": int(store_param) if store_param else None,
+            "selected_year": year,
+            "selected_month": month,
+            "selected_week": int(week_number) if week_number else self.current_month_week_number(),
+            # "available_weeks": available_weeks,
+            "week_period": {
+                "start": week_start.strftime("%Y-%m-%d"),
+                "end": week_end.strftime("%Y-%m-%d")
+            },
+            "imprest_amount": float(total_imprest),
+            "weekly_expenses": float(weekly_expenses),
+            "weekly_balance": float(weekly_balance),
+            # "budget_warnings": store_budget_warnings,  # Stores exceeding budget
+            "top_monthly_purchases": top_monthly_purchases,
+            "line_chart_data": line_chart_data,
+        }
@@ -0,0 +1,95 @@
+"""
+Cached dashboard payloads.
+
+A payload is cached under (role, store set, versions of those stores, year,
+month, week). Every store has a version counter in the cache that is bumped
+when its dashboard numbers change, i.e. when its spend facts are refreshed
+(reimbursements/facts.py) or the store (budget) is saved. A bump makes every
+cached payload covering that store unreachable; nothing has to be deleted.
+
+Identical requests arriving together are coalesced: the first one takes a
+short lock with cache.add() and computes, the others wait for its result.
+
+Counters and locks live in the default cache, so invalidation reaches every
+worker only when that cache is shared (REDIS_URL); with the per-process
+default cache DASHBOARD_CACHE_SECONDS bounds how stale another process can be.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'dashboard:store-version:{}'
+PAYLOAD_KEY = 'dashboard:payload:{}'
+LOCK_KEY = 'dashboard:lock:{}'
+
+LOCK_SECONDS = 30
+WAIT_SECONDS = 5
+POLL_SECONDS = 0.05
+
+
+def get_cache_seconds():
+    return getattr(settings, 'DASHBOARD_CACHE_SECONDS', 300)
+
+
+def _new_version():
+    # A fresh counter must never repeat a version an evicted counter had
+    return time.time_ns()
+
+
+def get_store_versions(store_ids):
+    keys = [VERSION_KEY.format(store_id) for store_id in store_ids]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_store_versions(store_ids):
+    """Invalidate every cached dashboard covering one of these stores."""
+    for store_id in set(store_ids):
+        key = VERSION_KEY.format(store_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+
+def dashboard_key(role, store_ids, year, month, week):
+    store_ids = sorted(store_ids)
+    versions = get_store_versions(store_ids)
+    raw = f"{role}|{store_ids}|{versions}|{year}|{month}|{week}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_or_compute(key, compute):
+    """
+    Return the cached payload for key, computing it with compute() on a
+    miss. Concurrent misses for the same key wait for a single computation.
+    """
+    payload_key = PAYLOAD_KEY.format(key)
+    payload = cache.get(payload_key)
+    if payload is not None:
+        return payload
+
+    lock_key = LOCK_KEY.format(key)
+    locked = cache.add(lock_key, 1, timeout=LOCK_SECONDS)
+    if not locked:
+        # Someone else is computing it; wait for the result
+        deadline = time.monotonic() + WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            payload = cache.get(payload_key)
+            if payload is not None:
+                return payload
+        # The other request is taking too long (or died); compute ourselves
+
+    try:
+        payload = compute()
+        cache.set(payload_key, payload, timeout=get_cache_seconds())
+        return payload
+    finally:
+        if locked:
+            cache.delete(lock_key)
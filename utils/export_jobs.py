@@ -0,0 +1,167 @@
+"""
+Background exports.
+
+The export views take `?async=1` to queue an ExportJob instead of streaming
+the workbook. The `process_export_jobs` management command generates queued
+jobs with the same role-scoped querysets and templates as the synchronous
+exports (reimbursements/exports.py, purchases/exports.py) and writes them
+under EXPORT_ROOT. Finished files are kept for EXPORT_TTL_SECONDS.
+
+An identical request (same user, role, kind and filters) made within
+EXPORT_REUSE_SECONDS gets the existing job back instead of a new one.
+
+EXPORT_ROOT must be shared by the web and worker processes.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from helpers.models import ExportJob
+from .xlsx_export import write_xlsx
+
+logger = logging.getLogger(__name__)
+
+
+def get_export_root():
+    return getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+
+
+def get_exporter(kind):
+    """(get_export_queryset, build_export) for a job kind."""
+    if kind == ExportJob.Kind.REIMBURSEMENTS:
+        from reimbursements.exports import get_export_queryset, build_export
+    elif kind == ExportJob.Kind.PURCHASE_REQUESTS:
+        from purchases.exports import get_export_queryset, build_export
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+    return get_export_queryset, build_export
+
+
+def params_hash(user, kind, params):
+    raw = json.dumps(
+        {'user': user.id, 'role': user.role.name if user.role else None, 'kind': kind, 'params': params},
+        sort_keys=True,
+    )
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def request_export(user, kind, params):
+    """
+    Queue an export, or return a recent identical one that is queued,
+    running or still downloadable. Returns (job, created).
+    """
+    digest = params_hash(user, kind, params)
+    now = timezone.now()
+    reuse_since = now - timedelta(seconds=getattr(settings, 'EXPORT_REUSE_SECONDS', 300))
+
+    existing = (
+        ExportJob.objects
+        .filter(user=user, params_hash=digest, created_at__gte=reuse_since)
+        .filter(status__in=[ExportJob.Status.QUEUED, ExportJob.Status.PROCESSING, ExportJob.Status.DONE])
+        .exclude(expires_at__lte=now)
+        .order_by('-created_at')
+        .first()
+    )
+    if existing:
+        return existing, False
+
+    job = ExportJob.objects.create(user=user, kind=kind, params=params, params_hash=digest)
+    return job, True
+
+
+def claim_export_jobs(batch_size=5):
+    """
+    Lock a batch of queued jobs and mark them as processing. Jobs stuck in
+    processing for longer than EXPORT_PROCESSING_LEASE_SECONDS (a worker
+    died mid-way) are claimed again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'EXPORT_PROCESSING_LEASE_SECONDS', 1800))
+
+    with transaction.atomic():
+        ids = list(
+            ExportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ExportJob.Status.QUEUED)
+                | Q(status=ExportJob.Status.PROCESSING, updated_at__lt=stale)
+            )
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        ExportJob.objects.filter(id__in=ids).update(status=ExportJob.Status.PROCESSING, updated_at=now)
+    return ids
+
+
+def run_export_job(job):
+    """Generate the workbook of a claimed job and record the outcome."""
+    get_export_queryset, build_export = get_exporter(job.kind)
+    params = job.params
+    start_date = datetime.strptime(params['start_date'], '%Y-%m-%d')
+    end_date = datetime.strptime(params['end_date'], '%Y-%m-%d')
+
+    try:
+        queryset = get_export_queryset(job.user, start_date, end_date, params['status'])
+        if queryset is None:
+            raise PermissionError("The user is not allowed to export these records")
+        sheet = build_export(job.user, queryset, start_date, end_date)
+
+        os.makedirs(get_export_root(), exist_ok=True)
+        path = os.path.join(get_export_root(), f"{job.pk}-{job.params_hash[:12]}.xlsx")
+        with open(path, 'wb') as fh:
+            row_count = write_xlsx(sheet, fh)
+    except Exception as err:
+        logger.exception(f"Export job {job.pk} failed")
+        job.status = ExportJob.Status.FAILED
+        job.error_message = str(err)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
+        return job.status
+
+    now = timezone.now()
+    job.status = ExportJob.Status.DONE
+    job.file_path = path
+    job.filename = sheet.filename
+    job.row_count = row_count
+    job.finished_at = now
+    job.expires_at = now + timedelta(seconds=getattr(settings, 'EXPORT_TTL_SECONDS', 3600))
+    job.save(update_fields=['status', 'file_path', 'filename', 'row_count', 'finished_at', 'expires_at', 'updated_at'])
+    return job.status
+
+
+def process_export_jobs(batch_size=5):
+    """Claim and generate one batch. Returns {status: count}."""
+    results = {}
+    for job in ExportJob.objects.filter(id__in=claim_export_jobs(batch_size)).select_related('user__role'):
+        status = run_export_job(job)
+        results[status] = results.get(status, 0) + 1
+    return results
+
+
+def expire_export_jobs():
+    """Delete the files of expired exports. Returns the number of jobs expired."""
+    expired = ExportJob.objects.filter(status=ExportJob.Status.DONE, expires_at__lte=timezone.now())
+    count = 0
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        job.status = ExportJob.Status.EXPIRED
+        job.file_path = ''
+        job.save(update_fields=['status', 'file_path', 'updated_at'])
+        count += 1
+    return count
+
+
+def is_downloadable(job):
+    return (
+        job.status == ExportJob.Status.DONE
+        and job.expires_at and job.expires_at > timezone.now()
+        and os.path.exists(job.file_path)
+    )
@@ -1,6 +1,60 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 from rest_framework import status
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def get_page_size(request):
+    """
+    Page size from the `page_size` query param, capped at MAX_PAGE_SIZE.
+    Falls back to the default PAGE_SIZE from settings if missing or invalid
+    (not a positive integer).
+    """
+    default = getattr(settings, 'REST_FRAMEWORK', {}).get('PAGE_SIZE', 10)
+    page_size = request.query_params.get('page_size')
+    if not page_size:
+        return default
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        return default
+    if page_size < 1:
+        return default
+    # Optional: Set a max limit to prevent abuse
+    max_page_size = getattr(settings, 'MAX_PAGE_SIZE', 100)  # Default max 100
+    return min(page_size, max_page_size)
+
+
+def wants_count(request):
+    return request.query_params.get('with_count', '').lower() in ('1', 'true', 'yes')
+
+
+def get_cached_count(queryset):
+    """
+    Exact row count of a queryset, cached for PAGINATION_COUNT_CACHE_SECONDS
+    under a key derived from its SQL so identical filters share one COUNT(*).
+    """
+    queryset = queryset.order_by()
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except Exception:
+        return queryset.count()
+
+    digest = hashlib.sha1(f"{sql}|{params}".encode()).hexdigest()
+    key = f"pagination-count:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, 'PAGINATION_COUNT_CACHE_SECONDS', 60))
+    return count
+
 
 class DynamicPageSizePagination(PageNumberPagination):
     """
@@ -8,20 +62,118 @@ class DynamicPageSizePagination(PageNumberPagination):
     Falls back to the default PAGE_SIZE from settings if not provided.
     """
     def paginate_queryset(self, queryset, request, view=None):
-        # Get page_size from query params, default to settings PAGE_SIZE
-        page_size = request.query_params.get('page_size')
-        if page_size:
-            try:
-                page_size = int(page_size)
-                # Optional: Set a max limit to prevent abuse
-                max_page_size = getattr(settings, 'MAX_PAGE_SIZE', 100)  # Default max 100
-                if page_size > max_page_size:
-                    page_size = max_page_size
-                self.page_size = page_size
-            except ValueError:
-                # If invalid, use default
-                self.page_size = getattr(settings, 'REST_FRAMEWORK', {}).get('PAGE_SIZE', 10)
+        self.page_size = get_page_size(request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_payload(self, results):
+        """Standard list payload used by the list endpoints."""
+        return {
+            "count": self.page.paginator.count,  # total count (all pages)
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": results,
+        }
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over (created_at, id), newest first.
+
+    Pages are fetched with a `WHERE (created_at, id) < cursor` seek instead of
+    an OFFSET, so any page costs the same as the first one. No COUNT(*) is run
+    unless the client asks for it with `?with_count=true`; the count is then
+    cached (see get_cached_count).
+
+    Cursors are opaque base64 tokens passed back through `?cursor=`.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def is_requested(cls, request):
+        return (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get('pagination') == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = get_page_size(request)
+        self.base_url = remove_query_param(request.build_absolute_uri(), 'page')
+        self.count = get_cached_count(queryset) if wants_count(request) else None
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['d'] == 'prev'
+
+        if cursor is None:
+            queryset = queryset.order_by('-created_at', '-id')
+        elif reverse:
+            queryset = queryset.filter(
+                Q(created_at__gt=cursor['c']) | Q(created_at=cursor['c'], id__gt=cursor['i'])
+            ).order_by('created_at', 'id')
         else:
-            self.page_size = getattr(settings, 'REST_FRAMEWORK', {}).get('PAGE_SIZE', 10)
+            queryset = queryset.filter(
+                Q(created_at__lt=cursor['c']) | Q(created_at=cursor['c'], id__lt=cursor['i'])
+            ).order_by('-created_at', '-id')
 
-        return super().paginate_queryset(queryset, request, view)
+        # One extra row tells us whether there is another page in this direction
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+
+        self.page = rows
+        return rows
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            cursor['c'] = parse_datetime(cursor['c'])
+            cursor['i'] = int(cursor['i'])
+            if cursor['c'] is None or cursor['d'] not in ('next', 'prev'):
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, obj, direction):
+        token = json.dumps({'c': obj.created_at.isoformat(), 'i': obj.pk, 'd': direction})
+        encoded = base64.urlsafe_b64encode(token.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], 'next')
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], 'prev')
+
+    def get_payload(self, results):
+        """Same shape as DynamicPageSizePagination; count is None unless requested."""
+        return {
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": results,
+        }
+
+
+def get_paginator(request):
+    """
+    Paginator for a list endpoint: keyset mode when the client sends a cursor
+    or `?pagination=cursor`, page numbers otherwise.
+    """
+    if KeysetPagination.is_requested(request):
+        return KeysetPagination()
+    return DynamicPageSizePagination()
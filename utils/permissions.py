@@ -1,9 +1,8 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from purchases.models import PurchaseRequest, LimitConfig
+from purchases.models import PurchaseRequest
 from reimbursements.models import Reimbursement
 from helpers.exceptions import CustomValidationException
-
-purchase_limit = LimitConfig.objects.first()
+from roles.permission_cache import role_has_codename
 
 
 class BaseRolePermission(BasePermission):
@@ -34,12 +33,12 @@ class BaseRolePermission(BasePermission):
                 return False
 
             if amount >= self.amount_threshold:
-                return user.role.permissions.filter(codename='approve_over_limit').exists()
+                return role_has_codename(user.role, 'approve_over_limit')
             return True
 
-        # Codename-based check
+        # Codename-based check (cached per role version, see roles/permission_cache.py)
         if self.codename:
-            return user.role.permissions.filter(codename=self.codename).exists()
+            return role_has_codename(user.role, self.codename)
 
         return False
 
@@ -70,7 +69,7 @@ class BaseRolePermission(BasePermission):
             ]:
                 return (
                     getattr(user.role, 'name', '') == 'Area Manager' and
-                    obj.store in user.assigned_stores.all()
+                    obj.store_id in user.assigned_store_ids
                 )
 
         # --- Reimbursement logic ---
@@ -86,7 +85,7 @@ class BaseRolePermission(BasePermission):
                 'view_reimbursement_request',
             ]:
                 return (
-                    (role == 'Area Manager' and obj.store in user.assigned_stores.all())
+                    (role == 'Area Manager' and obj.store_id in user.assigned_store_ids)
                     or role == 'Internal Control'
                 )
 
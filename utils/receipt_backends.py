@@ -0,0 +1,393 @@
+"""
+Receipt extraction backends.
+
+Every backend turns a receipt image into the fields checked by
+utils.receipt_validation.check_receipt, plus a confidence between 0 and 1.
+RECEIPT_EXTRACTION_BACKEND picks one:
+
+- 'gemini': the remote Gemini model.
+- 'tesseract': local OCR with regex parsing; needs the tesseract binary.
+- 'tiered' (default): local OCR first, escalating to Gemini when the local
+  result is incomplete or below RECEIPT_LOCAL_CONFIDENCE.
+"""
+import base64
+import io
+import json
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import google.generativeai as genai
+import pytesseract
+from PIL import Image
+from django.conf import settings
+
+from .receipt_preprocessing import preprocess_receipt, prepare_receipt_image, encode_png
+
+
+def _as_confidence(value):
+    try:
+        return max(0.0, min(1.0, float(value)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ExtractionBackend(ABC):
+    """Base class; subclasses implement extract()."""
+    name = None
+
+    @abstractmethod
+    def extract(self, image_data, preprocess=True):
+        """Fields read from the receipt image; see result()."""
+
+    def result(self, extracted_amount=None, extracted_date=None, extracted_vendor=None,
+               receipt_number=None, errors=None, complete=True, confidence=0.0):
+        return {
+            'extracted_amount': extracted_amount,
+            'extracted_date': extracted_date,
+            'extracted_vendor': extracted_vendor,
+            'receipt_number': receipt_number,
+            'errors': errors or [],
+            'complete': complete,
+            'confidence': confidence,
+            'backend': self.name,
+        }
+
+
+class GeminiBackend(ExtractionBackend):
+    """Remote extraction with Google Gemini."""
+    name = 'gemini'
+
+    def extract(self, image_data, preprocess=True):
+        errors = []
+        extracted_amount = None
+        extracted_date = None
+        extracted_vendor = None
+        receipt_number = None
+        confidence = 0.0
+
+        try:
+            # Configure Gemini API
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            model = genai.GenerativeModel('gemini-2.5-flash')
+
+            # Convert image to base64
+            if preprocess:
+                encoded, mime_type = preprocess_receipt(image_data)
+            else:
+                encoded, mime_type = encode_png(image_data)
+            image_b64 = base64.b64encode(encoded).decode('utf-8')
+
+            # Create prompt for Gemini
+            prompt = """
+                    Analyze this receipt image carefully, paying special attention to handwritten text which may be unclear or partially illegible. Extract the following information in JSON format WITH confidence levels for each field.
+                    
+                        EXTRACTION GUIDELINES:
+                        1. For amounts: Look for currency symbols (₦, $, etc.) and numerical values. Check for "sum of", "total", "amount" keywords. If handwritten, numbers like 0 and 6, 1 and 7, 5 and S may be confused.
+                    
+                        2. For dates: Search for date patterns (DD/MM/YY, MM/DD/YY, YYYY-MM-DD). Look for "Date:" labels. Handwritten dates may have unclear digits - use context clues.
+                    
+                        3. For vendor: Check the header/top of receipt for business name (often printed). Look for "HOTEL", "RESORT", "STORE", company logos or letterhead.
+                    
+                        4. For receipt number: Look for "Receipt #", "No.", "Receipt No", "Invoice #" - may be printed or stamped. Often starts with zeros.
+                    
+                        5. For unclear handwriting:
+                        - Use context to disambiguate similar-looking characters
+                        - Consider common receipt words/patterns
+                        - If multiple interpretations exist, choose the most logical one
+                        - Look for both printed AND handwritten text
+                    
+                        CONFIDENCE SCORING:
+                        - high (0.8-1.0): Text is clearly visible and unambiguous (usually printed text or very clear handwriting)
+                        - medium (0.5-0.79): Text is partially unclear but context makes interpretation likely correct
+                        - low (0.2-0.49): Text is very unclear, significant guessing involved
+                        - very_low (0.0-0.19): Extremely unclear, mostly guessing
+                    
+                        SPECIFIC INSTRUCTIONS:
+                        - Examine BOTH printed text (usually clearer) and handwritten additions
+                        - For partially visible text, make educated guesses based on visible portions
+                        - Numbers in amounts should be interpreted as currency values
+                        - If text appears to be crossed out or corrected, use the final/corrected version
+                        - Always provide a confidence score even if the field value is null
+                    
+                        Return ONLY valid JSON in this exact format:
+                        {
+                        "amount": {
+                            "value": <number or null>,
+                            "confidence": <float between 0 and 1>,
+                            "confidence_level": "<high|medium|low|very_low>",
+                            "notes": "<optional: brief explanation if unclear>"
+                        },
+                        "date": {
+                            "value": "<YYYY-MM-DD format or null>",
+                            "confidence": <float between 0 and 1>,
+                            "confidence_level": "<high|medium|low|very_low>",
+                            "notes": "<optional: brief explanation if unclear>"
+                        },
+                        "vendor": {
+                            "value": "<business name or null>",
+                            "confidence": <float between 0 and 1>,
+                            "confidence_level": "<high|medium|low|very_low>",
+                            "notes": "<optional: brief explanation if unclear>"
+                        },
+                        "receipt_number": {
+                            "value": "<receipt number or null>",
+                            "confidence": <float between 0 and 1>,
+                            "confidence_level": "<high|medium|low|very_low>",
+                            "notes": "<optional: brief explanation if unclear>"
+                        }
+                        }
+                    
+                        Even if confidence is low, provide your best interpretation rather than null when possible.
+                     """
+            # your existing detailed prompt here
+
+            # Generate content with Gemini
+            response = model.generate_content([
+                prompt,
+                {"mime_type": mime_type, "data": image_b64}
+            ])
+
+            response_text = response.text.strip()
+
+            # Remove code block formatting if present
+            if response_text.startswith('```json'):
+                response_text = response_text[7:]
+            if response_text.endswith('```'):
+                response_text = response_text[:-3]
+            response_text = response_text.strip()
+
+            # Parse JSON safely
+            try:
+                data = json.loads(response_text)
+            except json.JSONDecodeError:
+                errors.append("Failed to parse Gemini response as JSON")
+                return self.result(errors=errors, complete=False)
+
+            # --- Extract fields safely ---
+            # Amount
+            amount_value = data.get('amount', {}).get('value')
+            if amount_value is not None:
+                try:
+                    extracted_amount = Decimal(str(amount_value))
+                except (ValueError, TypeError, InvalidOperation):
+                    errors.append("Invalid amount format from Gemini")
+                    extracted_amount = None
+
+            # Date
+            date_value = data.get('date', {}).get('value')
+            if date_value:
+                try:
+                    extracted_date = datetime.strptime(date_value, '%Y-%m-%d').date()
+                except (ValueError, TypeError):
+                    errors.append("Invalid date format from Gemini")
+                    extracted_date = None
+
+            # Vendor
+            vendor_value = data.get('vendor', {}).get('value')
+            if vendor_value:
+                extracted_vendor = str(vendor_value).strip()
+
+            # Receipt number
+            receipt_number_value = data.get('receipt_number', {}).get('value')
+            if receipt_number_value:
+                receipt_number = str(receipt_number_value).strip()
+
+            # The weakest of the mandatory fields decides
+            confidence = min(
+                _as_confidence((data.get(field) or {}).get('confidence'))
+                for field in ('amount', 'date', 'vendor')
+            )
+
+        except Exception as e:
+            errors.append(f"Gemini processing failed: {str(e)}")
+            complete = False
+        else:
+            complete = True
+
+        return self.result(
+            extracted_amount=extracted_amount,
+            extracted_date=extracted_date,
+            extracted_vendor=extracted_vendor,
+            receipt_number=receipt_number,
+            errors=errors,
+            complete=complete,
+            confidence=confidence,
+        )
+
+
+
+
+# --- Local OCR parsing ---
+AMOUNT_RE = re.compile(r'(?<![\d.])(\d{1,3}(?:,\d{3})+(?:\.\d{2})?|\d+\.\d{2}|\d+)(?![\d.])')
+TOTAL_LINE_RE = re.compile(r'\b(grand\s*total|total|amount\s*due|amount|sum\s*of|balance\s*due|net\s*pay)', re.I)
+SUBTOTAL_RE = re.compile(r'sub\s*-?\s*total', re.I)
+RECEIPT_NO_RE = re.compile(
+    r'\b(?:receipt|invoice|inv|bill|txn|transaction|ticket)\s*(?:no\.?|number|num|#)?\s*[:#.]?\s*([A-Z0-9][A-Z0-9/-]{2,})',
+    re.I,
+)
+DATE_PATTERNS = [
+    (re.compile(r'\b(\d{4}-\d{1,2}-\d{1,2})\b'), ['%Y-%m-%d']),
+    (re.compile(r'\b(\d{1,2}[/.-]\d{1,2}[/.-]\d{4})\b'), ['%d/%m/%Y', '%d.%m.%Y', '%d-%m-%Y']),
+    (re.compile(r'\b(\d{1,2}[/.-]\d{1,2}[/.-]\d{2})\b'), ['%d/%m/%y', '%d.%m.%y', '%d-%m-%y']),
+    (re.compile(r'\b(\d{1,2}\s+[A-Za-z]{3,9},?\s+\d{4})\b'), ['%d %b %Y', '%d %B %Y', '%d %b, %Y', '%d %B, %Y']),
+    (re.compile(r'\b([A-Za-z]{3,9}\s+\d{1,2},?\s+\d{4})\b'), ['%b %d %Y', '%B %d %Y', '%b %d, %Y', '%B %d, %Y']),
+]
+VENDOR_SKIP_RE = re.compile(r'receipt|invoice|welcome|tel|phone|date|time|cashier|www\.|@', re.I)
+
+
+def _parse_amount(text):
+    try:
+        return Decimal(text.replace(',', ''))
+    except InvalidOperation:
+        return None
+
+
+def parse_amount(lines):
+    """
+    Amount from the last "total"-like line (ignoring sub-totals); falls back
+    to the largest amount on the receipt. Returns (amount, from_total_line).
+    """
+    for line in reversed(lines):
+        if TOTAL_LINE_RE.search(line) and not SUBTOTAL_RE.search(line):
+            amounts = [_parse_amount(match) for match in AMOUNT_RE.findall(line)]
+            amounts = [amount for amount in amounts if amount]
+            if amounts:
+                return amounts[-1], True
+
+    amounts = [_parse_amount(match) for line in lines for match in AMOUNT_RE.findall(line)]
+    amounts = [amount for amount in amounts if amount]
+    return (max(amounts), False) if amounts else (None, False)
+
+
+def parse_date(text):
+    """First date on the receipt; day-first, as printed locally."""
+    for pattern, formats in DATE_PATTERNS:
+        for match in pattern.findall(text):
+            value = re.sub(r'[.-]', '/', match) if '/' in formats[0] else match
+            for fmt in formats:
+                try:
+                    return datetime.strptime(value, fmt).date()
+                except ValueError:
+                    continue
+    return None
+
+
+def parse_receipt_number(text):
+    match = RECEIPT_NO_RE.search(text)
+    return match.group(1) if match else None
+
+
+def parse_vendor(lines):
+    """Business names are usually the first wordy line at the top."""
+    for line in lines[:6]:
+        letters = sum(char.isalpha() for char in line)
+        if letters >= 3 and not VENDOR_SKIP_RE.search(line) and not parse_date(line):
+            return line.strip()
+    return None
+
+
+class TesseractBackend(ExtractionBackend):
+    """Local OCR with Tesseract and regex parsing."""
+    name = 'tesseract'
+
+    def ocr_lines(self, image_data, preprocess=True):
+        """Return (lines, mean word confidence between 0 and 1)."""
+        # OCR reads the cleaned-up image as is; no lossy re-encode in between
+        if preprocess:
+            image = prepare_receipt_image(image_data)
+        else:
+            image = Image.open(io.BytesIO(image_data))
+
+        data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data['text']):
+            word = word.strip()
+            conf = float(data['conf'][i])
+            if not word or conf < 0:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(conf)
+
+        ordered = [' '.join(words) for _, words in sorted(lines.items())]
+        mean_conf = sum(confidences) / len(confidences) / 100 if confidences else 0.0
+        return ordered, mean_conf
+
+    def extract(self, image_data, preprocess=True):
+        try:
+            lines, ocr_confidence = self.ocr_lines(image_data, preprocess)
+        except Exception as e:
+            return self.result(errors=[f"Local OCR failed: {str(e)}"], complete=False)
+
+        text = '\n'.join(lines)
+        amount, from_total_line = parse_amount(lines)
+        extracted_date = parse_date(text)
+        vendor = parse_vendor(lines)
+
+        # OCR certainty, scaled down for every field we had to guess or miss
+        confidence = ocr_confidence
+        if not from_total_line:
+            confidence *= 0.6
+        for value in (amount, extracted_date, vendor):
+            if value is None:
+                confidence *= 0.5
+
+        return self.result(
+            extracted_amount=amount,
+            extracted_date=extracted_date,
+            extracted_vendor=vendor,
+            receipt_number=parse_receipt_number(text),
+            complete=bool(lines),
+            confidence=round(confidence, 3),
+        )
+
+
+class TieredBackend(ExtractionBackend):
+    """Local OCR first; the remote model only when the local result is weak."""
+    name = 'tiered'
+
+    def __init__(self, local=None, remote=None):
+        self.local = local or TesseractBackend()
+        self.remote = remote or GeminiBackend()
+
+    def is_confident(self, result):
+        threshold = getattr(settings, 'RECEIPT_LOCAL_CONFIDENCE', 0.8)
+        return (
+            result['complete']
+            and result['confidence'] >= threshold
+            and all(result[field] is not None for field in ('extracted_amount', 'extracted_date', 'extracted_vendor'))
+        )
+
+    def extract(self, image_data, preprocess=True):
+        local = self.local.extract(image_data, preprocess=preprocess)
+        if self.is_confident(local):
+            return local
+
+        remote = self.remote.extract(image_data, preprocess=preprocess)
+        if remote['complete'] or not local['complete']:
+            return remote
+
+        # The model is unavailable; a weak local reading beats none at all,
+        # but it is not worth caching over a later model reading
+        local['errors'] = local['errors'] + remote['errors']
+        local['fallback'] = True
+        return local
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    TesseractBackend.name: TesseractBackend,
+    TieredBackend.name: TieredBackend,
+}
+
+
+def get_backend(name=None):
+    """Extraction backend by name, defaulting to RECEIPT_EXTRACTION_BACKEND."""
+    name = name or getattr(settings, 'RECEIPT_EXTRACTION_BACKEND', TieredBackend.name)
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown receipt extraction backend: {name}")
@@ -0,0 +1,177 @@
+"""
+Direct-to-storage receipt uploads.
+
+Instead of posting the file through Django, the browser:
+
+1. asks for signed upload parameters (sign_upload) for an item,
+2. posts the file with those fields straight to `upload_url`,
+3. hands the storage response back to the finalize endpoint
+   (finalize_upload), which checks it, attaches the receipt to the item and
+   queues it for validation.
+
+In production the storage is Cloudinary (signed upload API). Elsewhere a
+local stand-in endpoint (receive_local_upload) implements the same
+contract on top of LocalReceiptStorage.
+
+Upload tokens are signed with django.core.signing and expire after
+RECEIPT_UPLOAD_TTL_SECONDS.
+"""
+import os
+import re
+import time
+import uuid
+
+import cloudinary
+import cloudinary.utils
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from .receipt_phash import dhash
+from .receipt_storage import LocalReceiptStorage
+
+TOKEN_SALT = 'receipts.direct-upload'
+RESPONSE_SALT = 'receipts.direct-upload.response'
+DIRECT_UPLOAD_FOLDER = 'receipts/direct'
+
+# Time allowed between issuing the parameters and finalizing the upload
+FINALIZE_GRACE_SECONDS = 3600
+
+# Unsigned parts of Cloudinary's response that go into the receipt URL
+RESOURCE_TYPES = ('image', 'raw')
+FORMAT_RE = re.compile(r'^[A-Za-z0-9]{1,10}$')
+
+
+class DirectUploadError(ValueError):
+    """A signed upload token or storage response that cannot be trusted."""
+
+
+def get_upload_ttl():
+    return getattr(settings, 'RECEIPT_UPLOAD_TTL_SECONDS', 600)
+
+
+def make_token(item_id, user_id, public_id):
+    return signing.dumps({'item': item_id, 'user': user_id, 'public_id': public_id}, salt=TOKEN_SALT)
+
+
+def read_token(token, max_age):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise DirectUploadError("The upload has expired; request a new one.")
+    except signing.BadSignature:
+        raise DirectUploadError("Invalid upload token.")
+
+
+class CloudinaryDirectUpload:
+    """Browser uploads to Cloudinary with a signed request."""
+
+    def sign(self, item_id, user_id, request=None):
+        config = cloudinary.config()
+        timestamp = int(time.time())
+        public_id = f"{DIRECT_UPLOAD_FOLDER}/{item_id}/{uuid.uuid4().hex}"
+        params = {'public_id': public_id, 'timestamp': timestamp}
+        return {
+            'upload_url': f"https://api.cloudinary.com/v1_1/{config.cloud_name}/auto/upload",
+            'fields': {
+                **params,
+                'api_key': config.api_key,
+                'signature': cloudinary.utils.api_sign_request(params, config.api_secret),
+            },
+            'token': make_token(item_id, user_id, public_id),
+            'expires_in': get_upload_ttl(),
+        }
+
+    def verify(self, claims, response):
+        """
+        Check Cloudinary's upload response (public_id, version, signature).
+        Returns (receipt_url, receipt_path, sha256, phash).
+
+        Only public_id and version are covered by the signature, so the
+        receipt URL is built from them; the client's secure_url is ignored.
+        """
+        public_id = response.get('public_id')
+        version = response.get('version')
+        if public_id != claims['public_id']:
+            raise DirectUploadError("The uploaded file does not belong to this upload.")
+        if not cloudinary.utils.verify_api_response_signature(
+            public_id, version, response.get('signature')
+        ):
+            raise DirectUploadError("The storage response signature is invalid.")
+
+        resource_type = response.get('resource_type') or 'image'
+        if resource_type not in RESOURCE_TYPES:
+            raise DirectUploadError("Unsupported upload type.")
+        file_format = response.get('format') or None
+        if file_format and not FORMAT_RE.match(file_format):
+            raise DirectUploadError("Unsupported upload format.")
+
+        url, _ = cloudinary.utils.cloudinary_url(
+            public_id, version=version, format=file_format, resource_type=resource_type, secure=True
+        )
+        # The worker hashes the file when it downloads it for validation
+        return url, None, None, None
+
+
+class LocalDirectUpload:
+    """Stand-in for Cloudinary for development and tests: same contract, local files."""
+
+    def __init__(self, storage=None):
+        self.storage = storage or LocalReceiptStorage()
+
+    def sign(self, item_id, user_id, request=None):
+        public_id = f"{DIRECT_UPLOAD_FOLDER}/{item_id}/{uuid.uuid4().hex}"
+        token = make_token(item_id, user_id, public_id)
+        upload_url = reverse('receipt-direct-upload')
+        return {
+            'upload_url': request.build_absolute_uri(upload_url) if request else upload_url,
+            'fields': {'token': token},
+            'token': token,
+            'expires_in': get_upload_ttl(),
+        }
+
+    def receive(self, token, receipt_file):
+        """Handle the upload itself, like Cloudinary would. Returns the signed storage response."""
+        claims = read_token(token, get_upload_ttl())
+        url, path, sha256 = self.storage.store(receipt_file)
+        response = {'public_id': claims['public_id'], 'secure_url': url, 'sha256': sha256}
+        response['signature'] = signing.dumps(response, salt=RESPONSE_SALT)
+        return response
+
+    def verify(self, claims, response):
+        try:
+            signed = signing.loads(response.get('signature') or '', salt=RESPONSE_SALT, max_age=FINALIZE_GRACE_SECONDS)
+        except signing.BadSignature:
+            raise DirectUploadError("The storage response signature is invalid.")
+        if signed['public_id'] != claims['public_id']:
+            raise DirectUploadError("The uploaded file does not belong to this upload.")
+
+        key_path = signed['secure_url'].split(self.storage.base_url.rstrip('/') + '/', 1)[-1]
+        path = self.storage.path(key_path)
+        if not os.path.exists(path):
+            raise DirectUploadError("The uploaded file was not found.")
+        with open(path, 'rb') as fh:
+            phash = dhash(fh)
+        return signed['secure_url'], path, signed['sha256'], phash
+
+
+def get_direct_upload():
+    if getattr(settings, "ENVIRONMENT", "development") == "production":
+        return CloudinaryDirectUpload()
+    return LocalDirectUpload()
+
+
+def sign_upload(item_id, user_id, request=None):
+    return get_direct_upload().sign(item_id, user_id, request)
+
+
+def finalize_upload(token, item_id, user_id, response):
+    """
+    Check a finished direct upload for an item. Returns
+    (receipt_url, receipt_path, sha256, phash); sha256 and phash are None
+    when the file has not been seen by the server yet.
+    """
+    claims = read_token(token, get_upload_ttl() + FINALIZE_GRACE_SECONDS)
+    if str(claims['item']) != str(item_id) or claims['user'] != user_id:
+        raise DirectUploadError("The upload token was issued for another item.")
+    return get_direct_upload().verify(claims, response)
@@ -0,0 +1,184 @@
+"""
+Perceptual hashes for near-duplicate receipt detection.
+
+The SHA-256 check in receipt_pipeline only catches the very same file. The
+same receipt photographed twice gives different bytes but an almost equal
+dHash: a 64-bit difference hash of a 9x8 grayscale thumbnail. Two receipts
+whose hashes differ in at most RECEIPT_PHASH_MAX_DISTANCE bits are treated
+as the same paper receipt.
+
+Lookups use an in-memory multi-index hash table (see PhashIndex), loaded
+from the database on first use and topped up from it every
+RECEIPT_PHASH_REFRESH_SECONDS so uploads handled by other processes are seen.
+"""
+import io
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.utils import timezone
+
+HASH_BITS = 64
+
+
+def dhash(image_data, size=8):
+    """
+    Difference hash of an image (bytes or a file object) as a 16-character
+    hex string, or None if the file is not an image we can decode (PDF, HEIC...).
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data)
+        # Let the JPEG decoder downscale while decoding; much faster on photos
+        image.draft('L', (size * 8, size * 8))
+        image = ImageOps.exif_transpose(image).convert('L').resize((size + 1, size), Image.LANCZOS)
+    except Exception:
+        return None
+
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int(np.packbits(bits).tobytes().hex(), 16)
+    return f"{value:0{HASH_BITS // 4}x}"
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class PhashIndex:
+    """
+    Multi-index hash table over 64-bit hashes.
+
+    Each hash is split into max_distance + 1 bands. Two hashes within
+    max_distance bits of each other agree exactly on at least one band
+    (pigeonhole), so a query only compares against the entries sharing a
+    band with it instead of every stored receipt.
+    """
+
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        widths = [HASH_BITS // bands + (1 if i < HASH_BITS % bands else 0) for i in range(bands)]
+        self.bands = []
+        shift = HASH_BITS
+        for width in widths:
+            shift -= width
+            self.bands.append((shift, (1 << width) - 1))
+        self.tables = [{} for _ in self.bands]
+        self.hashes = {}  # item_id -> hash
+        self.lock = threading.RLock()
+
+    def keys(self, value):
+        return [(value >> shift) & mask for shift, mask in self.bands]
+
+    def remove(self, item_id):
+        with self.lock:
+            value = self.hashes.pop(item_id, None)
+            if value is None:
+                return
+            for table, key in zip(self.tables, self.keys(value)):
+                bucket = table.get(key)
+                if bucket:
+                    bucket.discard(item_id)
+                    if not bucket:
+                        del table[key]
+
+    def add(self, item_id, value):
+        with self.lock:
+            if self.hashes.get(item_id) == value:
+                return
+            self.remove(item_id)
+            self.hashes[item_id] = value
+            for table, key in zip(self.tables, self.keys(value)):
+                table.setdefault(key, set()).add(item_id)
+
+    def query(self, value, max_distance=None, exclude=None):
+        """[(distance, item_id)] within max_distance bits, nearest first."""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        with self.lock:
+            candidates = set()
+            for table, key in zip(self.tables, self.keys(value)):
+                candidates.update(table.get(key, ()))
+            candidates.discard(exclude)
+            matches = [(hamming(value, self.hashes[item_id]), item_id) for item_id in candidates]
+        return sorted(match for match in matches if match[0] <= max_distance)
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+_index = None
+_index_lock = threading.Lock()
+_refreshed_at = None
+_checked_at = 0.0
+_loaded_at = 0.0
+
+
+def _load(index, since=None):
+    from purchases.models import PurchaseRequestItem
+
+    items = PurchaseRequestItem.objects.filter(receipt_phash__isnull=False)
+    if since is not None:
+        items = items.filter(receipt_status_updated_at__gte=since)
+    for item_id, phash in items.values_list('id', 'receipt_phash').iterator(chunk_size=5000):
+        index.add(item_id, int(phash, 16))
+
+
+def get_phash_index():
+    """
+    The process-wide index, loaded on first use and refreshed periodically.
+    Refreshes only add hashes; a full reload every RECEIPT_PHASH_RELOAD_SECONDS
+    drops the items deleted meanwhile.
+    """
+    global _index, _refreshed_at, _checked_at, _loaded_at
+
+    refresh_seconds = getattr(settings, 'RECEIPT_PHASH_REFRESH_SECONDS', 30)
+    reload_seconds = getattr(settings, 'RECEIPT_PHASH_RELOAD_SECONDS', 3600)
+    with _index_lock:
+        if _index is None or time.monotonic() - _loaded_at >= reload_seconds:
+            started = timezone.now()
+            index = PhashIndex(getattr(settings, 'RECEIPT_PHASH_MAX_DISTANCE', 6))
+            _load(index)
+            _index, _refreshed_at = index, started
+            _checked_at = _loaded_at = time.monotonic()
+        elif time.monotonic() - _checked_at >= refresh_seconds:
+            started = timezone.now()
+            # Overlap the window a little so rows saved mid-refresh are not missed
+            _load(_index, since=_refreshed_at - timedelta(seconds=5))
+            _refreshed_at, _checked_at = started, time.monotonic()
+        return _index
+
+
+def find_near_duplicate(phash, exclude=None):
+    """Closest other item with a perceptually equal receipt: (item_id, distance) or None."""
+    from purchases.models import PurchaseRequestItem
+
+    if not phash:
+        return None
+    index = get_phash_index()
+    matches = index.query(int(phash, 16), exclude=exclude)
+    if not matches:
+        return None
+
+    # The index may still hold items deleted since the last full reload
+    existing = set(
+        PurchaseRequestItem.objects
+        .filter(id__in=[item_id for _, item_id in matches])
+        .values_list('id', flat=True)
+    )
+    for distance, item_id in matches:
+        if item_id in existing:
+            return item_id, distance
+        index.remove(item_id)
+    return None
+
+
+def index_receipt(item_id, phash):
+    """Make an item's receipt visible to near-duplicate lookups in this process."""
+    index = get_phash_index()
+    if phash:
+        index.add(item_id, int(phash, 16))
+    else:
+        index.remove(item_id)
@@ -0,0 +1,418 @@
+"""
+Background receipt validation.
+
+UploadReceiptView only stores the file and queues the item
+(receipt_status='queued'). The `process_receipts` management command claims
+queued items and runs the extraction on a bounded thread pool, so the
+extraction backend never sees more than RECEIPT_WORKER_CONCURRENCY requests
+at once from one worker.
+
+Extraction results are cached in ReceiptExtraction by the SHA-256 of the
+file, so uploading the same image again is answered without the model.
+Receipts that only look the same (a second photo of the same paper) are
+flagged with a perceptual hash, see utils/receipt_phash.py.
+
+BatchReceiptUploadView validates several receipts in one request instead,
+with process_receipt_batch() on a pool of RECEIPT_BATCH_CONCURRENCY threads.
+"""
+import hashlib
+import logging
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from purchases.models import PurchaseRequestItem, ReceiptExtraction
+from reimbursements.models import ReimbursementItem
+from .receipt_validation import extract_receipt, check_receipt
+from .receipt_phash import dhash, find_near_duplicate, index_receipt
+from .receipt_storage import get_receipt_storage, hash_file
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+PROCESSING = 'processing'
+VALIDATED = 'validated'
+FAILED = 'failed'
+
+# Reimbursement items reference a purchase request as "PR-0015" or "PR-0015-12000.00"
+PR_REF_RE = re.compile(r'^PR-0*(\d+)')
+
+
+def store_receipt(receipt_file, sha256=None):
+    """
+    Store an uploaded receipt under its content address (see
+    utils/receipt_storage.py). Returns (receipt_url, receipt_path), where
+    receipt_path is the local file path, or None if the file went to Cloudinary.
+
+    A file another item already uploaded is not stored again.
+    """
+    sha256 = sha256 or hash_receipt(receipt_file)
+    known = (
+        PurchaseRequestItem.objects
+        .filter(receipt_sha256=sha256, receipt_url__isnull=False)
+        .values_list('receipt_url', 'receipt_path')
+        .first()
+    )
+    if known and (known[1] is None or os.path.exists(known[1])):
+        return known
+
+    receipt_url, receipt_path, _ = get_receipt_storage().store(receipt_file, sha256)
+    return receipt_url, receipt_path
+
+
+def hash_receipt(receipt_file):
+    """SHA-256 of an uploaded file, read in chunks. Leaves the file rewound."""
+    return hash_file(receipt_file)
+
+
+def phash_receipt(receipt_file):
+    """Perceptual hash of an uploaded file (None if not an image). Leaves the file rewound."""
+    receipt_file.seek(0)
+    phash = dhash(receipt_file)
+    receipt_file.seek(0)
+    return phash
+
+
+def get_cached_extraction(sha256):
+    """Cached extraction for a receipt hash, or None."""
+    cached = ReceiptExtraction.objects.filter(sha256=sha256).first()
+    return cached.as_extraction() if cached else None
+
+
+def cache_extraction(sha256, extraction):
+    """
+    Remember an extraction; incomplete ones (model errors) and weak local
+    fallbacks are not cached.
+    """
+    if not extraction.get('complete') or extraction.get('fallback'):
+        return
+    ReceiptExtraction.objects.get_or_create(
+        sha256=sha256,
+        defaults={
+            'extracted_amount': extraction.get('extracted_amount'),
+            'extracted_date': extraction.get('extracted_date'),
+            'extracted_vendor': extraction.get('extracted_vendor'),
+            'receipt_no': extraction.get('receipt_number'),
+            'errors': extraction.get('errors') or [],
+        }
+    )
+
+
+def attach_receipt(item, receipt_url, receipt_path, sha256, phash=None):
+    """
+    Point an item at a stored receipt, flagging it when another item already
+    used the same file, or a receipt that looks the same.
+    """
+    item.receipt_url = receipt_url
+    item.receipt_path = receipt_path
+    item.receipt_sha256 = sha256
+    # Direct uploads are only hashed once the worker downloads them
+    item.receipt_duplicate_of = (
+        PurchaseRequestItem.objects
+        .filter(receipt_sha256=sha256)
+        .exclude(id=item.id)
+        .order_by('id')
+        .first()
+    ) if sha256 else None
+
+    item.receipt_phash = phash
+    item.receipt_near_duplicate_of = None
+    item.receipt_near_duplicate_distance = None
+    if item.receipt_duplicate_of is None:
+        match = find_near_duplicate(phash, exclude=item.id)
+        if match:
+            item.receipt_near_duplicate_of_id, item.receipt_near_duplicate_distance = match
+    index_receipt(item.id, phash)
+
+
+def receipt_locked(item):
+    """
+    True when the item's receipt may not be replaced: it is being validated,
+    or it was accepted. A failed receipt may be uploaded again.
+    """
+    return item.receipt_status in (QUEUED, PROCESSING) or (
+        item.receipt_validated and item.receipt_status != FAILED
+    )
+
+
+def queue_receipt(item):
+    """Queue an item with an attached receipt for validation."""
+    item.receipt_status = QUEUED
+    item.receipt_status_updated_at = timezone.now()
+    item.validation_errors = None
+    item.save()
+
+
+def apply_validation(item, validation_result):
+    """Save a validation result (see check_receipt) on an item."""
+    # As before, a processed receipt counts as uploaded even when the
+    # checks fail; the errors are kept for reviewers and the user may
+    # upload a better copy.
+    item.receipt_validated = True
+    item.receipt_no = validation_result.get('receipt_number')
+    item.extracted_amount = validation_result.get('extracted_amount')
+    item.extracted_date = validation_result.get('extracted_date')
+    item.extracted_vendor = validation_result.get('extracted_vendor')
+    item.validation_errors = "; ".join(validation_result.get('errors') or []) or None
+    item.receipt_status = VALIDATED if validation_result.get('validated') else FAILED
+    item.receipt_status_updated_at = timezone.now()
+    item.save()
+    # The reimbursement may have been submitted while the receipt was queued
+    sync_reimbursement_receipts(item)
+
+
+def purchase_request_id(ref):
+    """Purchase request id in a reimbursement item's purchase_request_ref, or None."""
+    match = PR_REF_RE.match((ref or "").strip())
+    return int(match.group(1)) if match else None
+
+
+def receipt_flags(pr_item):
+    """Receipt fields a reimbursement item copies from its purchase request item."""
+    return {
+        'receipt_validated': pr_item.receipt_validated,
+        'receipt_duplicate': (
+            pr_item.receipt_duplicate_of_id is not None
+            or pr_item.receipt_near_duplicate_of_id is not None
+        ),
+    }
+
+
+def sync_reimbursement_receipts(pr_item):
+    """
+    Copy the receipt outcome of a purchase request item onto the reimbursement
+    items referencing its request. As at submission, a request is represented
+    by its latest item. Returns the number of reimbursement items updated.
+    """
+    latest_id = (
+        PurchaseRequestItem.objects
+        .filter(request_id=pr_item.request_id)
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    )
+    if latest_id != pr_item.id:
+        return 0
+    return ReimbursementItem.objects.filter(
+        purchase_request_ref__regex=rf'^PR-0*{pr_item.request_id}([^0-9]|$)'
+    ).update(**receipt_flags(pr_item))
+
+
+def check_item_receipt(item, extraction):
+    """Check an extraction against the item's expected values."""
+    return check_receipt(
+        extraction,
+        item.total_price,
+        item.request.created_at.date() if item.request.created_at else None
+    )
+
+
+def load_receipt(item):
+    """Read the stored receipt bytes back for extraction."""
+    if item.receipt_path:
+        with open(item.receipt_path, 'rb') as fh:
+            return fh.read()
+    response = requests.get(item.receipt_url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+def claim_queued_receipts(batch_size=20):
+    """
+    Lock a batch of queued items and mark them as processing.
+
+    Items stuck in processing for longer than RECEIPT_PROCESSING_LEASE_SECONDS
+    (a worker died mid-way) are claimed again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'RECEIPT_PROCESSING_LEASE_SECONDS', 600))
+
+    with transaction.atomic():
+        ids = list(
+            PurchaseRequestItem.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(receipt_status=QUEUED)
+                | Q(receipt_status=PROCESSING, receipt_status_updated_at__lt=stale)
+            )
+            .order_by('receipt_status_updated_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        PurchaseRequestItem.objects.filter(id__in=ids).update(
+            receipt_status=PROCESSING, receipt_status_updated_at=now
+        )
+    return ids
+
+
+def process_receipt(item_id):
+    """Run the extraction for one claimed item and save the outcome."""
+    try:
+        item = PurchaseRequestItem.objects.select_related('request').get(id=item_id)
+
+        # Another upload of the same file may have been extracted meanwhile
+        extraction = get_cached_extraction(item.receipt_sha256) if item.receipt_sha256 else None
+        if extraction is None:
+            try:
+                receipt_data = load_receipt(item)
+            except Exception as err:
+                logger.exception(f"Could not load receipt for item {item_id}")
+                extraction = {'errors': [f"Could not load receipt: {err}"], 'complete': False}
+            else:
+                if not item.receipt_sha256:
+                    # Uploaded straight to storage; fingerprint it now
+                    attach_receipt(
+                        item, item.receipt_url, item.receipt_path,
+                        hashlib.sha256(receipt_data).hexdigest(), dhash(receipt_data)
+                    )
+                    extraction = get_cached_extraction(item.receipt_sha256)
+                if extraction is None:
+                    extraction = extract_receipt(receipt_data)
+                    cache_extraction(item.receipt_sha256, extraction)
+
+        apply_validation(item, check_item_receipt(item, extraction))
+        return item.receipt_status
+    finally:
+        # Worker threads open their own connections; don't leak them
+        connection.close()
+
+
+def process_queued_receipts(batch_size=20, concurrency=None):
+    """Claim and process one batch. Returns {status: count}."""
+    concurrency = concurrency or getattr(settings, 'RECEIPT_WORKER_CONCURRENCY', 4)
+    ids = claim_queued_receipts(batch_size)
+    results = {}
+    if not ids:
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for item_id, future in [(item_id, pool.submit(process_receipt, item_id)) for item_id in ids]:
+            try:
+                status = future.result()
+            except Exception:
+                logger.exception(f"Receipt processing failed for item {item_id}")
+                status = 'error'
+            results[status] = results.get(status, 0) + 1
+    return results
+
+
+# --- Batch uploads ---
+RECEIPT_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.heic', '.pdf')
+
+
+class ReceiptBatchError(ValueError):
+    """The batch itself is unusable (too large, bad archive)."""
+
+
+def get_batch_limits():
+    return (
+        getattr(settings, 'RECEIPT_BATCH_MAX_FILES', 50),
+        getattr(settings, 'RECEIPT_BATCH_MAX_BYTES', 50 * 1024 * 1024),
+    )
+
+
+def read_receipt_archive(archive):
+    """
+    Unpack a zip of receipts into [(item_id, file)]. Each entry is named after
+    its item: "<item_id>.jpg" or "<item_id>_<anything>.jpg"; folders are ignored.
+    Entries are sized from the archive index before anything is extracted.
+    """
+    max_files, max_bytes = get_batch_limits()
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ReceiptBatchError("The archive is not a valid zip file.")
+
+    with zf:
+        entries = [
+            info for info in zf.infolist()
+            if not info.is_dir()
+            and not os.path.basename(info.filename).startswith('.')
+            and info.filename.lower().endswith(RECEIPT_EXTENSIONS)
+        ]
+        if len(entries) > max_files:
+            raise ReceiptBatchError(f"At most {max_files} receipts can be uploaded at once.")
+        if sum(info.file_size for info in entries) > max_bytes:
+            raise ReceiptBatchError("The archive is too large.")
+
+        pairs = []
+        for info in entries:
+            filename = os.path.basename(info.filename)
+            item_id = filename.split('.')[0].split('_')[0]
+            pairs.append((item_id, SimpleUploadedFile(filename, zf.read(info))))
+    return pairs
+
+
+def upload_receipt(item_id, receipt_file):
+    """
+    Store, attach and validate one receipt of a batch, synchronously.
+    Runs in a pool thread. Returns a per-item result dict.
+    """
+    try:
+        try:
+            item = PurchaseRequestItem.objects.select_related('request').get(id=item_id)
+        except (PurchaseRequestItem.DoesNotExist, ValueError):
+            return {"item_id": item_id, "result": "invalid_item"}
+
+        if receipt_locked(item):
+            return {"item_id": item.id, "result": "already_uploaded", "receipt_status": item.receipt_status}
+
+        sha256 = hash_receipt(receipt_file)
+        phash = phash_receipt(receipt_file)
+        receipt_url, receipt_path = store_receipt(receipt_file, sha256)
+        attach_receipt(item, receipt_url, receipt_path, sha256, phash)
+
+        extraction = get_cached_extraction(sha256)
+        if extraction is None:
+            receipt_file.seek(0)
+            extraction = extract_receipt(receipt_file.read())
+            cache_extraction(sha256, extraction)
+        apply_validation(item, check_item_receipt(item, extraction))
+
+        return {
+            "item_id": item.id,
+            "result": item.receipt_status,
+            "receipt_url": receipt_url,
+            "receipt_no": item.receipt_no,
+            "duplicate_of": item.receipt_duplicate_of_id,
+            "near_duplicate_of": item.receipt_near_duplicate_of_id,
+            "validation_errors": item.validation_errors,
+        }
+    finally:
+        connection.close()
+
+
+def process_receipt_batch(pairs, concurrency=None):
+    """
+    Validate [(item_id, file)] on a bounded thread pool. Returns the results
+    in the order of the pairs. An item listed twice is only processed once.
+    """
+    concurrency = concurrency or getattr(settings, 'RECEIPT_BATCH_CONCURRENCY', 4)
+    results = [None] * len(pairs)
+    futures = {}
+    seen = set()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index, (item_id, receipt_file) in enumerate(pairs):
+            key = str(item_id).strip()
+            if key in seen:
+                results[index] = {"item_id": item_id, "result": "duplicate_in_batch"}
+                continue
+            seen.add(key)
+            futures[index] = pool.submit(upload_receipt, key, receipt_file)
+
+        for index, future in futures.items():
+            try:
+                results[index] = future.result()
+            except Exception as err:
+                logger.exception(f"Batch receipt upload failed for item {pairs[index][0]}")
+                results[index] = {"item_id": pairs[index][0], "result": "error", "error": str(err)}
+    return results
@@ -0,0 +1,111 @@
+"""
+Receipt image preprocessing.
+
+Phone photos are several megapixels; re-encoding them as lossless PNG for the
+extraction model made multi-megabyte payloads. preprocess_receipt() turns an
+upload into a compact image that is still easy to read:
+
+1. apply the EXIF orientation,
+2. convert to grayscale,
+3. shrink so the longest side is at most RECEIPT_MAX_SIDE,
+4. stretch the contrast,
+5. straighten small rotations (projection-profile deskew),
+6. encode as JPEG or WebP (RECEIPT_IMAGE_FORMAT / RECEIPT_IMAGE_QUALITY).
+"""
+import io
+import numpy as np
+from PIL import Image, ImageOps
+from django.conf import settings
+
+FORMATS = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+}
+
+# Deskew search: coarse steps over +/- DESKEW_RANGE degrees, then a fine pass
+DESKEW_RANGE = 10
+DESKEW_COARSE_STEP = 1.0
+DESKEW_FINE_STEP = 0.2
+DESKEW_SAMPLE_SIDE = 400
+
+
+def _deskew_score(sample, angle):
+    rotated = np.asarray(sample.rotate(angle, resample=Image.BILINEAR, fillcolor=0))
+    # Text lines aligned with the rows give sharply alternating row sums
+    return float(np.var(rotated.sum(axis=1)))
+
+
+def find_skew_angle(image):
+    """
+    Angle (degrees, counter-clockwise) that best aligns the text lines of a
+    grayscale image with the horizontal axis.
+    """
+    sample = image.copy()
+    sample.thumbnail((DESKEW_SAMPLE_SIDE, DESKEW_SAMPLE_SIDE))
+    pixels = np.asarray(sample, dtype=np.uint8)
+    # Dark ink becomes 1, paper 0
+    ink = (pixels < pixels.mean() - pixels.std() / 2).astype(np.uint8) * 255
+    sample = Image.fromarray(ink)
+
+    def best(angles):
+        return max(angles, key=lambda angle: _deskew_score(sample, angle))
+
+    coarse = best(np.arange(-DESKEW_RANGE, DESKEW_RANGE + DESKEW_COARSE_STEP, DESKEW_COARSE_STEP))
+    fine = best(np.arange(coarse - DESKEW_COARSE_STEP, coarse + DESKEW_COARSE_STEP + DESKEW_FINE_STEP, DESKEW_FINE_STEP))
+    return float(fine)
+
+
+def prepare_receipt_image(image_data, max_side=None, grayscale=True, deskew=True):
+    """
+    Steps 1-5 above: the cleaned-up PIL image, before encoding. Local OCR
+    reads this directly.
+    """
+    max_side = max_side or getattr(settings, 'RECEIPT_MAX_SIDE', 1600)
+
+    image = Image.open(io.BytesIO(image_data))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('L' if grayscale else 'RGB')
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image = ImageOps.autocontrast(image, cutoff=1)
+
+    if deskew and grayscale:
+        angle = find_skew_angle(image)
+        if abs(angle) >= 0.5:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return image
+
+
+def preprocess_receipt(image_data, max_side=None, image_format=None, quality=None, grayscale=True, deskew=True):
+    """
+    Prepare an uploaded receipt for the extraction model.
+
+    Args:
+        image_data (bytes): Raw upload
+        max_side (int): Longest side in pixels (RECEIPT_MAX_SIDE)
+        image_format (str): 'JPEG' or 'WEBP' (RECEIPT_IMAGE_FORMAT)
+        quality (int): Encoder quality (RECEIPT_IMAGE_QUALITY)
+
+    Returns:
+        tuple: (bytes, mime_type)
+    """
+    image_format = (image_format or getattr(settings, 'RECEIPT_IMAGE_FORMAT', 'JPEG')).upper()
+    quality = quality or getattr(settings, 'RECEIPT_IMAGE_QUALITY', 80)
+    if image_format not in FORMATS:
+        raise ValueError(f"Unsupported receipt image format: {image_format}")
+
+    image = prepare_receipt_image(image_data, max_side, grayscale, deskew)
+
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+    return buffer.getvalue(), FORMATS[image_format]
+
+
+def encode_png(image_data):
+    """The previous encoding: the upload re-encoded as lossless PNG."""
+    image = Image.open(io.BytesIO(image_data))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue(), 'image/png'
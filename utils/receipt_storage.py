@@ -0,0 +1,147 @@
+"""
+Content-addressed receipt storage.
+
+Receipts are stored under the SHA-256 of their bytes,
+receipts/<ab>/<cd>/<sha256><ext>, so two uploads named image.jpg never
+collide and the same file is only stored once. Uploads are streamed in
+chunks (Django's own upload chunks), so memory per upload stays bounded
+whatever the file size.
+
+get_receipt_storage() picks the backend: Cloudinary in production, the
+local MEDIA_ROOT otherwise. Both return (url, path) where path is the local
+file path, or None for Cloudinary.
+"""
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+
+import cloudinary.uploader
+import cloudinary.utils
+from django.conf import settings
+
+RECEIPT_ROOT = 'receipts'
+DEFAULT_EXTENSION = '.bin'
+
+# Cloudinary streams files above this size with chunked uploads
+CLOUDINARY_CHUNK_SIZE = 20 * 1024 * 1024
+
+
+def hash_file(receipt_file):
+    """SHA-256 of an uploaded file, read in chunks. Leaves the file rewound."""
+    digest = hashlib.sha256()
+    receipt_file.seek(0)
+    for chunk in receipt_file.chunks():
+        digest.update(chunk)
+    receipt_file.seek(0)
+    return digest.hexdigest()
+
+
+def receipt_key(sha256, filename=None):
+    """Storage key for a receipt: receipts/ab/cd/<sha256><ext>."""
+    ext = os.path.splitext(filename or '')[1].lower() or DEFAULT_EXTENSION
+    return f"{RECEIPT_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+class ReceiptStorage(ABC):
+    """Base class; subclasses implement exists(), save() and locate()."""
+
+    @abstractmethod
+    def exists(self, key):
+        """Whether a blob is already stored under key."""
+
+    @abstractmethod
+    def save(self, key, receipt_file):
+        """Write a receipt under key; returns (url, path)."""
+
+    @abstractmethod
+    def locate(self, key):
+        """(url, path) of an already stored key."""
+
+    def store(self, receipt_file, sha256=None):
+        """
+        Store an upload under its content address, skipping the write when
+        the blob is already there. Returns (url, path, sha256).
+        """
+        sha256 = sha256 or hash_file(receipt_file)
+        key = receipt_key(sha256, getattr(receipt_file, 'name', None))
+        if self.exists(key):
+            url, path = self.locate(key)
+        else:
+            receipt_file.seek(0)
+            url, path = self.save(key, receipt_file)
+        return url, path, sha256
+
+
+class LocalReceiptStorage(ReceiptStorage):
+    """Files under MEDIA_ROOT, served from MEDIA_URL."""
+
+    def __init__(self, location=None, base_url=None):
+        self.location = location or settings.MEDIA_ROOT
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def path(self, key):
+        return os.path.join(self.location, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def locate(self, key):
+        return self.base_url.rstrip('/') + '/' + key, self.path(key)
+
+    def save(self, key, receipt_file):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary name first; concurrent uploads of the same
+        # file then race harmlessly on the final rename
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp_path, 'wb') as fh:
+                for chunk in receipt_file.chunks():
+                    fh.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self.locate(key)
+
+
+class CloudinaryReceiptStorage(ReceiptStorage):
+    """
+    Cloudinary assets with the content address as public id. Cloudinary
+    has no cheap existence check, so the pipeline reuses the URL of an item
+    that already has the same hash before uploading (see store_receipt), and
+    overwrite=False keeps Cloudinary from replacing an existing asset.
+    """
+
+    def public_id(self, key):
+        return os.path.splitext(key)[0]
+
+    def exists(self, key):
+        return False
+
+    def locate(self, key):
+        url, _ = cloudinary.utils.cloudinary_url(self.public_id(key), secure=True)
+        return url, None
+
+    def save(self, key, receipt_file):
+        options = {
+            'public_id': self.public_id(key),
+            'overwrite': False,
+            'unique_filename': False,
+            'resource_type': 'auto',
+        }
+        # Files Django spooled to disk are streamed from their path
+        source = receipt_file.temporary_file_path() if hasattr(receipt_file, 'temporary_file_path') else receipt_file
+        if receipt_file.size > CLOUDINARY_CHUNK_SIZE:
+            result = cloudinary.uploader.upload_large(source, chunk_size=CLOUDINARY_CHUNK_SIZE, **options)
+        else:
+            result = cloudinary.uploader.upload(source, **options)
+        return result.get('secure_url'), None
+
+
+def get_receipt_storage():
+    if getattr(settings, "ENVIRONMENT", "development") == "production":
+        return CloudinaryReceiptStorage()
+    return LocalReceiptStorage()
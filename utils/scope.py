@@ -0,0 +1,28 @@
+"""
+Row-level store scope.
+
+Restaurant managers are limited to their store and area managers to their
+assigned stores; the other roles see every store (their own status filters
+still apply). The scope is a set of store ids taken from the principal
+(users/auth.py), so it is computed at most once per request and applied as
+a plain store_id IN (...) predicate, backed by the (store, created_at, id)
+indexes on Reimbursement and PurchaseRequest.
+"""
+
+
+def get_store_scope(user):
+    """Store ids the user is limited to, or None if the role is not store-scoped."""
+    role = getattr(getattr(user, 'role', None), 'name', None)
+    if role == 'Restaurant Manager':
+        return frozenset([user.store_id]) if user.store_id else frozenset()
+    if role == 'Area Manager':
+        return user.assigned_store_ids
+    return None
+
+
+def scope_queryset(queryset, user, field='store_id'):
+    """Limit a queryset of a model with a store FK to the user's store scope."""
+    scope = get_store_scope(user)
+    if scope is None:
+        return queryset
+    return queryset.filter(**{f'{field}__in': scope})